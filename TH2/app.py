@@ -1,177 +1,66 @@
 # app.py
-from flask import Flask, render_template, request, redirect, url_for, session, flash, send_from_directory
-from werkzeug.utils import secure_filename
-from werkzeug.security import generate_password_hash, check_password_hash
-import sqlite3
+from flask import Flask, render_template, request, redirect, url_for, session, flash, send_from_directory, jsonify
 import os
-from datetime import datetime
-import pandas as pd
+import sys
+import time
+from datetime import datetime, timezone
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 UPLOAD_FOLDER = os.path.join(BASE_DIR, 'uploads')
-DB_PATH = os.path.join(BASE_DIR, 'database.db')
+# scripts shared with app.py (live.js, jobs.js) are served from its static folder
+SHARED_STATIC = os.path.join(os.path.dirname(BASE_DIR), 'static')
+DB_PATH = os.environ.get('TH2_DB', os.path.join(BASE_DIR, 'database.db'))
 
 ALLOWED_EXT = {'xlsx', 'xls', 'csv'}
 
+# shared modules (db_pool, ...) live in the repository root
+sys.path.insert(0, os.path.dirname(BASE_DIR))
+import db_pool
+import migrations
+import attendance_writer
+import jobs
+import attendance_summary
+import attendance_stats
+import auth
+import instrumentation
+import rosters
+import page_cache
+import portals
+import timetable
+import attendance_api
+import write_behind
+import live_updates
+import student_history
+import io
+
 app = Flask(__name__)
 app.secret_key = os.environ.get('FLASK_SECRET', 'dev-secret-change-me')
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 6 * 1024 * 1024  # 6 MB limit
 
+# Opt-in request/SQL metrics at /metrics (INSTRUMENTATION=1); see instrumentation.py
+instrumentation.init_app(app)
+
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
 # ---------- DB helpers ----------
 def get_db_conn():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Check out a pooled WAL-mode connection; close() returns it to the pool."""
+    return db_pool.get_connection(DB_PATH)
 
 def init_db():
-    """Create tables and seed demo data (idempotent)."""
-    conn = get_db_conn()
-    c = conn.cursor()
-    # Tables
-    c.execute('''CREATE TABLE IF NOT EXISTS users (
-        id INTEGER PRIMARY KEY,
-        username TEXT UNIQUE,
-        password TEXT,
-        role TEXT,
-        name TEXT,
-        student_id TEXT,
-        section TEXT,
-        year INTEGER
-    )''')
-    c.execute('''CREATE TABLE IF NOT EXISTS clubs (
-        id INTEGER PRIMARY KEY,
-        club_name TEXT UNIQUE,
-        leader_username TEXT,
-        status TEXT DEFAULT 'pending'
-    )''')
-    c.execute('''CREATE TABLE IF NOT EXISTS vc_approvals (
-        id INTEGER PRIMARY KEY,
-        club_id INTEGER,
-        event_name TEXT,
-        start_time TEXT,
-        end_time TEXT,
-        status TEXT DEFAULT 'pending',
-        FOREIGN KEY(club_id) REFERENCES clubs(id)
-    )''')
-    c.execute('''CREATE TABLE IF NOT EXISTS subjects (
-        id INTEGER PRIMARY KEY,
-        subject_code TEXT,
-        subject_name TEXT,
-        teacher_username TEXT
-    )''')
-    c.execute('''CREATE TABLE IF NOT EXISTS attendance (
-        id INTEGER PRIMARY KEY,
-        student_id TEXT,
-        subject_code TEXT,
-        date TEXT,
-        period TEXT,
-        status TEXT,
-        marked_by TEXT,
-        event_name TEXT
-    )''')
-
-    # seed users (20 students)
-    students = [
-        ('student1','pass123','student','Krishiv Karn','25030175','Section-J',1),
-        ('student2','pass123','student','Rahul Sharma','25030176','Section-J',1),
-        ('student3','pass123','student','Priya Singh','25030177','Section-J',1),
-        ('student4','pass123','student','Amit Kumar','25030178','Section-K',1),
-        ('student5','pass123','student','Neha Gupta','25030179','Section-K',1),
-        ('student6','pass123','student','Rohan Verma','25030180','Section-J',1),
-        ('student7','pass123','student','Anjali Patel','25030181','Section-J',1),
-        ('student8','pass123','student','Vikram Reddy','25030182','Section-K',1),
-        ('student9','pass123','student','Sneha Desai','25030183','Section-K',1),
-        ('student10','pass123','student','Arjun Mehta','25030184','Section-J',1),
-        ('student11','pass123','student','Pooja Joshi','25030185','Section-J',1),
-        ('student12','pass123','student','Karan Nair','25030186','Section-K',1),
-        ('student13','pass123','student','Divya Iyer','25030187','Section-K',1),
-        ('student14','pass123','student','Siddharth Rao','25030188','Section-J',1),
-        ('student15','pass123','student','Kavya Pillai','25030189','Section-J',1),
-        ('student16','pass123','student','Aditya Shah','25030190','Section-K',1),
-        ('student17','pass123','student','Riya Kapoor','25030191','Section-K',1),
-        ('student18','pass123','student','Varun Sinha','25030192','Section-J',1),
-        ('student19','pass123','student','Tanvi Agarwal','25030193','Section-J',1),
-        ('student20','pass123','student','Harsh Bansal','25030194','Section-K',1),
-    ]
-    for u in students:
-        username, pw, role, name, studid, section, year = u
-        hashed = generate_password_hash(pw)
-        try:
-            c.execute('INSERT INTO users (username,password,role,name,student_id,section,year) VALUES (?,?,?,?,?,?,?)',
-                      (username, hashed, role, name, studid, section, year))
-        except sqlite3.IntegrityError:
-            pass
-
-    # teachers
-    teachers = [
-        ('teacher1','pass123','teacher','Soham Bhandari', None, None, None),
-        ('teacher2','pass123','teacher','Mohit Kumar', None, None, None),
-        ('teacher3','pass123','teacher','Sunita Danu', None, None, None),
-        ('teacher4','pass123','teacher','Manvi Walia', None, None, None),
-    ]
-    for u in teachers:
-        username, pw, role, name, *_ = u
-        hashed = generate_password_hash(pw)
-        try:
-            c.execute('INSERT INTO users (username,password,role,name) VALUES (?,?,?,?)',
-                      (username, hashed, role, name))
-        except sqlite3.IntegrityError:
-            pass
-
-    # club leaders
-    clubs_users = [
-        ('club1','pass123','club','Tech Club Leader', None, None, None),
-        ('club2','pass123','club','Coding Club Leader', None, None, None),
-    ]
-    for u in clubs_users:
-        username, pw, role, name, *_ = u
-        hashed = generate_password_hash(pw)
-        try:
-            c.execute('INSERT INTO users (username,password,role,name) VALUES (?,?,?,?)',
-                      (username, hashed, role, name))
-        except sqlite3.IntegrityError:
-            pass
-
-    # vc
-    try:
-        c.execute('INSERT INTO users (username,password,role,name) VALUES (?,?,?,?)',
-                  ('vc', generate_password_hash('pass123'), 'vc', 'Vice Chancellor'))
-    except sqlite3.IntegrityError:
-        pass
-
-    # clubs table
-    clubs = [
-        ('Tech Innovation Club','club1','approved'),
-        ('Coding Society','club2','approved'),
-    ]
-    for cl in clubs:
-        try:
-            c.execute('INSERT INTO clubs (club_name, leader_username, status) VALUES (?,?,?)', cl)
-        except sqlite3.IntegrityError:
-            pass
-
-    # subjects
-    subjects = [
-        ('SE31164','Technical Training - Advance Programming in C','teacher1'),
-        ('VC31103','Environmental Studies-I','teacher2'),
-        ('CS32166','HTML5 and CSS Lab','teacher4'),
-        ('CS31101','Basics of Computer and C Programming','teacher3'),
-    ]
-    for s in subjects:
-        try:
-            c.execute('INSERT INTO subjects (subject_code, subject_name, teacher_username) VALUES (?,?,?)', s)
-        except sqlite3.IntegrityError:
-            pass
+    """Bring the schema to the current version (one PRAGMA read when it already is).
 
-    conn.commit()
-    conn.close()
+    Demo data is loaded separately: python seed.py
+    """
+    migrations.upgrade(DB_PATH, migrations.TH2_MIGRATIONS)
 
 # initialize DB once
 init_db()
 
+# background jobs (club uploads); see jobs.py
+job_queue = jobs.JobQueue(DB_PATH)
+
 
 # ---------- Utilities ----------
 def allowed_file(filename):
@@ -180,24 +69,19 @@ def allowed_file(filename):
     ext = filename.rsplit('.', 1)[1].lower()
     return ext in ALLOWED_EXT
 
-def read_uploaded_file(path):
-    """Return list of student_id strings read from uploaded Excel/CSV."""
-    ext = path.rsplit('.', 1)[1].lower()
-    if ext in ('xls','xlsx'):
-        df = pd.read_excel(path, engine='openpyxl')
-    else:
-        df = pd.read_csv(path)
-    # normalize column name possibilities
-    cols = [c.strip().lower() for c in df.columns]
-    sid_col = None
-    for candidate in ['student id', 'student_id', 'id', 'roll no', 'roll']:
-        if candidate in cols:
-            sid_col = df.columns[cols.index(candidate)]
-            break
-    if not sid_col:
-        raise ValueError('No Student ID column found (expected "Student ID").')
-    student_ids = df[sid_col].astype(str).str.strip().tolist()
-    return student_ids
+def read_uploaded_file(stream, filename):
+    """Return list of student_id strings read from an uploaded Excel/CSV file.
+
+    The upload is streamed (no temp file, no DataFrame); column detection is
+    shared with the root app via ingest.ID_COLUMN_CANDIDATES. ingest is
+    imported on first use so workers that never see an upload skip it.
+    """
+    import ingest
+    return ingest.read_student_ids(stream, filename)
+
+
+# login: cached principals lookup + rehash to the configured cost (auth.py)
+authenticator = auth.Authenticator(DB_PATH)
 
 
 # ---------- Routes ----------
@@ -210,13 +94,9 @@ def login():
     if request.method == 'POST':
         username = request.form.get('username','').strip()
         password = request.form.get('password','')
-        conn = get_db_conn()
-        c = conn.cursor()
-        c.execute('SELECT * FROM users WHERE username=?', (username,))
-        user = c.fetchone()
-        conn.close()
-        if user and check_password_hash(user['password'], password):
-            session['username'] = user['username']
+        user = authenticator.authenticate(username, password)
+        if user:
+            session['username'] = user['login']
             session['role'] = user['role']
             session['name'] = user['name']
             session.permanent = True
@@ -244,82 +124,142 @@ def student_dashboard():
     if 'username' not in session or session.get('role') != 'student':
         return redirect(url_for('login'))
     student_id = session.get('student_id')
+    key = student_page_key(student_id, session.get('name'))
+    return student_pages.respond(
+        key, lambda: render_template('student_dashboard.html', **student_dashboard_data(student_id)))
+
+# dashboard data loaders, shared with the async views in asgi.py
+def student_page_key(student_id, name):
+    """cache key of a student's dashboard: their data version plus today's date"""
+    conn = get_db_conn()
+    version = page_cache.student_version(conn, student_id)
+    conn.close()
+    return (student_id, name, datetime.now().strftime('%Y-%m-%d'), version)
+
+def student_dashboard_data(student_id):
     conn = get_db_conn()
+    # read before the data, so live updates resync if anything lands in between
+    live_since = live_updates.token(conn, 'th2', 'student', student_id)
     c = conn.cursor()
     c.execute('SELECT * FROM users WHERE student_id=?', (student_id,))
     student = c.fetchone()
     today = datetime.now().strftime('%Y-%m-%d')
-    c.execute('''SELECT s.subject_name, a.subject_code, a.period, a.status, a.marked_by, a.event_name
-                 FROM attendance a LEFT JOIN subjects s ON a.subject_code = s.subject_code
-                 WHERE a.student_id=? AND a.date=? ORDER BY a.period''', (student_id, today))
+    c.execute(student_history.TODAY_SQL, (student_id, today))
     today_attendance = c.fetchall()
-    # simple percent across all attendance rows
-    c.execute('SELECT COUNT(*) FROM attendance WHERE student_id=? AND status="P"', (student_id,))
-    present = c.fetchone()[0]
-    c.execute('SELECT COUNT(*) FROM attendance WHERE student_id=? AND status IN ("P","A")', (student_id,))
-    total = c.fetchone()[0]
+    # simple percent across all attendance rows (summary row kept by triggers)
+    totals = attendance_summary.student_totals(conn, student_id)
+    present = totals['present']
+    total = totals['present'] + totals['absent']
     percent = round((present/total*100) if total>0 else 0,2)
     conn.close()
-    return render_template('student_dashboard.html', student=student, today_attendance=today_attendance, attendance_percent=percent)
+    return dict(student=student, today_attendance=today_attendance, attendance_percent=percent,
+                today=today, live_since=live_since)
 
 # ---------- Teacher ----------
 @app.route('/teacher_portal', methods=['GET','POST'])
 def teacher_portal():
     if 'username' not in session or session.get('role') != 'teacher':
         return redirect(url_for('login'))
-    conn = get_db_conn()
-    c = conn.cursor()
-    c.execute('SELECT * FROM subjects WHERE teacher_username=?', (session['username'],))
-    subjects = c.fetchall()
+    section = request.args.get('section', '')
     if request.method == 'POST':
+        conn = get_db_conn()
         subject_code = request.form.get('subject_code')
         period = request.form.get('period')
         date = request.form.get('date')
-        # all students
-        c.execute('SELECT student_id, name, section FROM users WHERE role="student" ORDER BY section, name')
-        students = c.fetchall()
-        for s in students:
-            sid = s['student_id']
-            status = request.form.get(f'attendance_{sid}', 'N.M.')
-            # check existing
-            c.execute('SELECT id FROM attendance WHERE student_id=? AND subject_code=? AND date=? AND period=?',
-                      (sid, subject_code, date, period))
-            existing = c.fetchone()
-            if existing:
-                c.execute('UPDATE attendance SET status=?, marked_by=? WHERE id=?', (status, session['username'], existing['id']))
-            else:
-                c.execute('INSERT INTO attendance (student_id,subject_code,date,period,status,marked_by) VALUES (?,?,?,?,?,?)',
-                          (sid, subject_code, date, period, status, session['username']))
-        conn.commit()
+        sections = request.form.getlist('section')
+        # "all my sections": of those, the ones the timetable has for this teacher/subject in the slot
+        if len(sections) != 1:
+            sections = [s for s in timetable_index.teacher_sections(conn, session['username'], date, period,
+                                                                    subject_code)
+                        if s in sections] or sections
+        conn.close()
+        statuses = {k[len('attendance_'):]: v for k, v in request.form.items() if k.startswith('attendance_')}
+        # one transaction: section rosters + a single bulk upsert (acknowledged once committed)
+        changes = []
+        attendance_writes.submit(attendance_writer.write_subject_attendance, subject_code, date, period,
+                                 statuses, session['username'], sections=sections, changes=changes)
+        stats_cache.invalidate('stats')
+        live.publish_many(live_updates.attendance_events(changes))
         flash('Attendance saved!', 'success')
-    c.execute('SELECT student_id, name, section FROM users WHERE role="student" ORDER BY section, name')
-    students = c.fetchall()
+        section = sections[0] if len(sections) == 1 else ''
+    return render_template('teacher_portal.html', **teacher_portal_data(session['username'], section))
+
+def teacher_portal_data(username, section=''):
+    conn = get_db_conn()
+    c = conn.cursor()
+    c.execute('SELECT * FROM subjects WHERE teacher_username=?', (username,))
+    subjects = c.fetchall()
+    # sections on offer: the teacher's assigned ones, else any one section at a time
+    assigned = rosters.assigned_sections(conn, 'th2', username)
+    sections = assigned or rosters.sections(conn)
+    if not section and not assigned and sections:
+        section = sections[0]
+    selected_sections = [section] if section else assigned
+    students = roster_cache.get(conn, selected_sections)
+    # today's classes from the timetable
+    schedule = timetable_index.teacher_day(conn, username, datetime.now().strftime('%Y-%m-%d'))
     conn.close()
-    return render_template('teacher_portal.html', subjects=subjects, students=students)
+    return dict(subjects=subjects, students=students, sections=sections, section=section,
+                selected_sections=selected_sections, assigned=bool(assigned), schedule=schedule)
+
+# batch attendance API: many periods per request, deduplicated by Idempotency-Key (attendance_api.py)
+@app.route('/api/attendance/batch', methods=['POST'])
+def attendance_batch_api():
+    if 'username' not in session:
+        return jsonify({'error': 'not logged in'}), 401
+    if session.get('role') != 'teacher':
+        return jsonify({'error': 'forbidden'}), 403
+    username = session['username']
+    payload = request.get_json(silent=True)
+    conn = get_db_conn()
+    subjects = {r[0] for r in conn.execute('SELECT subject_code FROM subjects WHERE teacher_username=?', (username,))}
+    known_sections = set(rosters.sections(conn))
+    assigned = rosters.assigned_sections(conn, 'th2', username)
+    changes = []
+
+    def apply_block(raw):
+        block = attendance_api.parse_block(raw, subject=True)
+        if block['subject_code'] not in subjects:
+            raise ValueError(f"not your subject: {block['subject_code']!r}")
+        unknown = [s for s in block['sections'] if s not in known_sections]
+        if unknown:
+            raise ValueError(f"unknown section {', '.join(unknown)}")
+        # no section: the timetabled sections for the slot/subject, else the assigned ones
+        sections = (block['sections']
+                    or timetable_index.teacher_sections(conn, username, block['date'], block['period'],
+                                                        block['subject_code'])
+                    or assigned)
+        if not sections:
+            raise ValueError('"section" is required: no timetabled or assigned section for this slot')
+        records = attendance_writer.write_subject_attendance(conn, block['subject_code'], block['date'],
+                                                             block['period'], block['statuses'], username,
+                                                             sections=sections, changes=changes)
+        return {'sections': sections, 'records': records}
+
+    try:
+        key = attendance_api.idempotency_key(request.headers, payload)
+        status, body, replayed = attendance_api.run_batch(conn, username, key, payload, apply_block)
+    except attendance_api.RequestError as e:
+        return jsonify({'error': str(e)}), 400
+    finally:
+        conn.close()
+    if body.get('applied') and not replayed:
+        stats_cache.invalidate('stats')
+        live.publish_many(live_updates.attendance_events(changes))
+    response = jsonify(body)
+    if replayed:
+        response.headers['Idempotent-Replayed'] = 'true'
+    return response, status
 
 # ---------- Club ----------
 @app.route('/club_portal', methods=['GET','POST'])
 def club_portal():
     if 'username' not in session or session.get('role') != 'club':
         return redirect(url_for('login'))
-    conn = get_db_conn()
-    c = conn.cursor()
-    # find club for this leader
-    c.execute('SELECT * FROM clubs WHERE leader_username=?', (session['username'],))
-    club = c.fetchone()
-    if not club:
+    data = club_portal_data(session['username'])
+    if not data['club']:
         flash('No club assigned to this account', 'danger')
-        conn.close()
-        return render_template('club_portal.html', club=None, approvals=[], active_approvals=[])
-    club_id = club['id']
-    # approvals for this club
-    now_iso = datetime.utcnow().isoformat()
-    c.execute('''SELECT * FROM vc_approvals WHERE club_id=? ORDER BY id DESC''', (club_id,))
-    approvals = c.fetchall()
-    # active approvals (approved & within window)
-    c.execute('''SELECT * FROM vc_approvals WHERE club_id=? AND status='approved' 
-                 AND start_time <= ? AND end_time >= ?''', (club_id, now_iso, now_iso))
-    active = c.fetchall()
+        return render_template('club_portal.html', **data)
 
     if request.method == 'POST':
         file = request.files.get('file')
@@ -332,47 +272,168 @@ def club_portal():
             flash('Invalid file type', 'danger')
         else:
             # ensure approval still active
-            c.execute('SELECT * FROM vc_approvals WHERE id=? AND status="approved" AND start_time<=? AND end_time>=?',
-                      (approval_id, datetime.utcnow().isoformat(), datetime.utcnow().isoformat()))
+            conn = get_db_conn()
+            c = conn.cursor()
+            now = time.time()
+            c.execute('SELECT * FROM vc_approvals WHERE id=? AND status="approved" AND starts_at<=? AND expires_at>?',
+                      (approval_id, now, now))
             ok = c.fetchone()
+            conn.close()
             if not ok:
                 flash('Approval window is not active or valid', 'danger')
             else:
-                filename = secure_filename(file.filename)
-                ts = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
-                save_name = f"{ts}_{filename}"
-                path = os.path.join(app.config['UPLOAD_FOLDER'], save_name)
-                file.save(path)
-                try:
-                    student_ids = read_uploaded_file(path)
-                    # mark attendance: convert N.M. -> P for today's entries
-                    today = datetime.utcnow().strftime('%Y-%m-%d')
-                    marked = 0
-                    for sid in student_ids:
-                        # find records for today with N.M.
-                        c.execute('SELECT id, subject_code FROM attendance WHERE student_id=? AND date=? AND status IN ("N.M.","pending")', (sid, today))
-                        rows = c.fetchall()
-                        if not rows:
-                            # optionally create an Event-period attendance entry (if they have no classes marked)
-                            continue
-                        for r in rows:
-                            c.execute('UPDATE attendance SET status="P", marked_by=?, event_name=? WHERE id=?',
-                                      (session['username'], event_name, r['id']))
-                            marked += 1
-                    conn.commit()
-                    flash(f'Processed file, marked {marked} entries', 'success')
-                except Exception as e:
-                    flash(f'Error processing file: {str(e)}', 'danger')
-                finally:
-                    try:
-                        os.remove(path)
-                    except OSError:
-                        pass
+                # parsing and marking happen on a background worker, for the
+                # day of the upload even if the job runs (or is retried) later
+                job_id = job_queue.enqueue('club_upload', {
+                    'username': session['username'],
+                    'club_id': data['club']['id'],
+                    'event_name': event_name,
+                    'filename': file.filename,
+                    'date': datetime.now(timezone.utc).strftime('%Y-%m-%d'),
+                }, data=file.read(), owner=session['username'])
+                flash(f'File queued for processing (job #{job_id})', 'success')
+                return redirect(url_for('club_portal', job=job_id))
 
+    return render_template('club_portal.html', job_id=request.args.get('job', type=int), **data)
+
+def club_portal_data(username):
+    conn = get_db_conn()
+    c = conn.cursor()
+    # find club for this leader
+    c.execute('SELECT * FROM clubs WHERE leader_username=?', (username,))
+    club = c.fetchone()
+    if not club:
+        conn.close()
+        return dict(club=None, approvals=[], active_approvals=[])
+    club_id = club['id']
+    live_since = live_updates.token(conn, 'th2', 'club', club_id)
+    # approvals for this club
+    now = time.time()
+    c.execute('''SELECT * FROM vc_approvals WHERE club_id=? ORDER BY id DESC''', (club_id,))
+    approvals = c.fetchall()
+    # active approvals (approved & within window; expired ones are closed by portal_scheduler)
+    c.execute('''SELECT * FROM vc_approvals WHERE club_id=? AND status='approved' 
+                 AND starts_at <= ? AND expires_at > ?''', (club_id, now, now))
+    active = c.fetchall()
     conn.close()
-    return render_template('club_portal.html', club=club, approvals=approvals, active_approvals=active)
+    return dict(club=club, approvals=approvals, active_approvals=active, live_since=live_since)
+
+@job_queue.handler('club_upload')
+def club_upload_job(conn, payload, data):
+    student_ids = read_uploaded_file(io.BytesIO(data), payload['filename'])
+    # mark attendance: convert N.M. -> P for the upload day's entries, as one batch
+    # (jobs queued before the date was recorded use the day they run)
+    date = payload.get('date') or datetime.now(timezone.utc).strftime('%Y-%m-%d')
+    club_id = payload.get('club_id')
+    if club_id is None:
+        # queued before the club was recorded: the uploader's club
+        row = conn.execute('SELECT id FROM clubs WHERE leader_username=?', (payload['username'],)).fetchone()
+        club_id = row['id'] if row else None
+    changes = []
+    counts = attendance_writer.mark_event_present(conn, student_ids, date, payload['username'],
+                                                  payload['event_name'], club_id, changes=changes)
+    stats_cache.invalidate('stats')
+    live.publish_many(live_updates.attendance_events(changes))
+    message = (f"Processed file, marked {counts['marked']} entries for {counts['matched']} students; "
+               f"{counts['already_present']} already present, {counts['unmatched']} with nothing to mark on {date}")
+    return dict(counts, message=message)
+
+# ---------- live dashboard updates (server-sent events; live_updates.py) ----------
+# ?since= is the token the page was rendered with
+def live_stream(kind, key):
+    if request.args.get('poll'):
+        return jsonify({'since': live_probe(kind, key)})
+    try:
+        # each stream holds this WSGI thread: only LIVE_WSGI_STREAMS of them, the rest poll
+        sub = live.subscribe(f'{kind}:{key}', threaded=True)
+    except live_updates.NoStreamThread:
+        return '', 204
+    except live_updates.TooManyClients as e:
+        return jsonify({'error': str(e)}), 503
+    body = live_updates.EventStream(sub, lambda: live_probe(kind, key), request.args.get('since'))
+    return app.response_class(body, headers=live_updates.HEADERS)
+
+@app.route('/student_events')
+def student_events():
+    if 'username' not in session or session.get('role') != 'student':
+        return jsonify({'error': 'not logged in'}), 401
+    return live_stream('student', session.get('student_id'))
+
+@app.route('/club_events')
+def club_events():
+    if 'username' not in session or session.get('role') != 'club':
+        return jsonify({'error': 'not logged in'}), 401
+    club_id = leader_club_id(session['username'])
+    if club_id is None:
+        return jsonify({'error': 'no club for this account'}), 404
+    return live_stream('club', club_id)
+
+@app.route('/jobs/<int:job_id>')
+def job_status(job_id):
+    if 'username' not in session:
+        return jsonify({'error': 'not logged in'}), 401
+    job = job_queue.get(job_id)
+    if not job or (session.get('role') != 'vc' and job['owner'] != session['username']):
+        return jsonify({'error': 'job not found'}), 404
+    return jsonify(job)
 
 # ---------- VC ----------
+# clubs/approvals and attendance counters, cached in-process; writers
+# invalidate 'vc_portal' and/or 'stats' (see attendance_stats.py)
+stats_cache = attendance_stats.StatsCache()
+
+# sorted section rosters for teacher_portal, revalidated against roster_versions (rosters.py)
+roster_cache = rosters.RosterCache('th2')
+
+# rendered student dashboards with ETags, keyed on the student's data version (page_cache.py)
+student_pages = page_cache.PageCache('student_dashboard.html')
+
+# marks vc_approvals 'expired' when their end_time passes (portals.py)
+portal_scheduler = portals.PortalScheduler(DB_PATH, 'th2', on_expire=lambda count: stats_cache.invalidate('vc_portal'))
+portal_scheduler.start()
+# and in each worker a preloading server forks from this process
+app.before_request(portal_scheduler.start)
+
+# (section, weekday, period) -> teacher/subject, reloaded when timetable_versions moves (timetable.py)
+timetable_index = timetable.TimetableIndex('th2')
+
+# attendance submissions; with WRITE_BEHIND=1 one thread group-commits them (write_behind.py)
+attendance_writes = write_behind.GroupCommitWriter(DB_PATH, 'th2')
+
+# attendance and approval-window changes pushed to open dashboards over SSE;
+# published after the commit (live_updates.py)
+live = live_updates.Broker('th2')
+
+def live_probe(kind, key):
+    conn = get_db_conn()
+    try:
+        return live_updates.token(conn, 'th2', kind, key)
+    finally:
+        conn.close()
+
+def leader_club_id(username):
+    conn = get_db_conn()
+    row = conn.execute('SELECT id FROM clubs WHERE leader_username=?', (username,)).fetchone()
+    conn.close()
+    return row['id'] if row else None
+
+def load_vc_portal():
+    conn = get_db_conn()
+    c = conn.cursor()
+    c.execute('SELECT * FROM clubs')
+    clubs = c.fetchall()
+    c.execute('''SELECT va.*, c.club_name FROM vc_approvals va JOIN clubs c ON va.club_id=c.id ORDER BY va.id DESC''')
+    approvals = c.fetchall()
+    conn.close()
+    return clubs, approvals
+
+def load_stats(days=attendance_stats.STATS_DAYS):
+    conn = get_db_conn()
+    try:
+        return attendance_stats.snapshot(conn, 'th2', days)
+    finally:
+        conn.close()
+
 @app.route('/vc_portal', methods=['GET','POST'])
 def vc_portal():
     if 'username' not in session or session.get('role') != 'vc':
@@ -401,34 +462,102 @@ def vc_portal():
                 et = datetime.fromisoformat(end_time).isoformat()
             c.execute('INSERT INTO vc_approvals (club_id,event_name,start_time,end_time,status) VALUES (?,?,?,?,?)',
                       (club_id, event_name, st, et, 'approved'))
+            approval_id = c.lastrowid
             conn.commit()
+            portal_scheduler.wakeup()
+            live.publish(f'club:{club_id}', 'approval', {'id': approval_id, 'status': 'approved'})
             flash('Approval window created', 'success')
+        elif action == 'import_timetable':
+            file = request.files.get('file')
+            if not file or file.filename == '' or not allowed_file(file.filename):
+                flash('Upload a .csv, .xlsx or .xls timetable', 'danger')
+            else:
+                import ingest
+                try:
+                    result = timetable.import_rows(conn, 'th2', ingest.iter_rows(file.stream, file.filename),
+                                                   replace=bool(request.form.get('replace')))
+                except ValueError as e:
+                    flash(f'Timetable not imported: {e}', 'danger')
+                else:
+                    if result['error_count']:
+                        details = '; '.join(f'line {line}: {message}' for line, message in result['errors'][:5])
+                        flash(f"Timetable not imported: {result['error_count']} invalid rows ({details})", 'danger')
+                    else:
+                        flash(f"Timetable imported: {result['imported']} periods", 'success')
         elif action == 'revoke_approval':
             approval_id = request.form.get('approval_id')
+            approval = conn.execute('SELECT club_id FROM vc_approvals WHERE id=?', (approval_id,)).fetchone()
             c.execute('UPDATE vc_approvals SET status="revoked" WHERE id=?', (approval_id,))
             conn.commit()
+            if approval:
+                live.publish(f"club:{approval['club_id']}", 'approval', {'id': int(approval_id), 'status': 'revoked'})
             flash('Approval revoked', 'success')
-
-    # queries
-    c.execute('SELECT * FROM clubs')
-    clubs = c.fetchall()
-    c.execute('''SELECT va.*, c.club_name FROM vc_approvals va JOIN clubs c ON va.club_id=c.id ORDER BY va.id DESC''')
-    approvals = c.fetchall()
-    c.execute('SELECT COUNT(*) FROM attendance WHERE status="P"')
-    total_present = c.fetchone()[0]
-    c.execute('SELECT COUNT(*) FROM attendance WHERE status="A"')
-    total_absent = c.fetchone()[0]
-    c.execute('SELECT COUNT(*) FROM attendance WHERE event_name IS NOT NULL')
-    event_marked = c.fetchone()[0]
+        stats_cache.invalidate('vc_portal')
     conn.close()
-    stats = {'present': total_present, 'absent': total_absent, 'event_marked': event_marked}
-    return render_template('vc_portal.html', clubs=clubs, approvals=approvals, stats=stats)
+
+    return render_template('vc_portal.html', **vc_portal_data())
+
+def vc_portal_data():
+    # cached; counters come from attendance_stats instead of COUNT(*) scans
+    clubs, approvals = stats_cache.get('vc_portal', load_vc_portal)
+    return dict(clubs=clubs, approvals=approvals, stats=stats_cache.get('stats', load_stats)['totals'])
+
+@app.route('/vc_stats')
+def vc_stats():
+    if 'username' not in session or session.get('role') != 'vc':
+        return jsonify({'error': 'forbidden'}), 403
+    days = min(max(request.args.get('days', attendance_stats.STATS_DAYS, type=int), 1), 366)
+    return jsonify(stats_cache.get('stats', load_stats, days))
+
+# exam eligibility: percentages, shortages and classes needed for every student (eligibility.py)
+ELIGIBILITY_LIST_LIMIT = 200
+
+def eligibility_args():
+    threshold = min(max(request.args.get('threshold', 75.0, type=float), 1.0), 100.0)
+    return request.args.get('since') or None, request.args.get('until') or None, threshold
+
+def load_eligibility(since, until, threshold):
+    import eligibility  # loads NumPy; only this page needs it
+    conn = get_db_conn()
+    try:
+        return eligibility.eligibility_report(conn, 'th2', since, until, threshold, ELIGIBILITY_LIST_LIMIT)
+    finally:
+        conn.close()
+
+@app.route('/vc_eligibility')
+def vc_eligibility():
+    if 'username' not in session or session.get('role') != 'vc':
+        return redirect(url_for('login'))
+    since, until, threshold = eligibility_args()
+    if request.args.get('format') == 'csv':
+        import eligibility
+        conn = get_db_conn()
+        try:
+            matrix = eligibility.AttendanceMatrix.load(conn, 'th2', since, until)
+        finally:
+            conn.close()
+        out = io.StringIO()
+        matrix.write_csv(out, threshold)
+        return app.response_class(out.getvalue(), mimetype='text/csv',
+                                  headers={'Content-Disposition': 'attachment; filename=eligibility.csv'})
+    report = stats_cache.get('eligibility', load_eligibility, since, until, threshold)
+    return render_template('vc_eligibility.html', report=report)
+
+@app.route('/vc_db_stats')
+def vc_db_stats():
+    if 'username' not in session or session.get('role') != 'vc':
+        return redirect(url_for('login'))
+    return jsonify(dict(db_pool.get_pool(DB_PATH).metrics(), write_behind=attendance_writes.metrics()))
 
 # static file route (optional)
 @app.route('/uploads/<path:filename>')
 def uploads_serve(filename):
     return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
 
+@app.route('/shared/<path:filename>')
+def shared_static(filename):
+    return send_from_directory(SHARED_STATIC, filename)
+
 if __name__ == '__main__':
     # run on localhost for dev
     app.run(debug=True, host='127.0.0.1', port=5000)
@@ -1,25 +1,26 @@
 # excel_sample.py
-import pandas as pd
+from openpyxl import Workbook
 
 def generate_sample_excel(filename='sample_event_attendance.xlsx'):
-    data = {
-        'Name': [
-            'Krishiv Karn','Rahul Sharma','Priya Singh','Amit Kumar','Neha Gupta',
-            'Rohan Verma','Anjali Patel','Vikram Reddy','Sneha Desai','Arjun Mehta'
-        ],
-        'Student ID': [
-            '25030175','25030176','25030177','25030178','25030179',
-            '25030180','25030181','25030182','25030183','25030184'
-        ],
-        'Section': [
-            'Section-J','Section-J','Section-J','Section-K','Section-K',
-            'Section-J','Section-J','Section-K','Section-K','Section-J'
-        ],
-        'Year': [1]*10
-    }
-    df = pd.DataFrame(data)
-    df.to_excel(filename, index=False, sheet_name='Event Attendance')
-    print(f"Saved: {filename} ({len(df)} rows)")
+    names = [
+        'Krishiv Karn','Rahul Sharma','Priya Singh','Amit Kumar','Neha Gupta',
+        'Rohan Verma','Anjali Patel','Vikram Reddy','Sneha Desai','Arjun Mehta'
+    ]
+    student_ids = [
+        '25030175','25030176','25030177','25030178','25030179',
+        '25030180','25030181','25030182','25030183','25030184'
+    ]
+    sections = [
+        'Section-J','Section-J','Section-J','Section-K','Section-K',
+        'Section-J','Section-J','Section-K','Section-K','Section-J'
+    ]
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Event Attendance')
+    ws.append(['Name', 'Student ID', 'Section', 'Year'])
+    for row in zip(names, student_ids, sections, [1]*10):
+        ws.append(list(row))
+    wb.save(filename)
+    print(f"Saved: {filename} ({len(names)} rows)")
 
 if __name__ == '__main__':
     generate_sample_excel()
@@ -0,0 +1,138 @@
+"""Demo data for TH2/database.db.
+
+The app only brings the schema up to date when it starts; demo accounts,
+clubs, subjects, teaching assignments and the timetable are loaded explicitly:
+
+    python seed.py                  # TH2/database.db (or $TH2_DB)
+    python seed.py --db other.db
+
+Rows go in with executemany and INSERT OR IGNORE / NOT EXISTS, so re-running
+is harmless, and each distinct password is hashed once.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+DB_PATH = os.environ.get('TH2_DB', os.path.join(BASE_DIR, 'database.db'))
+
+# shared modules live in the repository root
+sys.path.insert(0, os.path.dirname(BASE_DIR))
+import auth
+import migrations
+
+# (username, password, role, name, student_id, section, year)
+STUDENTS = [
+    ('student1','pass123','student','Krishiv Karn','25030175','Section-J',1),
+    ('student2','pass123','student','Rahul Sharma','25030176','Section-J',1),
+    ('student3','pass123','student','Priya Singh','25030177','Section-J',1),
+    ('student4','pass123','student','Amit Kumar','25030178','Section-K',1),
+    ('student5','pass123','student','Neha Gupta','25030179','Section-K',1),
+    ('student6','pass123','student','Rohan Verma','25030180','Section-J',1),
+    ('student7','pass123','student','Anjali Patel','25030181','Section-J',1),
+    ('student8','pass123','student','Vikram Reddy','25030182','Section-K',1),
+    ('student9','pass123','student','Sneha Desai','25030183','Section-K',1),
+    ('student10','pass123','student','Arjun Mehta','25030184','Section-J',1),
+    ('student11','pass123','student','Pooja Joshi','25030185','Section-J',1),
+    ('student12','pass123','student','Karan Nair','25030186','Section-K',1),
+    ('student13','pass123','student','Divya Iyer','25030187','Section-K',1),
+    ('student14','pass123','student','Siddharth Rao','25030188','Section-J',1),
+    ('student15','pass123','student','Kavya Pillai','25030189','Section-J',1),
+    ('student16','pass123','student','Aditya Shah','25030190','Section-K',1),
+    ('student17','pass123','student','Riya Kapoor','25030191','Section-K',1),
+    ('student18','pass123','student','Varun Sinha','25030192','Section-J',1),
+    ('student19','pass123','student','Tanvi Agarwal','25030193','Section-J',1),
+    ('student20','pass123','student','Harsh Bansal','25030194','Section-K',1),
+]
+
+# teachers, club leaders and the VC
+STAFF = [
+    ('teacher1','pass123','teacher','Soham Bhandari', None, None, None),
+    ('teacher2','pass123','teacher','Mohit Kumar', None, None, None),
+    ('teacher3','pass123','teacher','Sunita Danu', None, None, None),
+    ('teacher4','pass123','teacher','Manvi Walia', None, None, None),
+    ('club1','pass123','club','Tech Club Leader', None, None, None),
+    ('club2','pass123','club','Coding Club Leader', None, None, None),
+    ('vc','pass123','vc','Vice Chancellor', None, None, None),
+]
+
+CLUBS = [
+    ('Tech Innovation Club','club1','approved'),
+    ('Coding Society','club2','approved'),
+]
+
+SUBJECTS = [
+    ('SE31164','Technical Training - Advance Programming in C','teacher1'),
+    ('VC31103','Environmental Studies-I','teacher2'),
+    ('CS32166','HTML5 and CSS Lab','teacher4'),
+    ('CS31101','Basics of Computer and C Programming','teacher3'),
+]
+
+# (teacher_username, subject_code, section)
+ASSIGNMENTS = [
+    ('teacher1','SE31164','Section-J'), ('teacher1','SE31164','Section-K'),
+    ('teacher2','VC31103','Section-J'), ('teacher2','VC31103','Section-K'),
+    ('teacher3','CS31101','Section-J'),
+    ('teacher4','CS32166','Section-K'),
+]
+
+# (section, weekday, period, teacher_username, subject_code): Monday-Friday,
+# periods P1-P4, rotating each section's assigned subjects (offset per
+# section, so no teacher is in two rooms at once)
+def _timetable():
+    rows = []
+    for offset, section in enumerate(sorted({a[2] for a in ASSIGNMENTS})):
+        classes = [a[:2] for a in ASSIGNMENTS if a[2] == section]
+        rows += [(section, weekday, f'P{period}') + classes[(weekday + period + offset) % len(classes)]
+                 for weekday in range(1, 6) for period in range(1, 5)]
+    return rows
+
+
+TIMETABLE = _timetable()
+
+
+def seed(conn, policy=None):
+    """Insert whichever demo rows are missing; returns the number of users added."""
+    policy = policy or auth.HashPolicy()
+    users = STUDENTS + STAFF
+    hashes = {pw: policy.hash(pw) for pw in {u[1] for u in users}}
+    migrations.migrate(conn, migrations.TH2_MIGRATIONS)
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        added = conn.executemany(
+            'INSERT OR IGNORE INTO users (username,password,role,name,student_id,section,year) VALUES (?,?,?,?,?,?,?)',
+            [(u[0], hashes[u[1]]) + u[2:] for u in users]).rowcount
+        conn.executemany('INSERT OR IGNORE INTO clubs (club_name, leader_username, status) VALUES (?,?,?)', CLUBS)
+        # subject_code carries no UNIQUE constraint; skip codes already present
+        conn.executemany('''INSERT INTO subjects (subject_code, subject_name, teacher_username)
+                            SELECT ?1, ?2, ?3 WHERE NOT EXISTS (SELECT 1 FROM subjects WHERE subject_code = ?1)''',
+                         SUBJECTS)
+        conn.executemany('INSERT OR IGNORE INTO teaching_assignments (teacher_username, subject_code, section) '
+                         'VALUES (?,?,?)', ASSIGNMENTS)
+        conn.executemany('INSERT OR IGNORE INTO timetable (section, weekday, period, teacher_username, subject) '
+                         'VALUES (?,?,?,?,?)', TIMETABLE)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return added
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load the TH2 demo accounts, clubs and subjects.')
+    parser.add_argument('--db', default=DB_PATH, help='database path (default: TH2/database.db or $TH2_DB)')
+    args = parser.parse_args(argv)
+    start = time.perf_counter()
+    conn = sqlite3.connect(args.db, timeout=30, isolation_level=None)
+    try:
+        added = seed(conn)
+    finally:
+        conn.close()
+    print(f'{args.db}: {added} users added in {time.perf_counter() - start:.2f}s')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,293 @@
+"""Columnar exports of attendance data for reports (Parquet or Arrow IPC).
+
+Each exported table is written as one compressed file per day, Hive style:
+
+    exports/attendance/date=2026-10-18/part-0.parquet
+    exports/club_events/date=2026-10-18/part-0.parquet
+    exports/event_attendance/date=2026-10-18/part-0.parquet   # by the event's date
+
+which pandas, pyarrow, DuckDB or Spark read as one partitioned dataset.
+
+The export reads through a read-only connection inside one read transaction:
+under WAL that is a consistent snapshot that never blocks the apps' writers.
+Rows are streamed in chunks of CHUNK_ROWS, so memory stays flat whatever the
+semester size.
+
+Exports are incremental. Triggers bump a version in ``export_partitions``
+for every (table, day) whose rows are inserted, changed or deleted; the
+versions written last time are kept in ``_export_state.json`` next to the
+files, and a run rewrites only the days whose version moved.
+
+Usage:
+    python analytics_export.py --out exports               # attendance.db, changed days only
+    python analytics_export.py th2 --out exports/th2 --full
+    python analytics_export.py --format arrow --out exports/arrow
+
+Needs pyarrow (pip install pyarrow); the apps themselves do not.
+"""
+import json
+import os
+import sqlite3
+import sys
+import time
+from urllib.parse import quote
+
+import targets
+
+CHUNK_ROWS = 50000
+STATE_FILE = '_export_state.json'
+FORMATS = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+# Exported tables per database. 'source' is the FROM clause (the table is
+# aliased t), 'day' the partition column in it and 'trigger_day' the same
+# value for a NEW/OLD row. 'cascade' names tables whose partitions also move
+# when a row here changes.
+TABLES = {
+    'root': {
+        'attendance': {
+            'columns': [('attendance_id', 'int'), ('student_id', 'str'), ('teacher_id', 'str'), ('date', 'str'),
+                        ('period', 'int'), ('status', 'str'), ('marked_by_club', 'int'), ('club_event_id', 'int')],
+            'key': 'attendance_id',
+            'source': 'attendance t',
+            'day': 't.date',
+            'trigger_day': '{ref}.date',
+        },
+        'club_events': {
+            'columns': [('event_id', 'int'), ('club_id', 'str'), ('event_name', 'str'), ('event_date', 'str'),
+                        ('period', 'int'), ('status', 'str'), ('created_at', 'str')],
+            'key': 'event_id',
+            'source': 'club_events t',
+            'day': 't.event_date',
+            'trigger_day': '{ref}.event_date',
+            'cascade': ['event_attendance'],
+        },
+        'event_attendance': {
+            'columns': [('event_attendance_id', 'int'), ('event_id', 'int'), ('student_id', 'str')],
+            'key': 'event_attendance_id',
+            'source': 'event_attendance t JOIN club_events ce ON ce.event_id = t.event_id',
+            'day': 'ce.event_date',
+            'trigger_day': '(SELECT event_date FROM club_events WHERE event_id = {ref}.event_id)',
+        },
+    },
+    'th2': {
+        'attendance': {
+            'columns': [('id', 'int'), ('student_id', 'str'), ('subject_code', 'str'), ('date', 'str'),
+                        ('period', 'str'), ('status', 'str'), ('marked_by', 'str'), ('event_name', 'str')],
+            'key': 'id',
+            'source': 'attendance t',
+            'day': 't.date',
+            'trigger_day': '{ref}.date',
+        },
+    },
+}
+
+
+# ---------- change tracking (see migrations.py) ----------
+
+def _bump(table, day, where='1'):
+    return f'''INSERT INTO export_partitions (tbl, day, version)
+               SELECT '{table}', {day}, 1 WHERE {day} IS NOT NULL AND {where}
+               ON CONFLICT (tbl, day) DO UPDATE SET version = version + 1;'''
+
+
+def schema(target):
+    """CREATE statements for export_partitions, the other tables' triggers and the per-day read index."""
+    statements = [
+        '''CREATE TABLE IF NOT EXISTS export_partitions (
+            tbl TEXT NOT NULL,
+            day TEXT NOT NULL,
+            version INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (tbl, day)
+        ) WITHOUT ROWID''',
+        # one day's attendance at a time without scanning the table
+        'CREATE INDEX IF NOT EXISTS ix_attendance_date ON attendance (date)',
+    ]
+    for name in TABLES[target]:
+        if name == 'attendance':
+            continue  # part of the shared attendance triggers (trigger_sql)
+
+        def trigger(event, body):
+            return targets.trigger(f'trg_export_{name}_{event.split()[-1].lower()}', event, name, body)
+
+        bump = _trigger_bumps(target, name)
+        statements += [trigger('AFTER INSERT', bump['insert']), trigger('AFTER DELETE', bump['delete']),
+                       trigger('AFTER UPDATE', bump['update'])]
+    return statements
+
+
+def _trigger_bumps(target, name):
+    spec = TABLES[target][name]
+    tables = [name] + spec.get('cascade', [])
+    new, old = spec['trigger_day'].format(ref='NEW'), spec['trigger_day'].format(ref='OLD')
+    return {
+        'insert': [_bump(t, new) for t in tables],
+        'delete': [_bump(t, old) for t in tables],
+        # a row moved to another day changes both partitions
+        'update': [_bump(t, new) for t in tables] + [_bump(t, old, f'{old} IS NOT {new}') for t in tables],
+    }
+
+
+def trigger_sql(target):
+    """Statements the attendance triggers (migrations.attendance_triggers) run for attendance's partitions."""
+    bumps = _trigger_bumps(target, 'attendance')
+    # 'update' is for a row that kept its date: only NEW's partition changed
+    return dict(bumps, keys=('date',), update=bumps['insert'])
+
+
+def rebuild_sql(target):
+    """Statements marking every day that has rows as changed (after a load that bypassed the triggers)."""
+    return [f'''INSERT INTO export_partitions (tbl, day, version)
+                SELECT '{name}', {spec['day']}, 1 FROM {spec['source']} WHERE {spec['day']} IS NOT NULL
+                GROUP BY 2
+                ON CONFLICT (tbl, day) DO UPDATE SET version = version + 1''' for name, spec in TABLES[target].items()]
+
+
+def rebuild(conn, target):
+    targets.rebuild(conn, rebuild_sql(target))
+
+
+# ---------- export ----------
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet  # noqa: F401  (registers pyarrow.parquet)
+    except ImportError:
+        raise RuntimeError('analytics exports need pyarrow: pip install pyarrow') from None
+    return pyarrow
+
+
+def snapshot_connection(path):
+    """Read-only connection holding an open read transaction (a WAL snapshot)."""
+    conn = sqlite3.connect(f'file:{quote(os.path.abspath(path))}?mode=ro', uri=True, isolation_level=None)
+    conn.execute('BEGIN')
+    # the snapshot starts with the first read; take it before anything else
+    conn.execute('SELECT COUNT(*) FROM export_partitions').fetchone()
+    return conn
+
+
+def partition_versions(conn, table):
+    return dict(conn.execute('SELECT day, version FROM export_partitions WHERE tbl = ?', (table,)))
+
+
+def _partition_path(out_dir, table, day, fmt):
+    # Hive-style partition directory; quote() keeps odd day values inside it
+    return os.path.join(out_dir, table, f"date={quote(day, safe='-')}", 'part-0' + FORMATS[fmt])
+
+
+def _arrow_schema(pa, spec):
+    types = {'int': pa.int64(), 'str': pa.string()}
+    return pa.schema([(column, types[kind]) for column, kind in spec['columns']])
+
+
+def write_partition(conn, spec, day, path, fmt='parquet', chunk_rows=CHUNK_ROWS):
+    """Stream one day of a table into path (written atomically); returns the row count.
+
+    A day that no longer has rows has its file removed.
+    """
+    pa = _pyarrow()
+    schema = _arrow_schema(pa, spec)
+    columns = ', '.join(f't.{column}' for column, _ in spec['columns'])
+    cursor = conn.execute(f"SELECT {columns} FROM {spec['source']} WHERE {spec['day']} = ? "
+                          f"ORDER BY t.{spec['key']}", (day,))
+    rows = cursor.fetchmany(chunk_rows)
+    if not rows:
+        if os.path.exists(path):
+            os.remove(path)
+        return 0
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    if fmt == 'parquet':
+        writer = pa.parquet.ParquetWriter(tmp, schema, compression='zstd')
+    else:
+        writer = pa.ipc.new_file(tmp, schema, options=pa.ipc.IpcWriteOptions(compression='zstd'))
+    count = 0
+    try:
+        while rows:
+            batch = pa.RecordBatch.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)], schema=schema)
+            writer.write_batch(batch)
+            count += len(rows)
+            rows = cursor.fetchmany(chunk_rows)
+    finally:
+        writer.close()
+    os.replace(tmp, path)
+    return count
+
+
+def _load_state(out_dir, target, fmt):
+    try:
+        with open(os.path.join(out_dir, STATE_FILE)) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    # files of another database or format are not the ones on record
+    if state.get('target') != target or state.get('format') != fmt:
+        return {}
+    return state.get('tables', {})
+
+
+def _save_state(out_dir, target, fmt, tables):
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, STATE_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump({'target': target, 'format': fmt, 'exported_at': time.time(), 'tables': tables}, f, indent=1)
+    os.replace(path + '.tmp', path)
+
+
+def export(path, target, out_dir, fmt='parquet', full=False, tables=None, chunk_rows=CHUNK_ROWS):
+    """Export the changed days (every day when full) of each table; returns per-table counts.
+
+    The state file is written last, so an interrupted run simply redoes its
+    days next time.
+    """
+    _pyarrow()
+    specs = TABLES[target]
+    state = {} if full else _load_state(out_dir, target, fmt)
+    summary = {}
+    conn = snapshot_connection(path)
+    try:
+        for table in tables or specs:
+            versions = partition_versions(conn, table)
+            done = dict(state.get(table, {}))
+            changed = sorted(day for day, version in versions.items() if done.get(day) != version)
+            rows = 0
+            for day in changed:
+                rows += write_partition(conn, specs[table], day, _partition_path(out_dir, table, day, fmt),
+                                        fmt, chunk_rows)
+                done[day] = versions[day]
+            state[table] = done
+            summary[table] = {'days': len(changed), 'unchanged': len(versions) - len(changed), 'rows': rows}
+    finally:
+        conn.close()
+    _save_state(out_dir, target, fmt, state)
+    return summary
+
+
+def main(argv=None):
+    parser = targets.argument_parser('Export attendance tables to partitioned Parquet/Arrow files.')
+    parser.add_argument('--out', default='exports', help='output directory (default: exports)')
+    parser.add_argument('--format', choices=sorted(FORMATS), default='parquet')
+    parser.add_argument('--tables', nargs='+', help='subset of tables to export')
+    parser.add_argument('--full', action='store_true', help='rewrite every day, not only the changed ones')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    args = parser.parse_args(argv)
+
+    unknown = set(args.tables or ()) - set(TABLES[args.target])
+    if unknown:
+        parser.error(f"unknown tables for {args.target}: {', '.join(sorted(unknown))}")
+    start = time.perf_counter()
+    try:
+        summary = export(args.db or targets.DB_PATHS[args.target], args.target, args.out, args.format,
+                         args.full, args.tables, args.chunk_rows)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
+    for table, counts in summary.items():
+        print(f"{table:<18} {counts['days']:>5} days written ({counts['rows']} rows), {counts['unchanged']} unchanged")
+    print(f'exported to {args.out} in {time.perf_counter() - start:.2f}s')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,23 +1,124 @@
 from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
-import sqlite3
-import pandas as pd
 import os
-from datetime import datetime
-from werkzeug.utils import secure_filename
+import time
+from datetime import datetime, timedelta
+import db_pool
+import migrations
+import attendance_writer
+import jobs
+import attendance_summary
+import attendance_stats
+import auth
+import instrumentation
+import rosters
+import page_cache
+import portals
+import timetable
+import attendance_api
+import write_behind
+import live_updates
+import student_history
+import io
 
 app = Flask(__name__)
 app.secret_key = 'your_secret_key_here_change_in_production'
-app.config['UPLOAD_FOLDER'] = 'uploads'
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
-# Ensure upload folder exists
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+# Opt-in request/SQL metrics at /metrics (INSTRUMENTATION=1); see instrumentation.py
+instrumentation.init_app(app)
 
-# Database connection helper
+DB_NAME = os.environ.get('ATTENDANCE_DB', 'attendance.db')
+
+# Bring an existing attendance.db up to the current schema (indexes etc.)
+migrations.upgrade(DB_NAME, migrations.ROOT_MIGRATIONS)
+
+# Database connection helper (pooled, WAL mode; close() returns it to the pool)
 def get_db_connection():
-    conn = sqlite3.connect('attendance.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+    return db_pool.get_connection(DB_NAME)
+
+# Attendance history: the dashboard renders this many recent days, older
+# records are lazy-loaded page by page from the JSON API
+HISTORY_RECENT_DAYS = 28
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+
+# Background jobs (uploads, approvals); see jobs.py
+job_queue = jobs.JobQueue(DB_NAME)
+
+# VC dashboard data and attendance counters, cached in-process; the write
+# routes below invalidate 'vc_dashboard' and/or 'stats' (see attendance_stats.py)
+stats_cache = attendance_stats.StatsCache()
+
+# Sorted section rosters for the teacher dashboard, revalidated against
+# roster_versions on every read (see rosters.py)
+roster_cache = rosters.RosterCache('root')
+
+# Rendered student dashboards with ETags, keyed on the student's data version,
+# which triggers bump on every attendance write (see page_cache.py)
+student_pages = page_cache.PageCache('student_dashboard.html')
+
+# Closes portal_access windows when opened_at + duration_hours passes (see portals.py)
+portal_scheduler = portals.PortalScheduler(DB_NAME, 'root',
+                                           on_expire=lambda count: stats_cache.invalidate('vc_dashboard'))
+portal_scheduler.start()
+# and in each worker a preloading server forks from this process
+app.before_request(portal_scheduler.start)
+
+# (section, weekday, period) -> teacher, reloaded when timetable_versions moves (see timetable.py)
+timetable_index = timetable.TimetableIndex('root')
+
+# Attendance submissions; with WRITE_BEHIND=1 one thread group-commits them (see write_behind.py)
+attendance_writes = write_behind.GroupCommitWriter(DB_NAME, 'root')
+
+# Attendance and event-status changes pushed to open dashboards over SSE; writers
+# publish after their commit (see live_updates.py)
+live = live_updates.Broker('root')
+
+def live_probe(kind, key):
+    conn = get_db_connection()
+    try:
+        return live_updates.token(conn, 'root', kind, key)
+    finally:
+        conn.close()
+
+def load_vc_dashboard():
+    conn = get_db_connection()
+    
+    # Get all clubs
+    clubs = conn.execute('SELECT * FROM clubs').fetchall()
+    
+    # Get pending events
+    pending_events = conn.execute('''
+        SELECT ce.*, c.club_name 
+        FROM club_events ce 
+        JOIN clubs c ON ce.club_id = c.club_id 
+        WHERE ce.status = 'pending'
+        ORDER BY ce.event_date DESC
+    ''', ).fetchall()
+    
+    # Get portal access status
+    portal_access = conn.execute('''
+        SELECT pa.*, c.club_name 
+        FROM portal_access pa 
+        JOIN clubs c ON pa.club_id = c.club_id
+        ORDER BY pa.is_active DESC, pa.opened_at DESC
+    ''').fetchall()
+    
+    conn.close()
+    return {'clubs': clubs, 'pending_events': pending_events, 'portal_access': portal_access}
+
+def load_stats(days=attendance_stats.STATS_DAYS):
+    conn = get_db_connection()
+    try:
+        return attendance_stats.snapshot(conn, 'root', days)
+    finally:
+        conn.close()
+
+# Login: one principals lookup (cached) and a policy-cost hash check; see auth.py
+authenticator = auth.Authenticator(DB_NAME)
+
+DASHBOARDS = {'student': 'student_dashboard', 'teacher': 'teacher_dashboard',
+              'club': 'club_dashboard', 'vc': 'vc_dashboard'}
 
 # Login route
 @app.route('/', methods=['GET', 'POST'])
@@ -27,49 +128,13 @@ def login():
         password = request.form['password']
         role = request.form['role']
         
-        conn = get_db_connection()
-        
-        if role == 'student':
-            user = conn.execute('SELECT * FROM students WHERE student_id = ? AND password = ?',
-                               (username, password)).fetchone()
-            if user:
-                session['user_id'] = user['student_id']
-                session['role'] = 'student'
-                session['name'] = user['name']
-                conn.close()
-                return redirect(url_for('student_dashboard'))
+        user = authenticator.authenticate(username, password, role) if role in DASHBOARDS else None
+        if user:
+            session['user_id'] = user['login']
+            session['role'] = user['role']
+            session['name'] = user['name']
+            return redirect(url_for(DASHBOARDS[user['role']]))
         
-        elif role == 'teacher':
-            user = conn.execute('SELECT * FROM teachers WHERE teacher_id = ? AND password = ?',
-                               (username, password)).fetchone()
-            if user:
-                session['user_id'] = user['teacher_id']
-                session['role'] = 'teacher'
-                session['name'] = user['name']
-                conn.close()
-                return redirect(url_for('teacher_dashboard'))
-        
-        elif role == 'club':
-            user = conn.execute('SELECT * FROM clubs WHERE club_id = ? AND password = ?',
-                               (username, password)).fetchone()
-            if user:
-                session['user_id'] = user['club_id']
-                session['role'] = 'club'
-                session['name'] = user['club_name']
-                conn.close()
-                return redirect(url_for('club_dashboard'))
-        
-        elif role == 'vc':
-            user = conn.execute('SELECT * FROM vc WHERE vc_id = ? AND password = ?',
-                               (username, password)).fetchone()
-            if user:
-                session['user_id'] = user['vc_id']
-                session['role'] = 'vc'
-                session['name'] = user['name']
-                conn.close()
-                return redirect(url_for('vc_dashboard'))
-        
-        conn.close()
         flash('Invalid credentials!', 'error')
     
     return render_template('login.html')
@@ -80,39 +145,80 @@ def student_dashboard():
     if 'role' not in session or session['role'] != 'student':
         return redirect(url_for('login'))
     
-    conn = get_db_connection()
     student_id = session['user_id']
+    key = student_page_key(student_id, session.get('name'))
+    return student_pages.respond(
+        key, lambda: render_template('student_dashboard.html', **student_dashboard_data(student_id)))
+
+# Dashboard data loaders: shared by the views here and the async views in asgi.py
+def student_page_key(student_id, name):
+    """Cache key of a student's dashboard: changes with their data version and the day."""
+    conn = get_db_connection()
+    version = page_cache.student_version(conn, student_id)
+    conn.close()
+    return (student_id, name, datetime.now().strftime('%Y-%m-%d'), version)
+
+def student_dashboard_data(student_id):
+    conn = get_db_connection()
+    
+    # Read before the data, so live updates resync if anything lands in between
+    live_since = live_updates.token(conn, 'root', 'student', student_id)
     
     # Get student info
     student = conn.execute('SELECT * FROM students WHERE student_id = ?', (student_id,)).fetchone()
     
-    # Get attendance records
-    attendance = conn.execute('''
-        SELECT a.*, t.name as teacher_name, t.subject 
-        FROM attendance a 
-        JOIN teachers t ON a.teacher_id = t.teacher_id 
-        WHERE a.student_id = ? 
-        ORDER BY a.date DESC, a.period DESC
-    ''', (student_id,)).fetchall()
+    # Get the last few weeks of attendance records; older pages are lazy-loaded
+    since = (datetime.now() - timedelta(days=HISTORY_RECENT_DAYS)).strftime('%Y-%m-%d')
+    attendance = student_history.fetch_page(conn, student_id, HISTORY_MAX_PAGE_SIZE, date_from=since)
     
-    # Calculate statistics
-    total_classes = len(attendance)
-    present = len([a for a in attendance if a['status'] == 'P'])
-    absent = len([a for a in attendance if a['status'] == 'A'])
-    not_marked = len([a for a in attendance if a['status'] == 'N.M.'])
+    # Statistics come from the trigger-maintained summary row
+    totals = attendance_summary.student_totals(conn, student_id)
+    total_classes = totals['total']
+    present = totals['present']
+    absent = totals['absent']
+    not_marked = totals['not_marked']
     
     attendance_percentage = (present / total_classes * 100) if total_classes > 0 else 0
     
     conn.close()
     
-    return render_template('student_dashboard.html', 
-                          student=student,
-                          attendance=attendance,
-                          total_classes=total_classes,
-                          present=present,
-                          absent=absent,
-                          not_marked=not_marked,
-                          attendance_percentage=round(attendance_percentage, 2))
+    return dict(student=student,
+                attendance=attendance,
+                history_since=since,
+                total_classes=total_classes,
+                present=present,
+                absent=absent,
+                not_marked=not_marked,
+                attendance_percentage=round(attendance_percentage, 2),
+                live_since=live_since)
+
+# Attendance history API (keyset pagination on date, period)
+@app.route('/api/student/<student_id>/attendance')
+def student_attendance_api(student_id):
+    if 'role' not in session:
+        return jsonify({'error': 'not logged in'}), 401
+    if session['role'] == 'student' and session['user_id'] != student_id:
+        return jsonify({'error': 'forbidden'}), 403
+    if session['role'] == 'club':
+        return jsonify({'error': 'forbidden'}), 403
+    
+    before = None
+    if request.args.get('before_date'):
+        before = (request.args['before_date'], request.args.get('before_period', type=int, default=0))
+    limit = min(max(request.args.get('limit', type=int, default=HISTORY_PAGE_SIZE), 1), HISTORY_MAX_PAGE_SIZE)
+    
+    conn = get_db_connection()
+    # fetch one extra row to know whether another page exists
+    rows = student_history.fetch_page(conn, student_id, limit + 1, before=before,
+                                      date_from=request.args.get('from'), date_to=request.args.get('to'))
+    conn.close()
+    
+    records = [dict(r) for r in rows[:limit]]
+    next_page = None
+    if len(rows) > limit:
+        last = records[-1]
+        next_page = {'before_date': last['date'], 'before_period': last['period']}
+    return jsonify({'records': records, 'next': next_page})
 
 # Teacher Dashboard
 @app.route('/teacher/dashboard')
@@ -120,14 +226,22 @@ def teacher_dashboard():
     if 'role' not in session or session['role'] != 'teacher':
         return redirect(url_for('login'))
     
+    return render_template('teacher_dashboard.html',
+                          **teacher_dashboard_data(session['user_id'], request.args.get('section', '')))
+
+def teacher_dashboard_data(teacher_id, section=''):
     conn = get_db_connection()
-    teacher_id = session['user_id']
     
     # Get teacher info
     teacher = conn.execute('SELECT * FROM teachers WHERE teacher_id = ?', (teacher_id,)).fetchone()
     
-    # Get all students
-    students = conn.execute('SELECT * FROM students ORDER BY section, name').fetchall()
+    # Sections on offer: the teacher's assigned ones, else any one section at a time
+    assigned = rosters.assigned_sections(conn, 'root', teacher_id)
+    sections = assigned or rosters.sections(conn)
+    if not section and not assigned and sections:
+        section = sections[0]
+    selected_sections = [section] if section else assigned
+    students = roster_cache.get(conn, selected_sections)
     
     # Get today's date
     today = datetime.now().strftime('%Y-%m-%d')
@@ -140,13 +254,20 @@ def teacher_dashboard():
         WHERE a.teacher_id = ? AND a.date = ?
     ''', (teacher_id, today)).fetchall()
     
+    # Today's classes from the timetable
+    schedule = timetable_index.teacher_day(conn, teacher_id, today)
+    
     conn.close()
     
-    return render_template('teacher_dashboard.html',
-                          teacher=teacher,
-                          students=students,
-                          attendance_today=attendance_today,
-                          today=today)
+    return dict(teacher=teacher,
+                students=students,
+                sections=sections,
+                section=section,
+                selected_sections=selected_sections,
+                assigned=bool(assigned),
+                attendance_today=attendance_today,
+                schedule=schedule,
+                today=today)
 
 # Mark Attendance
 @app.route('/teacher/mark_attendance', methods=['POST'])
@@ -159,29 +280,75 @@ def mark_attendance():
     period = request.form['period']
     attendance_data = request.form.getlist('attendance[]')
     
-    conn = get_db_connection()
+    sections = request.form.getlist('section')
     
-    # Delete existing attendance for this teacher, date, and period
-    conn.execute('DELETE FROM attendance WHERE teacher_id = ? AND date = ? AND period = ?',
-                (teacher_id, date, period))
+    conn = get_db_connection()
     
-    # Insert new attendance records
-    students = conn.execute('SELECT student_id FROM students').fetchall()
+    # "All my sections": of those, the ones the timetable has this teacher in for the slot
+    if len(sections) != 1:
+        sections = [s for s in timetable_index.teacher_sections(conn, teacher_id, date, period)
+                    if s in sections] or sections
     
-    for student in students:
-        student_id = student['student_id']
-        status = 'P' if student_id in attendance_data else 'A'
-        
-        conn.execute('''
-            INSERT INTO attendance (student_id, teacher_id, date, period, status)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (student_id, teacher_id, date, period, status))
-    
-    conn.commit()
     conn.close()
     
+    # One transaction: roster for the sections taught, then a single bulk upsert
+    # (returns once committed, possibly as part of a group commit)
+    changes = []
+    attendance_writes.submit(attendance_writer.write_class_attendance, teacher_id, date, period,
+                             attendance_data, sections=sections, changes=changes)
+    stats_cache.invalidate('stats')
+    live.publish_many(live_updates.attendance_events(changes))
+    
     flash('Attendance marked successfully!', 'success')
-    return redirect(url_for('teacher_dashboard'))
+    return redirect(url_for('teacher_dashboard', section=sections[0] if len(sections) == 1 else None))
+
+# Batch attendance API: many periods per request, deduplicated by Idempotency-Key (see attendance_api.py)
+@app.route('/api/attendance/batch', methods=['POST'])
+def attendance_batch_api():
+    if 'role' not in session:
+        return jsonify({'error': 'not logged in'}), 401
+    if session['role'] != 'teacher':
+        return jsonify({'error': 'forbidden'}), 403
+
+    teacher_id = session['user_id']
+    payload = request.get_json(silent=True)
+    conn = get_db_connection()
+    known_sections = set(rosters.sections(conn))
+    assigned = rosters.assigned_sections(conn, 'root', teacher_id)
+    changes = []
+
+    def apply_block(raw):
+        block = attendance_api.parse_block(raw, statuses=('P', 'A'))
+        if not block['period'].isdigit():
+            raise ValueError(f"period must be a number: {block['period']!r}")
+        unknown = [s for s in block['sections'] if s not in known_sections]
+        if unknown:
+            raise ValueError(f"unknown section {', '.join(unknown)}")
+        # no section: the timetabled sections for the slot, else the assigned ones
+        sections = (block['sections']
+                    or timetable_index.teacher_sections(conn, teacher_id, block['date'], block['period'])
+                    or assigned)
+        if not sections:
+            raise ValueError('"section" is required: no timetabled or assigned section for this slot')
+        present = [sid for sid, status in block['statuses'].items() if status == 'P']
+        records = attendance_writer.write_class_attendance(conn, teacher_id, block['date'], int(block['period']),
+                                                           present, sections=sections, changes=changes)
+        return {'sections': sections, 'records': records}
+
+    try:
+        key = attendance_api.idempotency_key(request.headers, payload)
+        status, body, replayed = attendance_api.run_batch(conn, teacher_id, key, payload, apply_block)
+    except attendance_api.RequestError as e:
+        return jsonify({'error': str(e)}), 400
+    finally:
+        conn.close()
+    if body.get('applied') and not replayed:
+        stats_cache.invalidate('stats')
+        live.publish_many(live_updates.attendance_events(changes))
+    response = jsonify(body)
+    if replayed:
+        response.headers['Idempotent-Replayed'] = 'true'
+    return response, status
 
 # Club Dashboard
 @app.route('/club/dashboard')
@@ -189,8 +356,14 @@ def club_dashboard():
     if 'role' not in session or session['role'] != 'club':
         return redirect(url_for('login'))
     
+    return render_template('club_dashboard.html',
+                          job_id=request.args.get('job', type=int),
+                          **club_dashboard_data(session['user_id']))
+
+def club_dashboard_data(club_id):
     conn = get_db_connection()
-    club_id = session['user_id']
+    
+    live_since = live_updates.token(conn, 'root', 'club', club_id)
     
     # Get club info
     club = conn.execute('SELECT * FROM clubs WHERE club_id = ?', (club_id,)).fetchone()
@@ -205,15 +378,12 @@ def club_dashboard():
     # Get portal status
     portal_status = conn.execute('''
         SELECT * FROM portal_access 
-        WHERE club_id = ? AND is_active = 1
-    ''', (club_id,)).fetchone()
+        WHERE club_id = ? AND is_active = 1 AND expires_at > ?
+    ''', (club_id, time.time())).fetchone()
     
     conn.close()
     
-    return render_template('club_dashboard.html',
-                          club=club,
-                          events=events,
-                          portal_status=portal_status)
+    return dict(club=club, events=events, portal_status=portal_status, live_since=live_since)
 
 # Upload Excel File
 @app.route('/club/upload', methods=['POST'])
@@ -227,8 +397,8 @@ def upload_excel():
     conn = get_db_connection()
     portal = conn.execute('''
         SELECT * FROM portal_access 
-        WHERE club_id = ? AND is_active = 1
-    ''', (club_id,)).fetchone()
+        WHERE club_id = ? AND is_active = 1 AND expires_at > ?
+    ''', (club_id, time.time())).fetchone()
     
     if not portal:
         conn.close()
@@ -250,86 +420,58 @@ def upload_excel():
         flash('No file selected!', 'error')
         return redirect(url_for('club_dashboard'))
     
-    if file and (file.filename.endswith('.xlsx') or file.filename.endswith('.xls')):
-        filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
-        
-        try:
-            # Read Excel file
-            df = pd.read_excel(filepath)
-            
-            # Expected columns: Name, ID, Section, Year (adjust as needed)
-            required_columns = ['Name', 'ID', 'Section', 'Year']
-            
-            # Create club event
-            cursor = conn.execute('''
-                INSERT INTO club_events (club_id, event_name, event_date, period, status)
-                VALUES (?, ?, ?, ?, 'pending')
-            ''', (club_id, event_name, event_date, period))
-            event_id = cursor.lastrowid
-            
-            # Store student data for this event
-            for _, row in df.iterrows():
-                student_id = str(row['ID'])
-                conn.execute('''
-                    INSERT INTO event_attendance (event_id, student_id)
-                    VALUES (?, ?)
-                ''', (event_id, student_id))
-            
-            conn.commit()
-            
-            # Remove uploaded file
-            os.remove(filepath)
-            
-            flash(f'Event "{event_name}" uploaded successfully! Waiting for VC approval.', 'success')
-        
-        except Exception as e:
-            conn.rollback()
-            flash(f'Error processing file: {str(e)}', 'error')
-        
-        finally:
-            conn.close()
+    if file and file.filename.lower().endswith(('.xlsx', '.xls', '.csv')):
+        conn.close()
+        # Parsing and inserting happen on a background worker
+        job_id = job_queue.enqueue('upload_event', {
+            'club_id': club_id,
+            'event_name': event_name,
+            'event_date': event_date,
+            'period': period,
+            'filename': file.filename,
+        }, data=file.read(), owner=club_id)
+        flash(f'Upload of "{event_name}" queued (job #{job_id}).', 'success')
+        return redirect(url_for('club_dashboard', job=job_id))
     else:
         conn.close()
-        flash('Invalid file format! Please upload .xlsx or .xls file.', 'error')
+        flash('Invalid file format! Please upload .xlsx, .xls or .csv file.', 'error')
     
     return redirect(url_for('club_dashboard'))
 
+@job_queue.handler('upload_event')
+def upload_event_job(conn, payload, data):
+    # Create the club event and stream its attendee IDs straight from the
+    # uploaded bytes into event_attendance, in one transaction
+    import ingest   # imported on first upload: keeps spreadsheet code out of worker startup
+    with db_pool.transaction(conn):
+        cursor = conn.execute('''
+            INSERT INTO club_events (club_id, event_name, event_date, period, status)
+            VALUES (?, ?, ?, ?, 'pending')
+        ''', (payload['club_id'], payload['event_name'], payload['event_date'], payload['period']))
+        event_id = cursor.lastrowid
+        count = ingest.insert_event_attendance(conn, event_id, io.BytesIO(data), payload['filename'])
+    stats_cache.invalidate('vc_dashboard')
+    live.publish(f"club:{payload['club_id']}", 'event', {'id': event_id, 'status': 'pending'})
+    return {
+        'event_id': event_id,
+        'students': count,
+        'message': f'Event "{payload["event_name"]}" uploaded successfully with {count} students! '
+                   'Waiting for VC approval.',
+    }
+
 # VC Dashboard
 @app.route('/vc/dashboard')
 def vc_dashboard():
     if 'role' not in session or session['role'] != 'vc':
         return redirect(url_for('login'))
     
-    conn = get_db_connection()
-    
-    # Get all clubs
-    clubs = conn.execute('SELECT * FROM clubs').fetchall()
-    
-    # Get pending events
-    pending_events = conn.execute('''
-        SELECT ce.*, c.club_name 
-        FROM club_events ce 
-        JOIN clubs c ON ce.club_id = c.club_id 
-        WHERE ce.status = 'pending'
-        ORDER BY ce.event_date DESC
-    ''', ).fetchall()
-    
-    # Get portal access status
-    portal_access = conn.execute('''
-        SELECT pa.*, c.club_name 
-        FROM portal_access pa 
-        JOIN clubs c ON pa.club_id = c.club_id
-        ORDER BY pa.is_active DESC, pa.opened_at DESC
-    ''').fetchall()
-    
-    conn.close()
-    
     return render_template('vc_dashboard.html',
-                          clubs=clubs,
-                          pending_events=pending_events,
-                          portal_access=portal_access)
+                          job_id=request.args.get('job', type=int),
+                          **vc_dashboard_data())
+
+def vc_dashboard_data():
+    return dict(stats_cache.get('vc_dashboard', load_vc_dashboard),
+                stats=stats_cache.get('stats', load_stats))
 
 # Open Portal for Club
 @app.route('/vc/open_portal', methods=['POST'])
@@ -353,6 +495,8 @@ def open_portal():
     
     conn.commit()
     conn.close()
+    stats_cache.invalidate('vc_dashboard')
+    portal_scheduler.wakeup()
     
     flash('Portal opened successfully!', 'success')
     return redirect(url_for('vc_dashboard'))
@@ -367,6 +511,7 @@ def close_portal(portal_id):
     conn.execute('UPDATE portal_access SET is_active = 0 WHERE portal_id = ?', (portal_id,))
     conn.commit()
     conn.close()
+    stats_cache.invalidate('vc_dashboard')
     
     flash('Portal closed successfully!', 'success')
     return redirect(url_for('vc_dashboard'))
@@ -387,50 +532,81 @@ def approve_event(event_id):
         flash('Event not found!', 'error')
         return redirect(url_for('vc_dashboard'))
     
-    # Get students who attended this event
-    event_students = conn.execute('''
-        SELECT student_id FROM event_attendance WHERE event_id = ?
-    ''', (event_id,)).fetchall()
+    if event['status'] == 'approved':
+        # a retried approval must not re-credit anything
+        conn.close()
+        flash('Event was already approved.', 'success')
+        return redirect(url_for('vc_dashboard'))
     
-    # Mark attendance as 'P' for these students
-    # We need to find the teacher's class for this period and date
-    # For simplicity, we'll mark it against a dummy teacher or system teacher
-    # In real system, you'd match with actual teacher schedule
+    conn.close()
     
-    teachers = conn.execute('SELECT teacher_id FROM teachers LIMIT 1').fetchone()
-    if teachers:
-        teacher_id = teachers['teacher_id']
+    # The merge runs on a background worker
+    job_id = job_queue.enqueue('approve_event', {'event_id': event_id}, owner=session['user_id'])
+    flash(f'Approval of "{event["event_name"]}" queued (job #{job_id}).', 'success')
+    return redirect(url_for('vc_dashboard', job=job_id))
+
+@job_queue.handler('approve_event')
+def approve_event_job(conn, payload, data):
+    event_id = payload['event_id']
+    with db_pool.transaction(conn):
+        event = conn.execute('SELECT * FROM club_events WHERE event_id = ?', (event_id,)).fetchone()
+        if event['status'] == 'approved':
+            # a retried approval must not re-credit anything
+            return {'message': 'Event was already approved.'}
         
-        for student in event_students:
-            student_id = student['student_id']
-            
-            # Check if attendance already exists
-            existing = conn.execute('''
-                SELECT * FROM attendance 
-                WHERE student_id = ? AND date = ? AND period = ?
-            ''', (student_id, event['event_date'], event['period'])).fetchone()
-            
-            if existing:
-                # Update to Present
-                conn.execute('''
-                    UPDATE attendance 
-                    SET status = 'P', marked_by_club = 1, club_event_id = ?
-                    WHERE student_id = ? AND date = ? AND period = ?
-                ''', (event_id, student_id, event['event_date'], event['period']))
-            else:
-                # Insert new attendance record
-                conn.execute('''
-                    INSERT INTO attendance (student_id, teacher_id, date, period, status, marked_by_club, club_event_id)
-                    VALUES (?, ?, ?, ?, 'P', 1, ?)
-                ''', (student_id, teacher_id, event['event_date'], event['period'], event_id))
-    
-    # Update event status
-    conn.execute('UPDATE club_events SET status = "approved" WHERE event_id = ?', (event_id,))
+        # Mark attendance as 'P' for the students who attended this event,
+        # credited to the class each section has in the timetable at that slot;
+        # sections without one fall back to the first teacher
+        classes = timetable_index.classes_at(conn, event['event_date'], event['period'])
+        teachers = conn.execute('SELECT teacher_id FROM teachers LIMIT 1').fetchone()
+        if not teachers:
+            raise ValueError('No teachers found to credit event attendance against!')
+        
+        # Single set-based merge plus the status change, in one transaction
+        changes = []
+        counts = attendance_writer.merge_event_attendance(
+            conn, event, teachers['teacher_id'],
+            {section: teacher for section, (teacher, subject) in classes.items()}, changes=changes)
+        conn.execute('UPDATE club_events SET status = "approved" WHERE event_id = ?', (event_id,))
+    stats_cache.invalidate('vc_dashboard', 'stats')
+    live.publish_many(live_updates.attendance_events(changes) +
+                      [(f"club:{event['club_id']}", 'event', {'id': event_id, 'status': 'approved'})])
+    
+    message = (f"Event approved: {counts['updated']} records updated, "
+               f"{counts['inserted']} inserted")
+    if counts['unknown']:
+        message += f", {counts['unknown']} unknown student IDs skipped"
+    if counts['unscheduled']:
+        message += f", {counts['unscheduled']} without a timetabled class"
+    return dict(counts, message=message + '.')
+
+# Timetable import (CSV or Excel: section, weekday, period, teacher[, subject])
+@app.route('/vc/upload_timetable', methods=['POST'])
+def upload_timetable():
+    if 'role' not in session or session['role'] != 'vc':
+        return redirect(url_for('login'))
     
-    conn.commit()
-    conn.close()
+    file = request.files.get('timetable_file')
+    if not file or file.filename == '':
+        flash('No file selected!', 'error')
+        return redirect(url_for('vc_dashboard'))
+    
+    import ingest
+    conn = get_db_connection()
+    try:
+        result = timetable.import_rows(conn, 'root', ingest.iter_rows(file.stream, file.filename),
+                                       replace=bool(request.form.get('replace')))
+    except ValueError as e:
+        flash(f'Timetable not imported: {e}', 'error')
+        return redirect(url_for('vc_dashboard'))
+    finally:
+        conn.close()
     
-    flash('Event approved and attendance marked successfully!', 'success')
+    if result['error_count']:
+        details = '; '.join(f'line {line}: {message}' for line, message in result['errors'][:5])
+        flash(f"Timetable not imported: {result['error_count']} invalid rows ({details})", 'error')
+    else:
+        flash(f"Timetable imported: {result['imported']} periods.", 'success')
     return redirect(url_for('vc_dashboard'))
 
 # Reject Event
@@ -440,13 +616,105 @@ def reject_event(event_id):
         return redirect(url_for('login'))
     
     conn = get_db_connection()
+    event = conn.execute('SELECT club_id FROM club_events WHERE event_id = ?', (event_id,)).fetchone()
     conn.execute('UPDATE club_events SET status = "rejected" WHERE event_id = ?', (event_id,))
     conn.commit()
     conn.close()
+    stats_cache.invalidate('vc_dashboard')
+    if event:
+        live.publish(f"club:{event['club_id']}", 'event', {'id': event_id, 'status': 'rejected'})
     
     flash('Event rejected!', 'success')
     return redirect(url_for('vc_dashboard'))
 
+# Live dashboard updates (server-sent events; see live_updates.py). ?since= is
+# the token the page was rendered with
+def live_stream(kind, key):
+    if request.args.get('poll'):
+        return jsonify({'since': live_probe(kind, key)})
+    try:
+        # each stream holds this WSGI thread: only LIVE_WSGI_STREAMS of them, the rest poll
+        sub = live.subscribe(f'{kind}:{key}', threaded=True)
+    except live_updates.NoStreamThread:
+        return '', 204
+    except live_updates.TooManyClients as e:
+        return jsonify({'error': str(e)}), 503
+    body = live_updates.EventStream(sub, lambda: live_probe(kind, key), request.args.get('since'))
+    return app.response_class(body, headers=live_updates.HEADERS)
+
+@app.route('/student/events')
+def student_events():
+    if 'role' not in session or session['role'] != 'student':
+        return jsonify({'error': 'not logged in'}), 401
+    return live_stream('student', session['user_id'])
+
+@app.route('/club/events')
+def club_events():
+    if 'role' not in session or session['role'] != 'club':
+        return jsonify({'error': 'not logged in'}), 401
+    return live_stream('club', session['user_id'])
+
+# Background job status (polled by the club and VC dashboards)
+@app.route('/jobs/<int:job_id>')
+def job_status(job_id):
+    if 'role' not in session:
+        return jsonify({'error': 'not logged in'}), 401
+    job = job_queue.get(job_id)
+    if not job or (session['role'] != 'vc' and job['owner'] != session['user_id']):
+        return jsonify({'error': 'job not found'}), 404
+    return jsonify(job)
+
+# Attendance counters (overall, per day, per club) as JSON
+@app.route('/vc/stats')
+def vc_stats():
+    if 'role' not in session or session['role'] != 'vc':
+        return jsonify({'error': 'forbidden'}), 403
+    days = min(max(request.args.get('days', attendance_stats.STATS_DAYS, type=int), 1), 366)
+    return jsonify(stats_cache.get('stats', load_stats, days))
+
+# Exam eligibility: attendance percentage, shortages and classes needed for
+# every student, computed from an in-memory matrix (see eligibility.py)
+ELIGIBILITY_LIST_LIMIT = 200
+
+def eligibility_args():
+    threshold = min(max(request.args.get('threshold', 75.0, type=float), 1.0), 100.0)
+    return request.args.get('since') or None, request.args.get('until') or None, threshold
+
+def load_eligibility(since, until, threshold):
+    import eligibility   # imported on first report: keeps NumPy out of worker startup
+    conn = get_db_connection()
+    try:
+        return eligibility.eligibility_report(conn, 'root', since, until, threshold, ELIGIBILITY_LIST_LIMIT)
+    finally:
+        conn.close()
+
+@app.route('/vc/eligibility')
+def vc_eligibility():
+    if 'role' not in session or session['role'] != 'vc':
+        return redirect(url_for('login'))
+    since, until, threshold = eligibility_args()
+    if request.args.get('format') == 'csv':
+        import eligibility
+        conn = get_db_connection()
+        try:
+            matrix = eligibility.AttendanceMatrix.load(conn, 'root', since, until)
+        finally:
+            conn.close()
+        out = io.StringIO()
+        matrix.write_csv(out, threshold)
+        return app.response_class(out.getvalue(), mimetype='text/csv',
+                                  headers={'Content-Disposition': 'attachment; filename=eligibility.csv'})
+    # TTL-cached (STATS_CACHE_TTL) per range and threshold
+    report = stats_cache.get('eligibility', load_eligibility, since, until, threshold)
+    return render_template('vc_eligibility.html', report=report)
+
+# Connection pool metrics
+@app.route('/vc/db_stats')
+def db_stats():
+    if 'role' not in session or session['role'] != 'vc':
+        return redirect(url_for('login'))
+    return jsonify(dict(db_pool.get_pool(DB_NAME).metrics(), write_behind=attendance_writes.metrics()))
+
 # Logout
 @app.route('/logout')
 def logout():
@@ -0,0 +1,343 @@
+"""ASGI entry points for production serving of app.py and TH2/app.py.
+
+    uvicorn asgi:root --workers 4            # app.py
+    uvicorn asgi:th2 --port 5001             # TH2/app.py
+
+Any ASGI server works; this module itself needs only the standard library.
+
+The read-heavy dashboard GETs run as coroutines. Their database work goes
+to a bounded thread pool (DB_EXECUTOR_THREADS, sized to the connection
+pool by default), so thousands of waiting clients are cheap coroutines
+rather than parked threads, and SQLite never sees more concurrent readers
+than there are pooled connections. Templates, sessions, flashes and
+request hooks are the Flask ones. Every other request is handed to the
+unchanged WSGI app on a second pool (WSGI_THREADS).
+
+The live-update streams (server-sent events, see live_updates.py) are
+async views too: each open dashboard is a coroutine waiting on its
+subscription, streamed chunk by chunk until the client disconnects. (The
+WSGI routes keep at most LIVE_WSGI_STREAMS streams and have the rest poll.)
+"""
+import asyncio
+import importlib.util
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from flask import flash, jsonify, redirect, render_template, request, session, url_for
+from werkzeug.exceptions import HTTPException
+
+import db_pool
+import live_updates
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+
+DB_EXECUTOR_THREADS = int(os.environ.get('DB_EXECUTOR_THREADS', db_pool.POOL_SIZE))
+WSGI_THREADS = int(os.environ.get('WSGI_THREADS', 16))
+
+
+class FlaskASGI:
+    """ASGI application serving a Flask app, with selected GET endpoints async.
+
+    async_views maps endpoint name -> coroutine function taking the URL
+    arguments; it runs inside the Flask request context and returns
+    anything a Flask view may return.
+    """
+
+    def __init__(self, app, async_views, db_threads=DB_EXECUTOR_THREADS, wsgi_threads=WSGI_THREADS):
+        self.app = app
+        self.async_views = async_views
+        self.db_executor = ThreadPoolExecutor(db_threads, thread_name_prefix='asgi-db')
+        self.wsgi_executor = ThreadPoolExecutor(wsgi_threads, thread_name_prefix='asgi-wsgi')
+
+    async def run_db(self, fn, *args):
+        """Run a blocking database function on the bounded DB executor."""
+        return await asyncio.get_running_loop().run_in_executor(self.db_executor, fn, *args)
+
+    async def live_stream(self, module, kind, key):
+        """SSE body for one dashboard (module.live broker), probing on the DB executor."""
+        if request.args.get('poll'):
+            return jsonify({'since': await self.run_db(module.live_probe, kind, key)})
+        try:
+            sub = module.live.subscribe(f'{kind}:{key}')
+        except live_updates.TooManyClients as e:
+            return jsonify({'error': str(e)}), 503
+        return live_updates.AsyncEventStream(sub, lambda: self.run_db(module.live_probe, kind, key),
+                                             request.args.get('since'))
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+        body = bytearray()
+        while True:
+            message = await receive()
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                break
+        environ = _environ(scope, bytes(body))
+
+        endpoint, view_args = None, {}
+        if scope['method'] in ('GET', 'HEAD'):
+            try:
+                endpoint, view_args = self.app.url_map.bind_to_environ(environ).match()
+            except HTTPException:
+                pass
+        if endpoint in self.async_views:
+            result = await self._dispatch_async(environ, endpoint, view_args)
+            if isinstance(result, live_updates.AsyncEventStream):
+                await self._stream(result, receive, send)
+                return
+            status, headers, chunks = result
+        else:
+            status, headers, chunks = await asyncio.get_running_loop().run_in_executor(
+                self.wsgi_executor, _call_wsgi, self.app, environ)
+
+        await send({'type': 'http.response.start', 'status': status,
+                    'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]})
+        await send({'type': 'http.response.body', 'body': b''.join(chunks)})
+
+    async def _dispatch_async(self, environ, endpoint, view_args):
+        # mirrors Flask.full_dispatch_request with an awaited view
+        app = self.app
+        with app.request_context(environ):
+            try:
+                rv = app.preprocess_request()
+                if rv is None:
+                    rv = await self.async_views[endpoint](**view_args)
+                    if isinstance(rv, live_updates.AsyncEventStream):
+                        return rv
+            except Exception as e:
+                try:
+                    rv = app.handle_user_exception(e)
+                except Exception as unhandled:
+                    rv = app.handle_exception(unhandled)
+            response = app.finalize_request(rv)
+            app_iter, status, headers = response.get_wsgi_response(environ)
+            chunks = list(app_iter)
+        return int(status.split(' ', 1)[0]), headers, chunks
+
+    async def _stream(self, body, receive, send):
+        async def send_chunks():
+            async for chunk in body:
+                await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+
+        async def disconnected():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': [(k.lower().encode('latin-1'), v.encode('latin-1'))
+                                for k, v in live_updates.HEADERS.items()]})
+        tasks = [asyncio.ensure_future(send_chunks()), asyncio.ensure_future(disconnected())]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            body.close()
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.db_executor.shutdown(wait=False)
+                self.wsgi_executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+def _environ(scope, body):
+    """WSGI environ for an ASGI HTTP scope (PEP 3333 string rules)."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for raw_name, raw_value in scope.get('headers', []):
+        name = raw_name.decode('latin-1').upper().replace('-', '_')
+        value = raw_value.decode('latin-1')
+        if name == 'CONTENT_TYPE':
+            environ['CONTENT_TYPE'] = value
+            continue
+        if name == 'CONTENT_LENGTH':
+            continue
+        key = f'HTTP_{name}'
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+def _call_wsgi(app, environ):
+    response = {}
+
+    def start_response(status, headers, exc_info=None):
+        response['status'] = int(status.split(' ', 1)[0])
+        response['headers'] = headers
+
+    app_iter = app(environ, start_response)
+    try:
+        chunks = list(app_iter)
+    finally:
+        if hasattr(app_iter, 'close'):
+            app_iter.close()
+    return response['status'], response['headers'], chunks
+
+
+# ---------- app.py ----------
+
+def _root_views(m, server):
+    def role_is(role):
+        return session.get('role') == role
+
+    async def student_dashboard():
+        if not role_is('student'):
+            return redirect(url_for('login'))
+        student_id = session['user_id']
+        key = await server.run_db(m.student_page_key, student_id, session.get('name'))
+        response = m.student_pages.cached(key)
+        if response is None:
+            data = await server.run_db(m.student_dashboard_data, student_id)
+            response = m.student_pages.store(key, render_template('student_dashboard.html', **data))
+        return response
+
+    async def teacher_dashboard():
+        if not role_is('teacher'):
+            return redirect(url_for('login'))
+        data = await server.run_db(m.teacher_dashboard_data, session['user_id'], request.args.get('section', ''))
+        return render_template('teacher_dashboard.html', **data)
+
+    async def club_dashboard():
+        if not role_is('club'):
+            return redirect(url_for('login'))
+        data = await server.run_db(m.club_dashboard_data, session['user_id'])
+        return render_template('club_dashboard.html', job_id=request.args.get('job', type=int), **data)
+
+    async def vc_dashboard():
+        if not role_is('vc'):
+            return redirect(url_for('login'))
+        data = await server.run_db(m.vc_dashboard_data)
+        return render_template('vc_dashboard.html', job_id=request.args.get('job', type=int), **data)
+
+    async def student_events():
+        if not role_is('student'):
+            return jsonify({'error': 'not logged in'}), 401
+        return await server.live_stream(m, 'student', session['user_id'])
+
+    async def club_events():
+        if not role_is('club'):
+            return jsonify({'error': 'not logged in'}), 401
+        return await server.live_stream(m, 'club', session['user_id'])
+
+    return {'student_dashboard': student_dashboard, 'teacher_dashboard': teacher_dashboard,
+            'club_dashboard': club_dashboard, 'vc_dashboard': vc_dashboard,
+            'student_events': student_events, 'club_events': club_events}
+
+
+# ---------- TH2/app.py ----------
+
+def _th2_views(m, server):
+    def role_is(role):
+        return 'username' in session and session.get('role') == role
+
+    async def student_dashboard():
+        if not role_is('student'):
+            return redirect(url_for('login'))
+        student_id = session.get('student_id')
+        key = await server.run_db(m.student_page_key, student_id, session.get('name'))
+        response = m.student_pages.cached(key)
+        if response is None:
+            data = await server.run_db(m.student_dashboard_data, student_id)
+            response = m.student_pages.store(key, render_template('student_dashboard.html', **data))
+        return response
+
+    async def teacher_portal():
+        if not role_is('teacher'):
+            return redirect(url_for('login'))
+        data = await server.run_db(m.teacher_portal_data, session['username'], request.args.get('section', ''))
+        return render_template('teacher_portal.html', **data)
+
+    async def club_portal():
+        if not role_is('club'):
+            return redirect(url_for('login'))
+        data = await server.run_db(m.club_portal_data, session['username'])
+        if not data['club']:
+            flash('No club assigned to this account', 'danger')
+            return render_template('club_portal.html', **data)
+        return render_template('club_portal.html', job_id=request.args.get('job', type=int), **data)
+
+    async def vc_portal():
+        if not role_is('vc'):
+            return redirect(url_for('login'))
+        data = await server.run_db(m.vc_portal_data)
+        return render_template('vc_portal.html', **data)
+
+    async def student_events():
+        if not role_is('student'):
+            return jsonify({'error': 'not logged in'}), 401
+        return await server.live_stream(m, 'student', session.get('student_id'))
+
+    async def club_events():
+        if not role_is('club'):
+            return jsonify({'error': 'not logged in'}), 401
+        club_id = await server.run_db(m.leader_club_id, session['username'])
+        if club_id is None:
+            return jsonify({'error': 'no club for this account'}), 404
+        return await server.live_stream(m, 'club', club_id)
+
+    return {'student_dashboard': student_dashboard, 'teacher_portal': teacher_portal,
+            'club_portal': club_portal, 'vc_portal': vc_portal,
+            'student_events': student_events, 'club_events': club_events}
+
+
+APPS = {
+    # module name, path, async view factory
+    'root': ('app', os.path.join(BASE_DIR, 'app.py'), _root_views),
+    'th2': ('th2_app', os.path.join(BASE_DIR, 'TH2', 'app.py'), _th2_views),
+}
+
+
+def create(name):
+    """Build the ASGI application for 'root' or 'th2'."""
+    module_name, path, views = APPS[name]
+    module = sys.modules.get(module_name)
+    if module is None:
+        spec = importlib.util.spec_from_file_location(module_name, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
+        spec.loader.exec_module(module)
+    server = FlaskASGI(module.app, {})
+    server.async_views = views(module, server)
+    return server
+
+
+_servers = {}
+
+
+def __getattr__(name):
+    # `uvicorn asgi:root` imports only the app it serves
+    if name in APPS:
+        if name not in _servers:
+            _servers[name] = create(name)
+        return _servers[name]
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -0,0 +1,145 @@
+"""Batch attendance API: many marked periods per request, safe to retry.
+
+Teachers' phones POST ``/api/attendance/batch`` with an ``Idempotency-Key``
+header and a JSON body of blocks, one per marked period:
+
+    {"blocks": [
+        {"date": "2026-10-19", "period": 2, "section": "A", "present": ["2021001", "2021002"]},
+        {"date": "2026-10-19", "period": 3, "sections": ["A", "B"], "statuses": {"2021004": "P"}}
+    ]}
+
+(TH2 blocks also carry "subject_code"). Without a section the block covers
+the sections the timetable has the teacher in for that slot, else the
+teacher's assigned sections.
+
+Every valid block is written in one transaction together with the response,
+which is stored in ``api_requests`` under (teacher, key). A retry with the
+same key and body gets that stored response back (``Idempotent-Replayed:
+true``) without touching attendance; the same key with a different body is
+refused. Invalid blocks are reported in the per-block results and skipped.
+Keys are kept for IDEMPOTENCY_TTL seconds.
+"""
+import hashlib
+import json
+import time
+from datetime import date as _date
+
+from db_pool import transaction
+
+IDEMPOTENCY_TTL = 7 * 24 * 3600   # seconds; an offline phone may resend days later
+MAX_BLOCKS = 200
+MAX_KEY_LENGTH = 200
+
+REPLAY_SQL = 'SELECT request_hash, status, response FROM api_requests WHERE owner = ? AND idempotency_key = ?'
+EXPIRE_SQL = 'DELETE FROM api_requests WHERE created_at < ?'
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS api_requests (
+        owner TEXT NOT NULL,
+        idempotency_key TEXT NOT NULL,
+        request_hash TEXT NOT NULL,
+        status INTEGER NOT NULL,
+        response TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        PRIMARY KEY (owner, idempotency_key)
+    ) WITHOUT ROWID''',
+    # expiry sweep
+    'CREATE INDEX IF NOT EXISTS ix_api_requests_created ON api_requests (created_at)',
+]
+
+
+class RequestError(ValueError):
+    """The request as a whole is unusable (400); nothing is stored."""
+
+
+def request_hash(payload):
+    """Digest of the JSON payload, independent of key order and whitespace."""
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest()
+
+
+def idempotency_key(headers, payload):
+    key = headers.get('Idempotency-Key') or (payload.get('idempotency_key') if isinstance(payload, dict) else None)
+    if not key or not isinstance(key, str):
+        raise RequestError('Idempotency-Key header is required')
+    if len(key) > MAX_KEY_LENGTH:
+        raise RequestError(f'Idempotency-Key is longer than {MAX_KEY_LENGTH} characters')
+    return key
+
+
+def _ids(value, field):
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        raise ValueError(f'"{field}" must be a list of student IDs')
+    return [str(v).strip() for v in value if str(v).strip()]
+
+
+def parse_block(raw, statuses=('P', 'A', 'N.M.'), subject=False):
+    """Normalise one block; raises ValueError with a message for the client.
+
+    Returns {'date', 'period', 'sections', 'statuses', 'subject_code'} where
+    statuses maps student_id -> status ("present" IDs become 'P').
+    """
+    if not isinstance(raw, dict):
+        raise ValueError('block must be an object')
+    try:
+        day = _date.fromisoformat(str(raw.get('date', ''))).isoformat()
+    except ValueError:
+        raise ValueError('"date" must be YYYY-MM-DD') from None
+    period = raw.get('period')
+    if period is None or str(period).strip() == '':
+        raise ValueError('"period" is required')
+    sections = raw.get('sections', raw.get('section')) or []
+    if isinstance(sections, str):
+        sections = [sections]
+    if not isinstance(sections, list) or not all(isinstance(s, str) for s in sections):
+        raise ValueError('"section" must be a section name or a list of them')
+    marks = raw.get('statuses') or {}
+    if not isinstance(marks, dict):
+        raise ValueError('"statuses" must map student IDs to a status')
+    bad = sorted({str(s) for s in marks.values() if s not in statuses})
+    if bad:
+        raise ValueError(f"unknown status {', '.join(bad)} (expected {', '.join(statuses)})")
+    marks = {str(k).strip(): v for k, v in marks.items()}
+    marks.update((sid, 'P') for sid in _ids(raw.get('present'), 'present'))
+    subject_code = raw.get('subject_code')
+    if subject and not subject_code:
+        raise ValueError('"subject_code" is required')
+    return {'date': day, 'period': str(period).strip(), 'sections': [s for s in sections if s],
+            'statuses': marks, 'subject_code': subject_code}
+
+
+def run_batch(conn, owner, key, payload, apply_block):
+    """Apply payload['blocks'] once per (owner, key); returns (status, body, replayed).
+
+    apply_block(raw_block) writes one block and returns a dict for its
+    result, or raises ValueError to reject just that block. Everything,
+    including the stored response, commits in one transaction; a database
+    error rolls it all back and leaves the key unused, so the client's retry
+    runs the batch again.
+    """
+    if not isinstance(payload, dict) or not isinstance(payload.get('blocks'), list) or not payload['blocks']:
+        raise RequestError('body must be a JSON object with a non-empty "blocks" list')
+    if len(payload['blocks']) > MAX_BLOCKS:
+        raise RequestError(f'at most {MAX_BLOCKS} blocks per request')
+    digest = request_hash(payload)
+    with transaction(conn):
+        stored = conn.execute(REPLAY_SQL, (owner, key)).fetchone()
+        if stored:
+            if stored[0] != digest:
+                return 422, {'error': 'Idempotency-Key was already used for a different request'}, False
+            return stored[1], json.loads(stored[2]), True
+        results = []
+        for index, raw in enumerate(payload['blocks']):
+            try:
+                results.append(dict(index=index, status='ok', **apply_block(raw)))
+            except ValueError as e:
+                results.append({'index': index, 'status': 'error', 'error': str(e)})
+        applied = sum(r['status'] == 'ok' for r in results)
+        body = {'applied': applied, 'failed': len(results) - applied, 'results': results}
+        now = time.time()
+        conn.execute(EXPIRE_SQL, (now - IDEMPOTENCY_TTL,))
+        conn.execute('INSERT INTO api_requests (owner, idempotency_key, request_hash, status, response, created_at) '
+                     'VALUES (?, ?, ?, ?, ?, ?)', (owner, key, digest, 200, json.dumps(body), now))
+    return 200, body, False
@@ -0,0 +1,245 @@
+"""Attendance counters for the VC pages, kept in ``attendance_stats``.
+
+Triggers on ``attendance`` keep running totals of present / absent /
+not-marked / event-marked records for every writer, so the VC statistics are
+a short primary-key range instead of COUNT(*) scans. Rows are keyed on
+(club, day):
+
+    ('', date)      records on one date
+    (club, date)    event-marked records on one date credited to one club
+
+A written attendance row changes one of them, or two when event-marked; the
+all-time totals are the sum over the days, taken when read (the VC pages are
+cached anyway).
+
+Rendered VC pages also go through ``StatsCache``, an in-process TTL cache
+that write routes clear explicitly; the TTL bounds staleness when another
+process (e.g. a ``jobs.py`` worker) did the write.
+
+Usage:
+    python attendance_stats.py --verify           # compare with attendance
+    python attendance_stats.py th2 --rebuild      # recompute from scratch
+"""
+import os
+import sys
+import threading
+import time
+from datetime import date, timedelta
+
+import targets
+
+ALL = ''
+STATS_DAYS = 14                                           # days listed by snapshot()
+STATS_CACHE_TTL = float(os.environ.get('STATS_CACHE_TTL', 30))  # seconds
+
+# How each database marks a record as club/event attendance and which club it
+# belongs to; {ref} is NEW/OLD inside the triggers, attendance when recounting
+TARGETS = {
+    'root': {
+        'event': '{ref}.marked_by_club = 1',
+        'club': '(SELECT club_id FROM club_events WHERE event_id = {ref}.club_event_id)',
+        'keys': ('marked_by_club', 'club_event_id'),
+        'club_names': 'SELECT club_id, club_name FROM clubs',
+    },
+    'th2': {
+        # club uploads set event_name and the club credited in club_id
+        'event': '{ref}.event_name IS NOT NULL',
+        'club': "COALESCE(CAST({ref}.club_id AS TEXT), '?')",
+        'keys': ('event_name', 'club_id'),
+        'club_names': 'SELECT CAST(id AS TEXT), club_name FROM clubs',
+    },
+}
+
+_COUNTS = ('total', 'present', 'absent', 'not_marked', 'event_marked')
+
+
+def _exprs(target, ref):
+    spec = TARGETS[target]
+    return {
+        'day': f"COALESCE({ref}.date, '?')",
+        'club': f"COALESCE({spec['club'].format(ref=ref)}, '?')",
+        'event': spec['event'].format(ref=ref),
+    }
+
+
+_UPSERT = '''INSERT INTO attendance_stats (club, day, total, present, absent, not_marked, event_marked)
+            {rows}
+            ON CONFLICT (club, day) DO UPDATE SET
+                total = total + excluded.total,
+                present = present + excluded.present,
+                absent = absent + excluded.absent,
+                not_marked = not_marked + excluded.not_marked,
+                event_marked = event_marked + excluded.event_marked;'''
+
+
+def _bump(target, ref, sign):
+    """Statements adding (sign '+') or removing (sign '-') one attendance row's counts."""
+    e = _exprs(target, ref)
+    counts = (f"{sign}1, {sign}({ref}.status = 'P'), {sign}({ref}.status = 'A'), "
+              f"{sign}({ref}.status = 'N.M.')")
+    return [
+        _UPSERT.format(rows=f"VALUES ('{ALL}', {e['day']}, {counts}, {sign}({e['event']}))"),
+        _UPSERT.format(rows=f"SELECT {e['club']}, {e['day']}, {counts}, {sign}1 WHERE {e['event']}"),
+    ]
+
+
+def trigger_sql(target):
+    """Statements the attendance triggers (migrations.attendance_triggers) run for this table.
+
+    'update' is for a row that kept its date and club (the 'keys' columns):
+    a status change moves one count within the one or two rows it is counted in.
+    """
+    new = _exprs(target, 'NEW')
+    delta = ',\n                '.join(f"{name} = {name} + (NEW.status = '{code}') - (OLD.status = '{code}')"
+                                     for name, code in (('present', 'P'), ('absent', 'A'), ('not_marked', 'N.M.')))
+    return {
+        'keys': ('date',) + TARGETS[target]['keys'],
+        'insert': _bump(target, 'NEW', '+'),
+        'delete': _bump(target, 'OLD', '-'),
+        'update': [f'''UPDATE attendance_stats SET
+                {delta}
+            WHERE club IN ('{ALL}', CASE WHEN {new['event']} THEN {new['club']} END) AND day = {new['day']}
+              AND OLD.status IS NOT NEW.status;'''],
+    }
+
+
+def schema(target):
+    """CREATE statement for the counters table (kept current by trigger_sql)."""
+    return [
+        '''CREATE TABLE IF NOT EXISTS attendance_stats (
+            club TEXT NOT NULL,
+            day TEXT NOT NULL,
+            total INTEGER NOT NULL DEFAULT 0,
+            present INTEGER NOT NULL DEFAULT 0,
+            absent INTEGER NOT NULL DEFAULT 0,
+            not_marked INTEGER NOT NULL DEFAULT 0,
+            event_marked INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (club, day)
+        ) WITHOUT ROWID''',
+    ]
+
+
+def _computed_sql(target):
+    e = _exprs(target, 'attendance')
+    counts = (f"COUNT(*), SUM(status = 'P'), SUM(status = 'A'), SUM(status = 'N.M.'), "
+              f"SUM(COALESCE({e['event']}, 0))")
+    return f'''
+        SELECT '{ALL}', {e['day']}, {counts} FROM attendance GROUP BY 2
+        UNION ALL
+        SELECT {e['club']}, {e['day']}, {counts} FROM attendance WHERE {e['event']} GROUP BY 1, 2'''
+
+
+def rebuild_sql(target):
+    """Statements recomputing the whole counters table from attendance."""
+    return [
+        'DELETE FROM attendance_stats',
+        f'''INSERT INTO attendance_stats (club, day, total, present, absent, not_marked, event_marked)
+            {_computed_sql(target)}''',
+    ]
+
+
+def rebuild(conn, target):
+    """Recompute the table in one transaction; returns the number of rows written."""
+    return targets.rebuild(conn, rebuild_sql(target), 'attendance_stats')
+
+
+def verify(conn, target):
+    """Rows where the stored counters differ from a fresh recount (empty when correct)."""
+    return targets.recount_diff(
+        conn,
+        'SELECT club, day, total, present, absent, not_marked, event_marked '
+        'FROM attendance_stats WHERE total != 0',
+        f'SELECT * FROM ({_computed_sql(target)})')
+
+
+# counters of one club ('' for every record) on one day, or summed over every day (?2 = ALL)
+TOTALS_SQL = '''
+    SELECT COALESCE(SUM(total), 0), COALESCE(SUM(present), 0), COALESCE(SUM(absent), 0),
+           COALESCE(SUM(not_marked), 0), COALESCE(SUM(event_marked), 0)
+    FROM attendance_stats WHERE club = ?1 AND ?2 IN ('', day)
+'''
+DAYS_SQL = '''
+    SELECT day, total, present, absent, not_marked, event_marked FROM attendance_stats
+    WHERE club = ? AND day >= ? ORDER BY day DESC
+'''
+CLUBS_SQL = '''
+    SELECT club, SUM(total), SUM(present), SUM(absent), SUM(not_marked), SUM(event_marked) FROM attendance_stats
+    WHERE club > ? GROUP BY club HAVING SUM(total) != 0 ORDER BY club
+'''
+
+
+def totals(conn, day=ALL, club=ALL):
+    """Counters for one club (ALL: every record) on one day (ALL: every day) as a dict."""
+    return dict(zip(_COUNTS, conn.execute(TOTALS_SQL, (club, day)).fetchone()))
+
+
+def snapshot(conn, target, days=STATS_DAYS):
+    """Overall, per-day (last `days` days) and per-club counters, JSON-ready."""
+    since = (date.today() - timedelta(days=days - 1)).isoformat()
+    per_day = conn.execute(DAYS_SQL, (ALL, since)).fetchall()
+    per_club = conn.execute(CLUBS_SQL, (ALL,)).fetchall()
+    names = dict(conn.execute(TARGETS[target]['club_names']).fetchall())
+    return {
+        'totals': totals(conn),
+        'days': [dict(zip(('day',) + _COUNTS, r)) for r in per_day],
+        'clubs': [dict(zip(('club',) + _COUNTS, r), club_name=names.get(r[0], r[0])) for r in per_club],
+    }
+
+
+class StatsCache:
+    """Small in-process TTL cache for VC page data.
+
+    Values are loaded on first use and kept for `ttl` seconds or until a
+    write route calls invalidate() with their name. Loads run outside the
+    lock; a value whose name was invalidated while it loaded is returned to
+    its caller but not stored, so it is never served after the write.
+    """
+
+    def __init__(self, ttl=STATS_CACHE_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._generations = {}   # name -> invalidations so far
+        self._cleared = 0        # invalidate() calls without names
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _generation(self, name):
+        return self._cleared, self._generations.get(name, 0)
+
+    def get(self, name, loader, *args):
+        """Cached loader(*args), keyed on (name, *args)."""
+        key = (name,) + args
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generation(name)
+        value = loader(*args)
+        with self._lock:
+            if self._generation(name) == generation:
+                self._entries[key] = (now + self.ttl, value)
+        return value
+
+    def invalidate(self, *names):
+        """Drop the entries for the given names (everything when none given)."""
+        with self._lock:
+            if not names:
+                self._cleared += 1
+                self._entries.clear()
+                return
+            for name in names:
+                self._generations[name] = self._generations.get(name, 0) + 1
+            for key in [k for k in self._entries if k[0] in names]:
+                del self._entries[key]
+
+
+def main(argv=None):
+    return targets.maintenance_main(argv, 'attendance_stats', rebuild, verify)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,143 @@
+"""Per-student attendance totals kept in ``student_attendance_summary``.
+
+Triggers on ``attendance`` keep the table current for every writer
+(teacher marking, event approval, TH2 club uploads), so dashboard statistics
+read a student's few rows instead of scanning their history.
+
+Each student has one row per subject: the teacher_id in attendance.db (each
+teacher teaches one subject) or the subject_code in TH2/database.db. A
+written attendance row changes exactly one of them; the overall totals are
+their sum, taken when read.
+
+Usage:
+    python attendance_summary.py --verify           # compare with attendance
+    python attendance_summary.py th2 --rebuild      # recompute from scratch
+"""
+import sys
+
+import targets
+
+# attendance column the per-subject rows are keyed on, per database
+SUBJECT_COLUMNS = {
+    'root': 'teacher_id',
+    'th2': 'subject_code',
+}
+
+OVERALL = ''   # student_totals() over every subject
+
+_COUNTS = ('total', 'present', 'absent', 'not_marked')
+
+# a student's totals, overall (?2 = OVERALL) or for one subject
+TOTALS_SQL = '''
+    SELECT COALESCE(SUM(total), 0), COALESCE(SUM(present), 0), COALESCE(SUM(absent), 0),
+           COALESCE(SUM(not_marked), 0)
+    FROM student_attendance_summary WHERE student_id = ?1 AND ?2 IN ('', subject)
+'''
+
+
+def _subject_expr(ref, column):
+    # blank/NULL subjects must not collide with OVERALL
+    return f"COALESCE(NULLIF({ref}.{column}, ''), '?')"
+
+
+def _bump(ref, sign, subject_column):
+    """Upsert adding (sign '+') or removing (sign '-') one attendance row's counts."""
+    return f'''INSERT INTO student_attendance_summary
+                (student_id, subject, total, present, absent, not_marked)
+            VALUES ({ref}.student_id, {_subject_expr(ref, subject_column)}, {sign}1, {sign}({ref}.status = 'P'),
+                    {sign}({ref}.status = 'A'), {sign}({ref}.status = 'N.M.'))
+            ON CONFLICT (student_id, subject) DO UPDATE SET
+                total = total + excluded.total,
+                present = present + excluded.present,
+                absent = absent + excluded.absent,
+                not_marked = not_marked + excluded.not_marked;'''
+
+
+def trigger_sql(subject_column):
+    """Statements the attendance triggers (migrations.attendance_triggers) run for this table.
+
+    'update' is for a row that kept its student and subject: a status
+    change moves one count within the row's summary row.
+    """
+    delta = ',\n                '.join(f"{name} = {name} + (NEW.status = '{code}') - (OLD.status = '{code}')"
+                                     for name, code in (('present', 'P'), ('absent', 'A'), ('not_marked', 'N.M.')))
+    return {
+        'keys': ('student_id', subject_column),
+        'insert': [_bump('NEW', '+', subject_column)],
+        'delete': [_bump('OLD', '-', subject_column)],
+        'update': [f'''UPDATE student_attendance_summary SET
+                {delta}
+            WHERE student_id = NEW.student_id AND subject = {_subject_expr('NEW', subject_column)}
+              AND OLD.status IS NOT NEW.status;'''],
+    }
+
+
+def schema(subject_column):
+    """CREATE statement for the summary table (kept current by trigger_sql)."""
+    return [
+        '''CREATE TABLE IF NOT EXISTS student_attendance_summary (
+            student_id TEXT NOT NULL,
+            subject TEXT NOT NULL,
+            total INTEGER NOT NULL DEFAULT 0,
+            present INTEGER NOT NULL DEFAULT 0,
+            absent INTEGER NOT NULL DEFAULT 0,
+            not_marked INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (student_id, subject)
+        ) WITHOUT ROWID''',
+    ]
+
+
+def _computed_sql(subject_column):
+    counts = ("COUNT(*), SUM(status = 'P'), SUM(status = 'A'), SUM(status = 'N.M.')")
+    return f'''
+        SELECT student_id, {_subject_expr('attendance', subject_column)}, {counts}
+        FROM attendance GROUP BY 1, 2'''
+
+
+def rebuild_sql(subject_column):
+    """Statements recomputing the whole summary table from attendance."""
+    return [
+        'DELETE FROM student_attendance_summary',
+        f'''INSERT INTO student_attendance_summary
+                (student_id, subject, total, present, absent, not_marked)
+            {_computed_sql(subject_column)}''',
+    ]
+
+
+def rebuild(conn, subject_column):
+    """Recompute the table in one transaction; returns the number of rows written."""
+    return targets.rebuild(conn, rebuild_sql(subject_column), 'student_attendance_summary')
+
+
+def verify(conn, subject_column):
+    """Rows where the stored summary differs from a fresh recount (empty when correct)."""
+    return targets.recount_diff(
+        conn,
+        'SELECT student_id, subject, total, present, absent, not_marked '
+        'FROM student_attendance_summary WHERE total != 0',
+        f'SELECT * FROM ({_computed_sql(subject_column)})')
+
+
+def student_totals(conn, student_id, subject=OVERALL):
+    """{'total', 'present', 'absent', 'not_marked'} for a student, overall or for one subject."""
+    return dict(zip(_COUNTS, conn.execute(TOTALS_SQL, (student_id, subject)).fetchone()))
+
+
+def subject_breakdown(conn, student_id):
+    """Per-subject summary rows for a student."""
+    return conn.execute('''
+        SELECT subject, total, present, absent, not_marked FROM student_attendance_summary
+        WHERE student_id = ? AND total != 0
+        ORDER BY subject
+    ''', (student_id,)).fetchall()
+
+
+def main(argv=None):
+    return targets.maintenance_main(
+        argv, 'student_attendance_summary',
+        rebuild=lambda conn, target: rebuild(conn, SUBJECT_COLUMNS[target]),
+        verify=lambda conn, target: verify(conn, SUBJECT_COLUMNS[target]))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,222 @@
+"""Set-based attendance writes shared by app.py and TH2/app.py.
+
+One teacher submission becomes one roster SELECT (limited to the sections
+being taught) plus one ``executemany`` UPSERT, all inside a single
+BEGIN IMMEDIATE transaction.
+
+Given a ``changes`` list, the writers append one dict per record written
+({'student_id', 'date', 'period', 'status', ...}); the apps publish those to
+live dashboards once the transaction has committed (see live_updates.py).
+"""
+from db_pool import transaction
+
+# Every statement the writers run; migrations.py --check-plans EXPLAINs these
+# (with TEMP_TABLES created first), so the plan gate follows the code.
+
+# app.py (attendance.db)
+CLASS_ROSTER = 'SELECT student_id FROM students'
+CLASS_ROSTER_SECTIONS = 'SELECT student_id FROM students WHERE section IN ({})'
+# a submission without a section filter replaces the teacher's slot wholesale
+CLEAR_CLASS_SLOT = 'DELETE FROM attendance WHERE teacher_id = ? AND date = ? AND period = ?'
+# one record per student/date/period: take over a slot another teacher marked
+UPSERT_CLASS = '''
+    INSERT INTO attendance (student_id, teacher_id, date, period, status)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (student_id, date, period) DO UPDATE SET
+        teacher_id = excluded.teacher_id,
+        status = excluded.status,
+        marked_by_club = 0,
+        club_event_id = NULL
+'''
+SECTION_TEACHERS_TABLE = ('CREATE TEMP TABLE IF NOT EXISTS section_teachers '
+                          '(section TEXT PRIMARY KEY, teacher_id TEXT NOT NULL) WITHOUT ROWID')
+EVENT_MERGE_COUNTS = '''
+    SELECT
+        COUNT(DISTINCT CASE WHEN s.student_id IS NULL THEN ea.student_id END) AS unknown,
+        COUNT(DISTINCT CASE WHEN a.attendance_id IS NOT NULL THEN ea.student_id END) AS updated,
+        COUNT(DISTINCT CASE WHEN s.student_id IS NOT NULL AND a.attendance_id IS NULL
+                            THEN ea.student_id END) AS inserted,
+        COUNT(DISTINCT CASE WHEN s.student_id IS NOT NULL AND a.attendance_id IS NULL
+                                 AND st.section IS NULL THEN ea.student_id END) AS unscheduled
+    FROM event_attendance ea
+    LEFT JOIN students s ON s.student_id = ea.student_id
+    LEFT JOIN temp.section_teachers st ON st.section = s.section
+    LEFT JOIN attendance a ON a.student_id = s.student_id AND a.date = ? AND a.period = ?
+    WHERE ea.event_id = ?
+'''
+EVENT_MERGE = '''
+    INSERT INTO attendance (student_id, teacher_id, date, period, status, marked_by_club, club_event_id)
+    SELECT DISTINCT ea.student_id, COALESCE(st.teacher_id, ?), ?, ?, 'P', 1, ?
+    FROM event_attendance ea
+    JOIN students s ON s.student_id = ea.student_id
+    LEFT JOIN temp.section_teachers st ON st.section = s.section
+    WHERE ea.event_id = ?
+    ON CONFLICT (student_id, date, period) DO UPDATE SET
+        status = 'P',
+        marked_by_club = 1,
+        club_event_id = excluded.club_event_id
+'''
+EVENT_ATTENDEES = '''
+    SELECT DISTINCT ea.student_id FROM event_attendance ea
+    JOIN students s ON s.student_id = ea.student_id
+    WHERE ea.event_id = ?
+'''
+
+# TH2/app.py (database.db)
+SUBJECT_ROSTER = 'SELECT student_id, name, section FROM users WHERE role="student"{} ORDER BY section, name'
+UPSERT_SUBJECT = '''
+    INSERT INTO attendance (student_id, subject_code, date, period, status, marked_by)
+    VALUES (?,?,?,?,?,?)
+    ON CONFLICT (student_id, subject_code, date, period) DO UPDATE SET
+        status = excluded.status,
+        marked_by = excluded.marked_by
+'''
+UPLOAD_IDS_TABLE = 'CREATE TEMP TABLE IF NOT EXISTS upload_ids (student_id TEXT PRIMARY KEY) WITHOUT ROWID'
+# distinct uploaded IDs: with an N.M./pending record that day, with only 'P' ones, with none
+EVENT_PRESENT_COUNTS = '''
+    SELECT COALESCE(SUM(pending > 0), 0),
+           COALESCE(SUM(pending = 0 AND present > 0), 0),
+           COALESCE(SUM(pending = 0 AND present = 0), 0)
+    FROM (SELECT upload_ids.student_id,
+                 COUNT(CASE WHEN a.status IN ('N.M.', 'pending') THEN 1 END) AS pending,
+                 COUNT(CASE WHEN a.status = 'P' THEN 1 END) AS present
+          FROM temp.upload_ids
+          LEFT JOIN attendance a ON a.student_id = upload_ids.student_id AND a.date = ?
+          GROUP BY upload_ids.student_id)
+'''
+EVENT_PRESENT_PENDING = '''
+    SELECT student_id, subject_code, period FROM attendance
+    WHERE student_id IN (SELECT student_id FROM temp.upload_ids)
+      AND date = ? AND status IN ('N.M.', 'pending')
+'''
+EVENT_PRESENT = '''
+    UPDATE attendance SET status = 'P', marked_by = ?, event_name = ?, club_id = ?
+    WHERE student_id IN (SELECT student_id FROM temp.upload_ids)
+      AND date = ? AND status IN ('N.M.', 'pending')
+'''
+
+# temp tables live as long as the (pooled) connection: created once, emptied after use
+TEMP_TABLES = [SECTION_TEACHERS_TABLE, UPLOAD_IDS_TABLE]
+
+
+def _in_clause(values):
+    return ','.join('?' * len(values))
+
+
+def _sections(sections):
+    """Normalise a section filter: None/'' means every section."""
+    if not sections:
+        return []
+    if isinstance(sections, str):
+        sections = [sections]
+    return [s for s in sections if s]
+
+
+# ---------- app.py (attendance.db) ----------
+
+def class_roster(conn, sections=None):
+    """Student IDs for the given sections (all students when none given)."""
+    sections = _sections(sections)
+    if sections:
+        rows = conn.execute(CLASS_ROSTER_SECTIONS.format(_in_clause(sections)), sections)
+    else:
+        rows = conn.execute(CLASS_ROSTER)
+    return [r[0] for r in rows]
+
+
+def write_class_attendance(conn, teacher_id, date, period, present_ids, sections=None, changes=None):
+    """Mark one period for a teacher: students in present_ids get 'P', the rest of the roster 'A'.
+
+    Without a section filter the teacher's previous submission for the slot
+    is replaced wholesale, as before. With one, only that roster is written.
+    Returns the number of records written.
+    """
+    present = set(present_ids)
+    with transaction(conn):
+        roster = class_roster(conn, sections)
+        if not _sections(sections):
+            conn.execute(CLEAR_CLASS_SLOT, (teacher_id, date, period))
+        rows = [(sid, teacher_id, date, period, 'P' if sid in present else 'A') for sid in roster]
+        conn.executemany(UPSERT_CLASS, rows)
+    if changes is not None:
+        changes.extend({'student_id': sid, 'date': date, 'period': period, 'status': status, 'marked_by_club': 0}
+                       for sid, _, _, _, status in rows)
+    return len(roster)
+
+
+def merge_event_attendance(conn, event, teacher_id, section_teachers=None, changes=None):
+    """Credit an approved club event: mark every attendee present for its date/period.
+
+    One INSERT ... SELECT ... ON CONFLICT DO UPDATE merges event_attendance
+    into attendance, so re-running it for the same event changes nothing.
+    New records are credited to the class the student's section has in that
+    slot (section_teachers: section -> teacher_id, from the timetable) and to
+    teacher_id for sections without one. IDs that are not in students are
+    skipped and counted as unknown.
+    Returns {'inserted', 'updated', 'unknown', 'unscheduled'} counts, the last
+    being the inserted records that fell back to teacher_id.
+    """
+    event_id, date, period = event['event_id'], event['event_date'], event['period']
+    with transaction(conn):
+        conn.execute(SECTION_TEACHERS_TABLE)
+        conn.execute('DELETE FROM temp.section_teachers')
+        conn.executemany('INSERT INTO temp.section_teachers (section, teacher_id) VALUES (?, ?)',
+                         (section_teachers or {}).items())
+        unknown, updated, inserted, unscheduled = conn.execute(EVENT_MERGE_COUNTS,
+                                                               (date, period, event_id)).fetchone()
+        conn.execute(EVENT_MERGE, (teacher_id, date, period, event_id, event_id))
+        conn.execute('DELETE FROM temp.section_teachers')
+        if changes is not None:
+            changes.extend({'student_id': sid, 'date': date, 'period': period, 'status': 'P', 'marked_by_club': 1}
+                           for (sid,) in conn.execute(EVENT_ATTENDEES, (event_id,)))
+    return {'inserted': inserted, 'updated': updated, 'unknown': unknown, 'unscheduled': unscheduled}
+
+
+# ---------- TH2/app.py (database.db) ----------
+
+def subject_roster(conn, sections=None):
+    """(student_id, name, section) rows for students in the given sections."""
+    sections = _sections(sections)
+    where = f' AND section IN ({_in_clause(sections)})' if sections else ''
+    return conn.execute(SUBJECT_ROSTER.format(where), sections).fetchall()
+
+
+def write_subject_attendance(conn, subject_code, date, period, statuses, marked_by,
+                             sections=None, default='N.M.', changes=None):
+    """Upsert one subject period: statuses maps student_id -> status.
+
+    Students in the roster without an entry in statuses get default.
+    Returns the number of records written.
+    """
+    with transaction(conn):
+        roster = [r['student_id'] for r in subject_roster(conn, sections)]
+        rows = [(sid, subject_code, date, period, statuses.get(sid, default), marked_by) for sid in roster]
+        conn.executemany(UPSERT_SUBJECT, rows)
+    if changes is not None:
+        changes.extend({'student_id': sid, 'date': date, 'period': period, 'status': status,
+                        'subject_code': subject_code, 'marked_by': marked_by} for sid, _, _, _, status, _ in rows)
+    return len(roster)
+
+
+def mark_event_present(conn, student_ids, date, marked_by, event_name, club_id, changes=None):
+    """Credit club_id's event: every N.M./pending record on date for the uploaded IDs becomes 'P'.
+
+    The IDs are loaded into a temp table with one executemany, counted with
+    one grouped join and converted with one UPDATE, whatever the upload size.
+    Returns {'marked' (records), 'matched', 'already_present', 'unmatched'}
+    where the last three count distinct uploaded IDs.
+    """
+    with transaction(conn):
+        conn.execute(UPLOAD_IDS_TABLE)
+        conn.execute('DELETE FROM temp.upload_ids')
+        conn.executemany('INSERT OR IGNORE INTO temp.upload_ids (student_id) VALUES (?)',
+                         [(sid,) for sid in student_ids])
+        matched, already_present, unmatched = conn.execute(EVENT_PRESENT_COUNTS, (date,)).fetchone()
+        if changes is not None:
+            changes.extend({'student_id': sid, 'date': date, 'period': period, 'status': 'P',
+                            'subject_code': subject_code, 'marked_by': marked_by, 'event_name': event_name,
+                            'club_id': club_id}
+                           for sid, subject_code, period in conn.execute(EVENT_PRESENT_PENDING, (date,)))
+        marked = conn.execute(EVENT_PRESENT, (marked_by, event_name, club_id, date)).rowcount
+        conn.execute('DELETE FROM temp.upload_ids')
+    return {'marked': marked, 'matched': matched, 'already_present': already_present, 'unmatched': unmatched}
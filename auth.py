@@ -0,0 +1,233 @@
+"""Login for app.py and TH2/app.py: one principal lookup, one hash policy.
+
+Both databases expose their accounts through a ``principals`` view
+(role, login, password, name[, student_id]) resolved by primary-key/unique
+index lookups; see migrations.py. ``Authenticator`` puts three things in
+front of it:
+
+- a short-lived LRU of principals, including "no such login" answers, so
+  a login storm does not turn into one principal lookup per attempt; it
+  holds no password hashes, each check reads the stored hash by key
+- a hash policy (AUTH_HASH_METHOD, any werkzeug method string) whose cost is
+  bounded and configurable; stored hashes with a different method or cost,
+  and legacy plaintext passwords, are rehashed on the next successful login
+
+The password check is then the only CPU-heavy step of a login, and its cost
+is whatever the policy says.
+
+Usage:
+    python auth.py --benchmark                         # logins/s per core per hash method
+    python auth.py --benchmark --methods pbkdf2:sha256:100000 scrypt
+"""
+import argparse
+import hmac
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from functools import cached_property
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+import db_pool
+
+# scrypt N=2^14: ~30 ms per check, half of werkzeug's default (N=2^15)
+HASH_METHOD = os.environ.get('AUTH_HASH_METHOD', 'scrypt:16384:8:1')
+CACHE_TTL = float(os.environ.get('AUTH_CACHE_TTL', 60))              # seconds, known logins
+NEGATIVE_CACHE_TTL = float(os.environ.get('AUTH_NEGATIVE_CACHE_TTL', 10))  # seconds, unknown logins
+CACHE_SIZE = int(os.environ.get('AUTH_CACHE_SIZE', 10000))
+
+HASH_PREFIXES = ('scrypt', 'pbkdf2')
+
+# principals by login (TH2's logins are unique across roles) or by login and role
+LOOKUP_SQL = 'SELECT * FROM principals WHERE login = ?'
+LOOKUP_ROLE_SQL = 'SELECT * FROM principals WHERE login = ? AND role = ?'
+PASSWORD_SQL = 'SELECT password FROM principals WHERE login = ? AND role = ?'
+
+
+def is_hashed(stored):
+    return stored.count('$') == 2 and stored.split(':', 1)[0] in HASH_PREFIXES
+
+
+class HashPolicy:
+    """Hashes new passwords with `method` and flags stored ones that differ."""
+
+    def __init__(self, method=HASH_METHOD):
+        self.method = method
+
+    @cached_property
+    def prefix(self):
+        # werkzeug expands defaults ('scrypt' -> 'scrypt:32768:8:1'); compare against the stored form.
+        # Computed on first use so building a policy at import time costs nothing
+        return generate_password_hash('', self.method).split('$', 1)[0]
+
+    def hash(self, password):
+        return generate_password_hash(password, self.method)
+
+    def verify(self, stored, password):
+        if not stored:
+            return False
+        if is_hashed(stored):
+            return check_password_hash(stored, password)
+        # legacy plaintext (database.py demo data); replaced on first login
+        return hmac.compare_digest(stored.encode(), password.encode())
+
+    def needs_rehash(self, stored):
+        return not is_hashed(stored) or stored.split('$', 1)[0] != self.prefix
+
+
+class PrincipalCache:
+    """Thread-safe LRU of principals (or None for unknown logins) with TTLs.
+
+    Entries hold what a session needs (role, login, name, ...), never the
+    password hash: Authenticator reads that from the database per check.
+    """
+
+    def __init__(self, ttl=CACHE_TTL, negative_ttl=NEGATIVE_CACHE_TTL, size=CACHE_SIZE):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """(found, row); found is False on a miss or an expired entry."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+
+    def put(self, key, row):
+        expires = time.monotonic() + (self.ttl if row is not None else self.negative_ttl)
+        with self._lock:
+            self._entries[key] = (expires, row)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+
+class Authenticator:
+    """authenticate(login, password[, role]) -> principal dict or None."""
+
+    def __init__(self, path, policy=None, cache=None):
+        self.path = path
+        self.policy = policy or HashPolicy()
+        self.cache = cache or PrincipalCache()
+        self.rehashed = 0
+
+    def lookup(self, login, role=None):
+        """Principal for login (and role) without its password hash, or None."""
+        key = (login, role)
+        found, row = self.cache.get(key)
+        if found:
+            return row
+        conn = db_pool.get_connection(self.path)
+        try:
+            if role is None:
+                row = conn.execute(LOOKUP_SQL, (login,)).fetchone()
+            else:
+                row = conn.execute(LOOKUP_ROLE_SQL, (login, role)).fetchone()
+        finally:
+            conn.close()
+        if row is not None:
+            row = dict(row)
+            del row['password']
+        self.cache.put(key, row)
+        return row
+
+    def _stored_password(self, user):
+        conn = db_pool.get_connection(self.path)
+        try:
+            row = conn.execute(PASSWORD_SQL, (user['login'], user['role'])).fetchone()
+        finally:
+            conn.close()
+        return row[0] if row is not None else None
+
+    def authenticate(self, login, password, role=None):
+        if not login or not password:
+            return None
+        user = self.lookup(login, role)
+        if user is None:
+            return None
+        stored = self._stored_password(user)
+        if not self.policy.verify(stored, password):
+            return None
+        if self.policy.needs_rehash(stored):
+            self._rehash(user, stored, password)
+        return user
+
+    def _rehash(self, user, stored, password):
+        hashed = self.policy.hash(password)
+        conn = db_pool.get_connection(self.path)
+        try:
+            with db_pool.transaction(conn):
+                # principals is a view; its INSTEAD OF trigger updates the account table
+                conn.execute('UPDATE principals SET password = ? WHERE login = ? AND role = ? AND password = ?',
+                             (hashed, user['login'], user['role'], stored))
+        finally:
+            conn.close()
+        self.rehashed += 1
+
+
+# ---------- benchmark ----------
+
+def benchmark(methods, seconds=2.0, report=print):
+    """Single-threaded verifies per second for each method, i.e. logins/s per core."""
+    results = []
+    report(f'{"method":<26} {"ms/login":>9} {"logins/s/core":>14}')
+    for method in methods:
+        policy = HashPolicy(method)
+        stored = policy.hash('pass123')
+        n, start = 0, time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            if not policy.verify(stored, 'pass123'):
+                raise AssertionError(f'{method}: verify failed')
+            n += 1
+        elapsed = time.perf_counter() - start
+        results.append({'method': policy.prefix, 'ms': elapsed / n * 1000, 'per_core': n / elapsed})
+        marker = '  (AUTH_HASH_METHOD)' if method == HASH_METHOD else ''
+        report(f'{policy.prefix:<26} {elapsed / n * 1000:>9.2f} {n / elapsed:>14.1f}{marker}')
+
+    cache = PrincipalCache()
+    cache.put(('2021001', 'student'), {'login': '2021001'})
+    n, start = 0, time.perf_counter()
+    while time.perf_counter() - start < seconds / 4:
+        cache.get(('2021001', 'student'))
+        n += 1
+    report(f'{"cached principal lookup":<26} {(time.perf_counter() - start) / n * 1000:>9.4f}')
+    report(f'{os.cpu_count()} cores here; multiply logins/s/core by worker processes (up to the core count)')
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Login hashing benchmark.')
+    parser.add_argument('--benchmark', action='store_true', help='measure logins per second per core')
+    parser.add_argument('--methods', nargs='+',
+                        default=[HASH_METHOD, 'scrypt', 'pbkdf2:sha256:100000', 'pbkdf2:sha256'],
+                        help="werkzeug hash methods ('scrypt' / 'pbkdf2:sha256' are werkzeug's defaults)")
+    parser.add_argument('--seconds', type=float, default=2.0, help='time per method')
+    args = parser.parse_args(argv)
+    if not args.benchmark:
+        parser.print_help()
+        return 0
+    benchmark(list(dict.fromkeys(args.methods)), args.seconds)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,573 @@
+"""Latency/throughput benchmark for app.py and TH2/app.py.
+
+Requests go through each app's Flask test client (no server, no network)
+against databases built by synthetic_data.py. Background jobs run inline,
+so upload_excel and approve_event are timed end to end: request plus the
+job that does the work.
+
+Scenarios, for both apps: login, student_dashboard, mark_attendance,
+upload_excel and approve_event (TH2 has no event approval step; there it is
+the VC creating an approval window). Each reports p50/p95/p99 latency and
+throughput, and is compared with benchmark_baseline.json when the dataset
+and settings match.
+
+Usage:
+    python benchmark.py                         # generate a small dataset, compare with the baseline
+    python benchmark.py --save-baseline         # record the current numbers as the baseline
+    python benchmark.py --students 50000 --days 365 --iterations 500 --threads 4
+    python benchmark.py --root-db big.db --apps root   # reuse a generated database (it gets written to)
+    python benchmark.py --startup               # worker import time / RSS, lazy vs eager pandas+openpyxl
+    python benchmark.py --threads 16 --write-behind    # mark_attendance through the group-commit writer
+    python benchmark.py --trigger-cost          # per-row write cost of the attendance triggers, table by table
+"""
+import argparse
+import importlib.util
+import io
+import json
+import math
+import os
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+import attendance_writer
+import migrations
+import synthetic_data
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+BASELINE_FILE = os.path.join(BASE_DIR, 'benchmark_baseline.json')
+
+APPS = {
+    # app module, env var it reads its database path from
+    'root': (os.path.join(BASE_DIR, 'app.py'), 'ATTENDANCE_DB'),
+    'th2': (os.path.join(BASE_DIR, 'TH2', 'app.py'), 'TH2_DB'),
+}
+SCENARIOS = ['login', 'student_dashboard', 'mark_attendance', 'upload_excel', 'approve_event']
+
+UPLOAD_SIZE = 200       # student IDs per uploaded sheet / club event
+WARMUP = 5
+TOLERANCE = 0.25        # p95 growth over the baseline reported as a regression
+NOISE_MS = 1.0          # ... unless it is smaller than this in absolute terms
+
+
+def load_app(name, db_path):
+    """Import an app module against db_path, with jobs run inline by the harness."""
+    path, env = APPS[name]
+    os.environ[env] = db_path
+    os.environ['JOB_WORKERS'] = '0'
+    module_name = f'bench_{name}_app'
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module   # Flask locates templates through sys.modules
+    spec.loader.exec_module(module)
+    module.app.config['TESTING'] = True
+    return module
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(pct / 100 * len(sorted_values)) - 1))]
+
+
+def run_scenario(make_op, iterations, threads):
+    """Time `iterations` calls spread over `threads` threads; make_op() gives each thread its op(i)."""
+    latencies, errors, spans = [], [], []
+    lock = threading.Lock()
+
+    def worker(indices):
+        op = make_op()
+        first = None
+        for i in [-1 - i for i in indices[:WARMUP]] + indices:
+            start = time.perf_counter()
+            if i >= 0 and first is None:
+                first = start
+            try:
+                op(i)
+            except Exception as e:
+                with lock:
+                    errors.append(f'{e.__class__.__name__}: {e}')
+                continue
+            elapsed = time.perf_counter() - start
+            if i >= 0:
+                with lock:
+                    latencies.append(elapsed * 1000)
+        if first is not None:
+            with lock:
+                spans.append((first, time.perf_counter()))
+
+    chunks = [list(range(t, iterations, threads)) for t in range(threads)]
+    pool = [threading.Thread(target=worker, args=(chunk,)) for chunk in chunks]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    # throughput over the timed requests only, not client setup or warm-up
+    wall = max(end for _, end in spans) - min(start for start, _ in spans) if spans else 0
+
+    latencies.sort()
+    return {
+        'n': len(latencies),
+        'errors': len(errors),
+        'first_error': errors[0] if errors else None,
+        'mean_ms': round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'throughput_rps': round(len(latencies) / wall, 1) if wall else 0.0,
+    }
+
+
+def _expect(response, *codes):
+    if response.status_code not in codes:
+        raise AssertionError(f'{response.request.method} {response.request.path} -> {response.status_code}')
+    return response
+
+
+def _csv(ids):
+    return ('Student ID\n' + '\n'.join(ids) + '\n').encode()
+
+
+def _recent_days(conn):
+    # from the counters table: DISTINCT over attendance would scan it
+    days = [r[0] for r in conn.execute('''SELECT day FROM attendance_stats WHERE club = ''
+                                          ORDER BY day DESC LIMIT 60''')]
+    return days or [time.strftime('%Y-%m-%d')]
+
+
+def _run_job(module):
+    job = module.job_queue.get(module.job_queue.run_one('bench'))
+    if job is None or job['status'] != 'done':
+        raise AssertionError(f"job failed: {job and job['error']}")
+
+
+# ---------- app.py ----------
+
+def root_scenarios(m, db_path, runs):
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    students = [r[0] for r in conn.execute('SELECT student_id FROM students ORDER BY student_id')]
+    rosters = {}
+    for sid, section in conn.execute('SELECT student_id, section FROM students'):
+        rosters.setdefault(section, []).append(sid)
+    sections = sorted(rosters)
+    dates = _recent_days(conn)
+    teacher = conn.execute('SELECT teacher_id FROM teachers ORDER BY teacher_id LIMIT 1').fetchone()[0]
+    club = conn.execute('SELECT club_id FROM clubs ORDER BY club_id LIMIT 1').fetchone()[0]
+    conn.execute('UPDATE portal_access SET is_active = 0 WHERE club_id = ?', (club,))
+    conn.execute('''INSERT INTO portal_access (club_id, opened_by, duration_hours, is_active)
+                    VALUES (?, 'VC001', 24, 1)''', (club,))
+    # pending events for approve_event, each with UPLOAD_SIZE attendees
+    events = []
+    for i in range(runs):
+        event_id = conn.execute('''INSERT INTO club_events (club_id, event_name, event_date, period, status)
+                                   VALUES (?, ?, ?, ?, 'pending')''',
+                                (club, f'Bench event {i}', dates[i % len(dates)], 1 + i % 5)).lastrowid
+        conn.executemany('INSERT INTO event_attendance (event_id, student_id) VALUES (?, ?)',
+                         [(event_id, sid) for sid in random.sample(students, min(UPLOAD_SIZE, len(students)))])
+        events.append(event_id)
+    conn.commit()
+    conn.close()
+    pending = iter(events)
+    pending_lock = threading.Lock()
+
+    def login_client(username, password, role):
+        c = m.app.test_client()
+        _expect(c.post('/', data={'username': username, 'password': password, 'role': role}), 302)
+        return c
+
+    def login():
+        def op(i):
+            c = m.app.test_client()
+            r = _expect(c.post('/', data={'username': random.choice(students), 'password': 'pass123',
+                                          'role': 'student'}), 302)
+            if 'student' not in r.headers['Location']:
+                raise AssertionError('login failed')
+        return op
+
+    def student_dashboard():
+        clients = [login_client(sid, 'pass123', 'student') for sid in random.sample(students, min(10, len(students)))]
+        return lambda i: _expect(clients[i % len(clients)].get('/student/dashboard'), 200)
+
+    def mark_attendance():
+        c = login_client(teacher, 'teach123', 'teacher')
+
+        def op(i):
+            section = random.choice(sections)
+            roster = rosters[section]
+            _expect(c.post('/teacher/mark_attendance', data={
+                'date': random.choice(dates), 'period': str(random.randint(1, 5)), 'section': section,
+                'attendance[]': random.sample(roster, int(len(roster) * 0.7)),
+            }), 302)
+        return op
+
+    def upload_excel():
+        c = login_client(club, 'club123', 'club')
+
+        def op(i):
+            ids = random.sample(students, min(UPLOAD_SIZE, len(students)))
+            _expect(c.post('/club/upload', data={
+                'event_name': f'Bench upload {i}', 'event_date': random.choice(dates), 'period': '1',
+                'excel_file': (io.BytesIO(_csv(ids)), 'attendance.csv'),
+            }, content_type='multipart/form-data'), 302)
+            _run_job(m)
+        return op
+
+    def approve_event():
+        c = login_client('VC001', 'vc123', 'vc')
+
+        def op(i):
+            with pending_lock:
+                event_id = next(pending)
+            _expect(c.post(f'/vc/approve_event/{event_id}'), 302)
+            _run_job(m)
+        return op
+
+    return {'login': login, 'student_dashboard': student_dashboard, 'mark_attendance': mark_attendance,
+            'upload_excel': upload_excel, 'approve_event': approve_event}
+
+
+# ---------- TH2/app.py ----------
+
+def th2_scenarios(m, db_path, runs):
+    conn = sqlite3.connect(db_path)
+    students = [tuple(r) for r in conn.execute(
+        "SELECT username, student_id FROM users WHERE role = 'student' AND student_id IS NOT NULL")]
+    rosters = {}
+    for sid, section in conn.execute("SELECT student_id, section FROM users WHERE role = 'student'"):
+        rosters.setdefault(section, []).append(sid)
+    sections = sorted(rosters)
+    dates = _recent_days(conn)
+    teacher, subject = conn.execute('SELECT teacher_username, subject_code FROM subjects ORDER BY id LIMIT 1').fetchone()
+    club_id, leader = conn.execute("SELECT id, leader_username FROM clubs WHERE status = 'approved' ORDER BY id LIMIT 1").fetchone()
+    approval_id = conn.execute('''INSERT INTO vc_approvals (club_id, event_name, start_time, end_time, status)
+                                  VALUES (?, 'Bench window', '2000-01-01T00:00:00', '2999-01-01T00:00:00', 'approved')''',
+                               (club_id,)).lastrowid
+    conn.commit()
+    conn.close()
+
+    def login_client(username):
+        c = m.app.test_client()
+        _expect(c.post('/login', data={'username': username, 'password': 'pass123'}), 302)
+        return c
+
+    def login():
+        def op(i):
+            c = m.app.test_client()
+            r = _expect(c.post('/login', data={'username': random.choice(students)[0], 'password': 'pass123'}), 302)
+            if 'student' not in r.headers['Location']:
+                raise AssertionError('login failed')
+        return op
+
+    def student_dashboard():
+        clients = [login_client(u) for u, _ in random.sample(students, min(10, len(students)))]
+        return lambda i: _expect(clients[i % len(clients)].get('/student_dashboard'), 200)
+
+    def mark_attendance():
+        c = login_client(teacher)
+
+        def op(i):
+            section = random.choice(sections)
+            form = {'subject_code': subject, 'period': str(random.randint(1, 5)),
+                    'date': random.choice(dates), 'section': section}
+            form.update({f'attendance_{sid}': random.choice('PPPA') for sid in rosters[section]})
+            _expect(c.post('/teacher_portal', data=form), 200)
+        return op
+
+    def upload_excel():
+        c = login_client(leader)
+
+        def op(i):
+            ids = [sid for _, sid in random.sample(students, min(UPLOAD_SIZE, len(students)))]
+            _expect(c.post('/club_portal', data={
+                'approval_id': str(approval_id), 'event_name': f'Bench upload {i}',
+                'file': (io.BytesIO(_csv(ids)), 'attendance.csv'),
+            }, content_type='multipart/form-data'), 302)
+            _run_job(m)
+        return op
+
+    def approve_event():
+        c = login_client('vc')
+
+        def op(i):
+            _expect(c.post('/vc_portal', data={
+                'action': 'create_approval', 'club_id': str(club_id), 'event_name': f'Bench approval {i}',
+                'start_time': '2030-01-01T09:00', 'end_time': '2030-01-01T17:00',
+            }), 200)
+        return op
+
+    return {'login': login, 'student_dashboard': student_dashboard, 'mark_attendance': mark_attendance,
+            'upload_excel': upload_excel, 'approve_event': approve_event}
+
+
+SCENARIO_BUILDERS = {
+    'root': root_scenarios,
+    'th2': th2_scenarios,
+}
+
+
+# ---------- startup ----------
+
+STARTUP_RUNS = 5
+EAGER_MODULES = ('pandas', 'openpyxl')   # what the apps used to import at module top
+HEAVY_MODULES = ('pandas', 'numpy', 'openpyxl', 'xlrd')
+
+# run in a fresh interpreter: argv = app path, module name, comma-separated modules to import first
+_STARTUP_PROBE = """
+import importlib, importlib.util, json, resource, sys, time
+path, name, preload = sys.argv[1], sys.argv[2], [m for m in sys.argv[3].split(',') if m]
+scale = 1 if sys.platform == 'darwin' else 1024          # ru_maxrss: bytes on macOS, KiB elsewhere
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+start = time.perf_counter()
+for m in preload:
+    importlib.import_module(m)
+spec = importlib.util.spec_from_file_location(name, path)
+module = importlib.util.module_from_spec(spec)
+sys.modules[name] = module
+spec.loader.exec_module(module)
+elapsed = time.perf_counter() - start
+after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+print(json.dumps({'import_ms': elapsed * 1000, 'rss_mb': after / 1e6, 'interpreter_rss_mb': before / 1e6,
+                  'heavy_modules': sorted(m for m in %r if m in sys.modules)}))
+""" % (HEAVY_MODULES,)
+
+
+def measure_startup(name, db_path, preload=(), runs=STARTUP_RUNS):
+    """Median import time and peak RSS of a worker importing one app in a fresh interpreter."""
+    import subprocess
+    path, env_var = APPS[name]
+    env = dict(os.environ, JOB_WORKERS='0', **{env_var: db_path})
+    samples = []
+    for i in range(runs + 1):   # the first run creates the schema and warms the OS page cache
+        out = subprocess.run([sys.executable, '-c', _STARTUP_PROBE, path, f'startup_{name}', ','.join(preload)],
+                             env=env, cwd=os.path.dirname(path), capture_output=True, text=True, check=True)
+        if i:
+            samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    samples.sort(key=lambda r: r['import_ms'])
+    median = dict(samples[len(samples) // 2])
+    median['rss_mb'] = max(r['rss_mb'] for r in samples)
+    return median
+
+
+def startup(apps, runs=STARTUP_RUNS):
+    """Import cost per app as shipped, and with the spreadsheet libraries imported eagerly."""
+    available = [m for m in EAGER_MODULES if importlib.util.find_spec(m) is not None]
+    results = {}
+    print(f"\n{'startup':<32}{'import ms':>10}{'RSS MB':>9}  heavy modules loaded")
+    with tempfile.TemporaryDirectory(prefix='attendance-startup-') as tmp:
+        for name in apps:
+            db_path = os.path.join(tmp, f'{name}.db')
+            variants = [('lazy', ())]
+            if available:
+                variants.append(('eager ' + '+'.join(available), available))
+            for label, preload in variants:
+                r = measure_startup(name, db_path, preload, runs)
+                results[f'{name}.{label}'] = r
+                print(f"{name + ' (' + label + ')':<32}{r['import_ms']:>10.1f}{r['rss_mb']:>9.1f}  "
+                      f"{', '.join(r['heavy_modules']) or '-'}")
+    return results
+
+
+# ---------- trigger cost ----------
+
+TRIGGER_ROWS = 500      # rows per timed write: a few sections' submissions
+TRIGGER_RUNS = 7
+
+
+def _trigger_writes(conn, name):
+    """(upsert SQL, rows(date, status)) writing TRIGGER_ROWS students' attendance the way the app does."""
+    if name == 'root':
+        students = [r[0] for r in conn.execute('SELECT student_id FROM students ORDER BY student_id LIMIT ?',
+                                               (TRIGGER_ROWS,))]
+        teacher = conn.execute('SELECT teacher_id FROM attendance LIMIT 1').fetchone()[0]
+        return attendance_writer.UPSERT_CLASS, lambda date, status: [(sid, teacher, date, 1, status)
+                                                                     for sid in students]
+    students = [r[0] for r in conn.execute("""SELECT student_id FROM users WHERE role = 'student'
+                                              ORDER BY student_id LIMIT ?""", (TRIGGER_ROWS,))]
+    subject = conn.execute('SELECT subject_code FROM attendance LIMIT 1').fetchone()[0]
+    return attendance_writer.UPSERT_SUBJECT, lambda date, status: [(sid, subject, date, '1', status, 'bench')
+                                                                   for sid in students]
+
+
+def _time_writes(conn, sql, rows, dates):
+    """Median microseconds per row of inserting a fresh slot, flipping its statuses (the upsert's update)
+    and writing it again unchanged."""
+    samples = {'insert': [], 'update': [], 'unchanged': []}
+    for date in dates:
+        for status, kind in (('P', 'insert'), ('A', 'update'), ('A', 'unchanged')):
+            batch = rows(date, status)
+            conn.execute('BEGIN IMMEDIATE')
+            start = time.perf_counter()
+            conn.executemany(sql, batch)
+            samples[kind].append((time.perf_counter() - start) / len(batch) * 1e6)
+            conn.execute('COMMIT')
+    return {kind: sorted(values)[len(values) // 2] for kind, values in samples.items()}
+
+
+def trigger_cost(apps, students, teachers, days, clubs, runs=TRIGGER_RUNS):
+    """Per-row cost of the attendance writes with no triggers, then with the attendance triggers
+    (migrations.attendance_triggers) keeping one more derived table at a time."""
+    results = {}
+    dates = iter(f'2099-{m:02d}-{d:02d}' for m in range(1, 13) for d in range(1, 29))   # never in the dataset
+    with tempfile.TemporaryDirectory(prefix='attendance-triggers-') as tmp:
+        for name in apps:
+            db_path = os.path.join(tmp, f'{name}.db')
+            print(f'generating {name} dataset...')
+            synthetic_data.generate(name, db_path, students, teachers, days, clubs, report=lambda msg: None)
+            conn = sqlite3.connect(db_path, isolation_level=None)
+            try:
+                conn.execute('PRAGMA journal_mode = WAL')
+                conn.execute('PRAGMA synchronous = NORMAL')
+                tables = list(migrations.attendance_trigger_sql(name))
+                sql, rows = _trigger_writes(conn, name)
+                print(f"\n{name + ': triggers keep':<36}{'insert us/row':>14}{'+':>7}"
+                      f"{'update us/row':>15}{'+':>7}{'unchanged':>11}")
+                steps = results[name] = []
+                previous = None
+                for i in range(len(tables) + 1):
+                    for event in ('insert', 'update', 'move', 'delete'):
+                        conn.execute(f'DROP TRIGGER IF EXISTS trg_attendance_{event}')
+                    if i:
+                        for ddl in migrations.attendance_triggers(name, tables[:i]):
+                            conn.execute(ddl)
+                    r = _time_writes(conn, sql, rows, [next(dates) for _ in range(runs)])
+                    line = f"{'+ ' + tables[i - 1] if i else 'nothing':<36}{r['insert']:>14.1f}"
+                    line += f"{r['insert'] - previous['insert']:>+7.1f}" if previous else f"{'':>7}"
+                    line += f"{r['update']:>15.1f}"
+                    line += f"{r['update'] - previous['update']:>+7.1f}" if previous else f"{'':>7}"
+                    print(line + f"{r['unchanged']:>11.1f}")
+                    steps.append(dict(r, table=tables[i - 1] if i else None))
+                    previous = r
+            finally:
+                conn.close()
+    return results
+
+
+# ---------- baseline ----------
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Print results next to the baseline; returns the list of regressed 'app.scenario' names."""
+    regressions = []
+    print(f"\n{'scenario':<24}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}{'base p95':>10}{'change':>9}")
+    for app_name, scenarios in results['apps'].items():
+        for name, r in scenarios.items():
+            base = (baseline or {}).get('apps', {}).get(app_name, {}).get(name)
+            line = f"{app_name + '.' + name:<24}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}{r['p99_ms']:>9.2f}{r['throughput_rps']:>9.1f}"
+            if base and base['p95_ms']:
+                change = r['p95_ms'] / base['p95_ms'] - 1
+                line += f"{base['p95_ms']:>10.2f}{change:>+9.0%}"
+                if change > tolerance and r['p95_ms'] - base['p95_ms'] > NOISE_MS:
+                    regressions.append(f'{app_name}.{name}')
+                    line += '  REGRESSION'
+            if r['errors']:
+                line += f"  {r['errors']} errors ({r['first_error']})"
+            print(line)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark both attendance apps through the Flask test client.')
+    parser.add_argument('--apps', default='root,th2', help='comma-separated: root, th2')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help='comma-separated subset to run')
+    parser.add_argument('--iterations', type=int, default=200, help='timed requests per scenario')
+    parser.add_argument('--threads', type=int, default=1, help='concurrent clients per scenario')
+    parser.add_argument('--students', type=int, default=2000)
+    parser.add_argument('--teachers', type=int, default=50)
+    parser.add_argument('--days', type=int, default=60)
+    parser.add_argument('--clubs', type=int, default=5)
+    parser.add_argument('--root-db', help='use this database for app.py instead of generating one')
+    parser.add_argument('--th2-db', help='use this database for TH2/app.py instead of generating one')
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--save-baseline', action='store_true', help='write the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help='allowed p95 growth (0.25 = 25%%)')
+    parser.add_argument('--json', help='also write the raw results to this file')
+    parser.add_argument('--write-behind', action='store_true',
+                        help='run the apps with WRITE_BEHIND=1 (group-commit attendance writes)')
+    parser.add_argument('--startup', action='store_true',
+                        help='only measure worker import time and RSS (fails if a spreadsheet library loads)')
+    parser.add_argument('--trigger-cost', action='store_true',
+                        help='only measure the per-row write cost of the attendance triggers')
+    args = parser.parse_args(argv)
+
+    if args.trigger_cost:
+        results = trigger_cost([a for a in args.apps.split(',') if a],
+                               args.students, args.teachers, args.days, args.clubs)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump({'trigger_cost': results}, f, indent=2)
+        return 0
+
+    if args.startup:
+        results = startup([a for a in args.apps.split(',') if a])
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump({'startup': results}, f, indent=2)
+        eager = [k for k, r in results.items() if k.endswith('.lazy') and r['heavy_modules']]
+        if eager:
+            print(f"\nspreadsheet libraries imported at startup: {', '.join(eager)}")
+            return 1
+        return 0
+
+    random.seed(0)
+    apps = [a for a in args.apps.split(',') if a]
+    scenarios = [s for s in args.scenarios.split(',') if s]
+    settings = {k: getattr(args, k) for k in ('iterations', 'threads', 'students', 'teachers', 'days', 'clubs')}
+    if args.write_behind:
+        # read by write_behind.py when the apps import it
+        os.environ['WRITE_BEHIND'] = '1'
+        settings['write_behind'] = True
+    results = {
+        'settings': settings,
+        'environment': {'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version,
+                        'machine': platform.machine()},
+        'apps': {},
+    }
+
+    with tempfile.TemporaryDirectory(prefix='attendance-bench-') as tmp:
+        for app_name in apps:
+            db_path = getattr(args, f'{app_name}_db')
+            if db_path:
+                settings[f'{app_name}_db'] = os.path.basename(db_path)
+            else:
+                db_path = os.path.join(tmp, f'{app_name}.db')
+                print(f'generating {app_name} dataset...')
+                synthetic_data.generate(app_name, db_path, args.students, args.teachers, args.days, args.clubs,
+                                        report=lambda msg: None)
+            module = load_app(app_name, os.path.abspath(db_path))
+            # runs: every timed and warm-up request (approve_event needs one pending event each)
+            builders = SCENARIO_BUILDERS[app_name](module, db_path, args.iterations + WARMUP * args.threads)
+            results['apps'][app_name] = {}
+            for name in scenarios:
+                print(f'  {app_name}.{name}...')
+                results['apps'][app_name][name] = run_scenario(builders[name], args.iterations, args.threads)
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('settings') != settings:
+            print(f'note: {os.path.basename(args.baseline)} was recorded with different settings; '
+                  'changes are indicative only')
+    regressions = compare(results, baseline, args.tolerance)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+        print(f'\nbaseline written to {args.baseline}')
+    if regressions:
+        print(f"\np95 regressed by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,6 +2,8 @@ import sqlite3
 from datetime import datetime, timedelta
 import random
 
+import migrations
+
 DB_NAME = "attendance.db"
 
 def init_database():
@@ -14,92 +16,9 @@ def init_database():
     #  TABLE CREATIONS
     # ========================
 
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS students (
-            student_id TEXT PRIMARY KEY,
-            name TEXT NOT NULL,
-            section TEXT NOT NULL,
-            year INTEGER NOT NULL,
-            password TEXT NOT NULL
-        )
-    """)
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS teachers (
-            teacher_id TEXT PRIMARY KEY,
-            name TEXT NOT NULL,
-            subject TEXT NOT NULL,
-            password TEXT NOT NULL
-        )
-    """)
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS clubs (
-            club_id TEXT PRIMARY KEY,
-            club_name TEXT NOT NULL,
-            password TEXT NOT NULL,
-            is_registered INTEGER DEFAULT 1
-        )
-    """)
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS vc (
-            vc_id TEXT PRIMARY KEY,
-            name TEXT NOT NULL,
-            password TEXT NOT NULL
-        )
-    """)
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS attendance (
-            attendance_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            student_id TEXT NOT NULL,
-            teacher_id TEXT NOT NULL,
-            date TEXT NOT NULL,
-            period INTEGER NOT NULL,
-            status TEXT NOT NULL,
-            marked_by_club INTEGER DEFAULT 0,
-            club_event_id INTEGER,
-            FOREIGN KEY (student_id) REFERENCES students(student_id),
-            FOREIGN KEY (teacher_id) REFERENCES teachers(teacher_id)
-        )
-    """)
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS club_events (
-            event_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            club_id TEXT NOT NULL,
-            event_name TEXT NOT NULL,
-            event_date TEXT NOT NULL,
-            period INTEGER NOT NULL,
-            status TEXT DEFAULT 'pending',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (club_id) REFERENCES clubs(club_id)
-        )
-    """)
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS event_attendance (
-            event_attendance_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            event_id INTEGER NOT NULL,
-            student_id TEXT NOT NULL,
-            FOREIGN KEY (event_id) REFERENCES club_events(event_id),
-            FOREIGN KEY (student_id) REFERENCES students(student_id)
-        )
-    """)
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS portal_access (
-            portal_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            club_id TEXT NOT NULL,
-            opened_by TEXT NOT NULL,
-            opened_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            duration_hours INTEGER NOT NULL,
-            is_active INTEGER DEFAULT 1,
-            FOREIGN KEY (club_id) REFERENCES clubs(club_id),
-            FOREIGN KEY (opened_by) REFERENCES vc(vc_id)
-        )
-    """)
+    # Schema and indexes are versioned in migrations.py; this also upgrades
+    # an existing attendance.db in place.
+    migrations.migrate(conn, migrations.ROOT_MIGRATIONS)
 
     # ========================
     #  INSERT SAMPLE DATA
@@ -148,6 +67,37 @@ def init_database():
         VALUES (?, ?, ?, ?)
     """, teachers)
 
+    # ---- Teaching assignments (T005 is left unassigned: it picks any section) ----
+    assignments = [
+        ('T001', 'A'), ('T001', 'B'),
+        ('T002', 'B'), ('T002', 'C'),
+        ('T003', 'A'), ('T003', 'C'),
+        ('T004', 'A'), ('T004', 'B'), ('T004', 'C'),
+    ]
+
+    cursor.executemany("""
+        INSERT OR IGNORE INTO teaching_assignments (teacher_id, section)
+        VALUES (?, ?)
+    """, assignments)
+
+    # ---- Timetable: Monday-Friday, periods 1-5, rotating each section's assigned
+    # teachers (offset per section, so nobody is in two rooms at once) ----
+    section_teachers = {}
+    for teacher_id, section in assignments:
+        section_teachers.setdefault(section, []).append(teacher_id)
+    subjects = {t[0]: t[2] for t in teachers}
+    timetable = []
+    for offset, (section, ids) in enumerate(sorted(section_teachers.items())):
+        for weekday in range(1, 6):
+            for period in range(1, 6):
+                teacher_id = ids[(weekday + period + offset) % len(ids)]
+                timetable.append((section, weekday, period, teacher_id, subjects[teacher_id]))
+
+    cursor.executemany("""
+        INSERT OR IGNORE INTO timetable (section, weekday, period, teacher_id, subject)
+        VALUES (?, ?, ?, ?, ?)
+    """, timetable)
+
     # ---- Clubs ----
     clubs = [
         ('CLUB001', 'Coding Club', 'club123'),
@@ -0,0 +1,282 @@
+"""Shared SQLite connection pool used by app.py and TH2/app.py.
+
+Connections are opened once per process, switched to WAL journaling with
+tuned pragmas, and handed out with thread-local reuse so nested helpers in
+the same request share one connection instead of opening their own.
+"""
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# Pragmas applied to every new connection
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',   # safe with WAL, avoids an fsync per commit
+    'cache_size': -20000,      # ~20 MB page cache (negative = KiB)
+    'mmap_size': 268435456,    # 256 MB memory-mapped reads
+    'temp_store': 'MEMORY',
+}
+
+POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))
+POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10.0))
+BUSY_TIMEOUT_MS = int(os.environ.get('DB_BUSY_TIMEOUT_MS', 5000))
+LOCK_RETRIES = int(os.environ.get('DB_LOCK_RETRIES', 5))
+LOCK_BACKOFF = 0.05  # seconds, doubled on every retry
+
+# Cursor class handed out by pooled connections (None = plain sqlite3.Cursor);
+# instrumentation.py installs a timing cursor here when enabled
+CURSOR_FACTORY = None
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection became free within the pool timeout."""
+
+
+def is_locked_error(exc):
+    msg = str(exc).lower()
+    return isinstance(exc, sqlite3.OperationalError) and ('locked' in msg or 'busy' in msg)
+
+
+def retry_on_locked(fn, retries=None, backoff=LOCK_BACKOFF, on_retry=None):
+    """Call fn(), retrying with jittered exponential backoff on "database is locked"."""
+    retries = LOCK_RETRIES if retries is None else retries
+    attempt = 0
+    while True:
+        try:
+            return fn()
+        except sqlite3.OperationalError as e:
+            if not is_locked_error(e) or attempt >= retries:
+                raise
+            attempt += 1
+            if on_retry:
+                on_retry()
+            time.sleep(backoff * (2 ** (attempt - 1)) * (0.5 + random.random()))
+
+
+@contextmanager
+def transaction(conn):
+    """Run a block inside BEGIN IMMEDIATE, committing on success.
+
+    Taking the write lock up front means lock waits happen here (and are
+    retried by pooled connections) instead of failing halfway through the
+    block. Nested use joins the transaction already open on conn.
+    """
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
+
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection whose close() hands it back to its pool.
+
+    Statements that would open a new transaction and commits are retried on
+    lock contention; a statement inside an open transaction is never retried
+    because the transaction itself has to be restarted by the caller.
+    """
+
+    pool = None
+
+    def cursor(self, factory=None):
+        factory = factory or CURSOR_FACTORY
+        return super().cursor(factory) if factory else super().cursor()
+
+    def _run(self, method, sql, parameters):
+        # Connection.execute() would bypass a Python-level cursor class
+        if CURSOR_FACTORY is None:
+            return getattr(super(), method)(sql, parameters)
+        return getattr(self.cursor(), method)(sql, parameters)
+
+    def execute(self, sql, parameters=()):
+        if self.in_transaction:
+            return self._run('execute', sql, parameters)
+        return self.pool._retry(lambda: self._run('execute', sql, parameters))
+
+    def executemany(self, sql, seq_of_parameters):
+        if self.in_transaction:
+            return self._run('executemany', sql, seq_of_parameters)
+        # materialise so a retry does not replay an exhausted iterator
+        rows = list(seq_of_parameters)
+        return self.pool._retry(lambda: self._run('executemany', sql, rows))
+
+    def commit(self):
+        return self.pool._retry(super().commit)
+
+    def close(self):
+        if self.pool is None:
+            return super().close()
+        self.pool.release(self)
+
+    def really_close(self):
+        super().close()
+
+
+class ConnectionPool:
+    def __init__(self, path, size=POOL_SIZE, timeout=POOL_TIMEOUT,
+                 busy_timeout_ms=BUSY_TIMEOUT_MS, retries=LOCK_RETRIES):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self.busy_timeout_ms = busy_timeout_ms
+        self.retries = retries
+        self._idle = []
+        self._open = 0
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._stats = {
+            'checkouts': 0,
+            'reused': 0,
+            'created': 0,
+            'wait_time_ms': 0.0,
+            'max_wait_ms': 0.0,
+            'lock_retries': 0,
+            'timeouts': 0,
+        }
+
+    # ---------- connection lifecycle ----------
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000.0,
+                               factory=PooledConnection, check_same_thread=False)
+        conn.pool = self
+        conn.row_factory = sqlite3.Row
+        conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout_ms)}')
+        for name, value in PRAGMAS.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def acquire(self):
+        held = getattr(self._local, 'conn', None)
+        if held is not None:
+            self._local.depth += 1
+            with self._cond:
+                self._stats['checkouts'] += 1
+                self._stats['reused'] += 1
+            return held
+
+        start = time.perf_counter()
+        conn = None
+        with self._cond:
+            self._stats['checkouts'] += 1
+            while not self._idle and self._open >= self.size:
+                remaining = self.timeout - (time.perf_counter() - start)
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeout(f'no free connection to {self.path} after {self.timeout}s')
+                self._cond.wait(remaining)
+            if self._idle:
+                conn = self._idle.pop()
+            else:
+                self._open += 1
+            waited = (time.perf_counter() - start) * 1000
+            self._stats['wait_time_ms'] += waited
+            self._stats['max_wait_ms'] = max(self._stats['max_wait_ms'], waited)
+
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._open -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._stats['created'] += 1
+
+        self._local.conn = conn
+        self._local.depth = 1
+        return conn
+
+    def release(self, conn):
+        if getattr(self._local, 'conn', None) is conn:
+            self._local.depth -= 1
+            if self._local.depth > 0:
+                return
+            self._local.conn = None
+        if conn.in_transaction:
+            # never hand out a connection with someone else's uncommitted work
+            conn.rollback()
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def close_all(self):
+        with self._cond:
+            while self._idle:
+                self._idle.pop().really_close()
+                self._open -= 1
+
+    # ---------- helpers ----------
+    def _retry(self, fn):
+        return retry_on_locked(fn, retries=self.retries, on_retry=self._count_retry)
+
+    def _count_retry(self):
+        with self._cond:
+            self._stats['lock_retries'] += 1
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    @contextmanager
+    def transaction(self):
+        """Check out a connection and run the block in one write transaction."""
+        with self.connection() as conn, transaction(conn):
+            yield conn
+
+    def metrics(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update(path=self.path, size=self.size, open=self._open, idle=len(self._idle))
+        stats['avg_wait_ms'] = round(stats['wait_time_ms'] / stats['checkouts'], 3) if stats['checkouts'] else 0.0
+        stats['wait_time_ms'] = round(stats['wait_time_ms'], 3)
+        stats['max_wait_ms'] = round(stats['max_wait_ms'], 3)
+        return stats
+
+
+# ---------- per-process registry ----------
+_pools = {}
+_pools_pid = os.getpid()
+_pools_lock = threading.Lock()
+
+
+def get_pool(path):
+    """Return the pool for a database file, creating it on first use.
+
+    The registry is reset after fork so pre-forked workers never share
+    connections inherited from the parent.
+    """
+    global _pools, _pools_pid
+    key = os.path.abspath(path)
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            _pools = {}
+            _pools_pid = os.getpid()
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(key)
+        return pool
+
+
+def get_connection(path):
+    """Check out a pooled connection; call close() on it to give it back."""
+    return get_pool(path).acquire()
+
+
+def all_metrics():
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [p.metrics() for p in pools]
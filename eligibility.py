@@ -0,0 +1,300 @@
+"""Exam eligibility for the whole college from an in-memory attendance matrix.
+
+One streamed scan of ``attendance`` fills two NumPy arrays indexed
+[student, day, period]: the status as an int8 code (0 = no class) and the
+subject as a small integer. Everything after that is vectorised: overall and
+per-subject percentages, the students below the threshold, and how many
+consecutive classes each of them must attend to get back to it.
+
+Percentages follow each app's own dashboard: attendance.db counts every
+marked class (P, A and N.M.), TH2 only P and A.
+
+The apps import this module on demand (the VC eligibility report), so NumPy
+is never loaded by a worker that does not need it.
+
+Usage:
+    python eligibility.py                                   # attendance.db, 75% threshold
+    python eligibility.py th2 --since 2026-07-01 --threshold 80
+    python eligibility.py --db big.db --csv eligibility.csv   # every student and subject
+"""
+import csv
+import sys
+import time
+
+import numpy as np
+
+import targets
+
+THRESHOLD = 75.0          # percent
+CHUNK_ROWS = 100000       # rows per fetchmany while loading
+SUBJECT_BLOCK_CELLS = 4000000  # students x subjects counted at once for the per-subject totals
+
+# int8 status codes in the matrix
+EMPTY, PRESENT, ABSENT, NOT_MARKED = 0, 1, 2, 3
+
+_STATUS = f"CASE a.status WHEN 'P' THEN {PRESENT} WHEN 'A' THEN {ABSENT} ELSE {NOT_MARKED} END"
+
+# Per database: students and subjects as (rowid, id, name[, section]) ordered
+# by rowid, and the scan returning (student rowid, day, period index, status,
+# subject rowid or -1) for dates between ?2 and ?3, day counted from ?1.
+# {period} becomes a CASE numbering the periods found in the range; {source}
+# is attendance a, read in table order when no range is given (CROSS JOIN
+# keeps it the outer loop: one pass over attendance, a lookup per row).
+TARGETS = {
+    'root': {
+        'students': 'SELECT rowid, student_id, name, section FROM students ORDER BY rowid',
+        'subjects': 'SELECT rowid, teacher_id, subject FROM teachers ORDER BY rowid',
+        'records': f'''
+            SELECT s.rowid, CAST(julianday(a.date) - julianday(?1) AS INTEGER), {{period}}, {_STATUS},
+                   COALESCE(t.rowid, -1)
+            FROM {{source}}
+            CROSS JOIN students s ON s.student_id = a.student_id
+            LEFT JOIN teachers t ON t.teacher_id = a.teacher_id
+            WHERE a.date BETWEEN ?2 AND ?3 AND julianday(a.date) IS NOT NULL AND a.period IS NOT NULL''',
+        'counted': (PRESENT, ABSENT, NOT_MARKED),
+    },
+    'th2': {
+        'students': '''SELECT id, student_id, name, section FROM users
+                       WHERE role = 'student' AND student_id IS NOT NULL ORDER BY id''',
+        'subjects': 'SELECT MIN(id), subject_code, subject_name FROM subjects GROUP BY subject_code ORDER BY 1',
+        'records': f'''
+            SELECT s.id, CAST(julianday(a.date) - julianday(?1) AS INTEGER), {{period}}, {_STATUS},
+                   COALESCE((SELECT MIN(id) FROM subjects WHERE subject_code = a.subject_code), -1)
+            FROM {{source}}
+            CROSS JOIN users s ON s.student_id = a.student_id AND s.role = 'student'
+            WHERE a.date BETWEEN ?2 AND ?3 AND julianday(a.date) IS NOT NULL AND a.period IS NOT NULL''',
+        'counted': (PRESENT, ABSENT),
+    },
+}
+
+
+def _period_order(value):
+    # numeric periods in numeric order, then anything else ('Event')
+    try:
+        return (0, float(value), '')
+    except (TypeError, ValueError):
+        return (1, 0.0, str(value))
+
+
+def _lookup(rowids, values):
+    """Index into the ascending rowids array for each value (-1 where absent)."""
+    idx = np.searchsorted(rowids, values)
+    idx[idx == len(rowids)] = 0
+    return np.where(rowids[idx] == values, idx, -1) if len(rowids) else np.full(len(values), -1)
+
+
+def classes_needed(present, counted, threshold=THRESHOLD):
+    """Classes in a row a student must attend to reach threshold percent (0 when already there)."""
+    t = threshold / 100
+    if t >= 1:
+        return np.where(present < counted, np.iinfo(np.int64).max, 0)
+    need = np.ceil((t * counted - present) / (1 - t) - 1e-9)
+    return np.maximum(need, 0).astype(np.int64)
+
+
+def percentages(present, counted):
+    return np.divide(present * 100.0, counted, out=np.zeros(len(counted)), where=counted > 0)
+
+
+class AttendanceMatrix:
+    """status[student, day, period] as int8 codes and subject[...] as subject indexes (-1 = none)."""
+
+    def __init__(self, target, students, subjects, first_day, periods, status, subject, records, overlaps):
+        self.target = target
+        self.students = students      # [(student_id, name, section)]
+        self.subjects = subjects      # [(code, name)]
+        self.first_day = first_day
+        self.periods = periods
+        self.status = status
+        self.subject = subject
+        self.records = records
+        self.overlaps = overlaps      # records that landed on an already filled cell
+        self.counted_codes = TARGETS[target]['counted']
+
+    @classmethod
+    def load(cls, conn, target, since=None, until=None, chunk_rows=CHUNK_ROWS):
+        """Build the matrix for dates in [since, until] with one streamed scan."""
+        spec = TARGETS[target]
+        # the whole table: a plain scan beats walking ix_attendance_date
+        source = 'attendance a' if since or until else 'attendance a NOT INDEXED'
+        since, until = since or '0000-01-01', until or '9999-12-31'
+        student_rows = conn.execute(spec['students']).fetchall()
+        subject_rows = conn.execute(spec['subjects']).fetchall()
+        student_rowids = np.array([r[0] for r in student_rows], dtype=np.int64)
+        subject_rowids = np.array([r[0] for r in subject_rows], dtype=np.int64)
+
+        first, last = conn.execute('SELECT MIN(date), MAX(date) FROM attendance WHERE date BETWEEN ? AND ?',
+                                   (since, until)).fetchone()
+        days = 0
+        if first is not None:
+            days = int(conn.execute('SELECT julianday(?) - julianday(?)', (last, first)).fetchone()[0] or 0) + 1
+        periods = sorted((r[0] for r in conn.execute(
+            'SELECT DISTINCT period FROM attendance WHERE date BETWEEN ? AND ? AND period IS NOT NULL',
+            (since, until))), key=_period_order)
+
+        shape = (len(student_rows), days, len(periods))
+        status = np.zeros(shape, dtype=np.int8)
+        subject = np.full(shape, -1, dtype=np.int16 if len(subject_rows) < 2 ** 15 else np.int32)
+        records = overlaps = 0
+        if first is not None and len(student_rows) and periods:
+            period_case = 'CASE a.period ' + ' '.join(f'WHEN ?{i + 4} THEN {i}' for i in range(len(periods))) + ' END'
+            cursor = conn.execute(spec['records'].format(source=source, period=period_case), (first, since, until, *periods))
+            while True:
+                rows = cursor.fetchmany(chunk_rows)
+                if not rows:
+                    break
+                block = np.array(rows, dtype=np.int64)
+                s = _lookup(student_rowids, block[:, 0])
+                keep = (s >= 0) & (block[:, 1] >= 0) & (block[:, 1] < days)
+                s, d, p = s[keep], block[keep, 1], block[keep, 2]
+                overlaps += int(np.count_nonzero(status[s, d, p]))
+                status[s, d, p] = block[keep, 3]
+                sub = block[keep, 4]
+                subject[s, d, p] = np.where(sub >= 0, _lookup(subject_rowids, sub), -1)
+                records += len(s)
+        return cls(target, [tuple(r[1:]) for r in student_rows], [tuple(r[1:]) for r in subject_rows],
+                   first, periods, status, subject, records, overlaps)
+
+    @property
+    def nbytes(self):
+        return self.status.nbytes + self.subject.nbytes
+
+    def totals(self):
+        """(present, counted) per student."""
+        present = np.count_nonzero(self.status == PRESENT, axis=(1, 2))
+        counted = np.count_nonzero(np.isin(self.status, self.counted_codes), axis=(1, 2))
+        return present, counted
+
+    def subject_totals(self):
+        """(student index, subject index, present, counted) for every pair with counted classes."""
+        n_subjects = max(len(self.subjects), 1)
+        block = max(1, SUBJECT_BLOCK_CELLS // n_subjects)
+        parts = []
+        for start in range(0, len(self.students), block):
+            status = self.status[start:start + block]
+            subject = self.subject[start:start + block]
+            mask = np.isin(status, self.counted_codes) & (subject >= 0)
+            local = np.broadcast_to(np.arange(status.shape[0])[:, None, None], status.shape)[mask]
+            keys = local * n_subjects + subject[mask]
+            size = status.shape[0] * n_subjects
+            counted = np.bincount(keys, minlength=size)
+            present = np.bincount(keys, weights=status[mask] == PRESENT, minlength=size).astype(np.int64)
+            nz = np.flatnonzero(counted)
+            parts.append((start + nz // n_subjects, nz % n_subjects, present[nz], counted[nz]))
+        if not parts:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, empty, empty
+        return tuple(np.concatenate(column) for column in zip(*parts))
+
+    def report(self, threshold=THRESHOLD, limit=None):
+        """Shortage lists, overall and per subject, worst first."""
+        present, counted = self.totals()
+        percent = percentages(present, counted)
+        short = np.flatnonzero((counted > 0) & (percent < threshold))
+        short = short[np.argsort(percent[short], kind='stable')]
+        needed = classes_needed(present, counted, threshold)
+
+        s_idx, sub_idx, s_present, s_counted = self.subject_totals()
+        s_percent = percentages(s_present, s_counted)
+        s_short = np.flatnonzero(s_percent < threshold)
+        s_short = s_short[np.argsort(s_percent[s_short], kind='stable')]
+        s_needed = classes_needed(s_present, s_counted, threshold)
+
+        def student(i):
+            student_id, name, section = self.students[i]
+            return {'student_id': student_id, 'name': name, 'section': section}
+
+        return {
+            'threshold': threshold,
+            'first_day': self.first_day,
+            'students': len(self.students),
+            'with_classes': int(np.count_nonzero(counted)),
+            'records': self.records,
+            'shortage_count': len(short),
+            'subject_shortage_count': len(s_short),
+            'shortages': [dict(student(i), present=int(present[i]), total=int(counted[i]),
+                               percent=round(float(percent[i]), 2), needed=int(needed[i]))
+                          for i in short[:limit]],
+            'subject_shortages': [dict(student(s_idx[j]), subject=self.subjects[sub_idx[j]][0],
+                                       subject_name=self.subjects[sub_idx[j]][1], present=int(s_present[j]),
+                                       total=int(s_counted[j]), percent=round(float(s_percent[j]), 2),
+                                       needed=int(s_needed[j]))
+                                  for j in s_short[:limit]],
+        }
+
+    def csv_rows(self, threshold=THRESHOLD):
+        """Header, then one row per student (subject blank) and per student/subject pair."""
+        present, counted = self.totals()
+        percent = percentages(present, counted)
+        needed = classes_needed(present, counted, threshold)
+        s_idx, sub_idx, s_present, s_counted = self.subject_totals()
+        s_percent = percentages(s_present, s_counted)
+        s_needed = classes_needed(s_present, s_counted, threshold)
+        yield ['student_id', 'name', 'section', 'subject', 'present', 'total', 'percent', 'needed', 'eligible']
+        for i, (student_id, name, section) in enumerate(self.students):
+            yield [student_id, name, section, '', present[i], counted[i], f'{percent[i]:.2f}', needed[i],
+                   int(percent[i] >= threshold or counted[i] == 0)]
+        for j in range(len(s_idx)):
+            student_id, name, section = self.students[s_idx[j]]
+            yield [student_id, name, section, self.subjects[sub_idx[j]][0], s_present[j], s_counted[j],
+                   f'{s_percent[j]:.2f}', s_needed[j], int(s_percent[j] >= threshold)]
+
+    def write_csv(self, f, threshold=THRESHOLD):
+        csv.writer(f).writerows(self.csv_rows(threshold))
+
+
+def eligibility_report(conn, target, since=None, until=None, threshold=THRESHOLD, limit=None):
+    """Load the matrix and return its report, with load/compute timings and matrix size."""
+    start = time.perf_counter()
+    matrix = AttendanceMatrix.load(conn, target, since, until)
+    loaded = time.perf_counter()
+    report = matrix.report(threshold, limit)
+    report.update(since=since, until=until, matrix_mb=round(matrix.nbytes / 2 ** 20, 1),
+                  load_seconds=round(loaded - start, 3), compute_seconds=round(time.perf_counter() - loaded, 3))
+    return report
+
+
+def main(argv=None):
+    parser = targets.argument_parser('Attendance percentages and shortage lists for every student.')
+    parser.add_argument('--since', help='first date (YYYY-MM-DD), default: all records')
+    parser.add_argument('--until', help='last date (YYYY-MM-DD)')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help='required percentage (default 75)')
+    parser.add_argument('--limit', type=int, default=20, help='shortages to print per list')
+    parser.add_argument('--csv', help='write every student and student/subject row to this file')
+    args = parser.parse_args(argv)
+
+    conn = targets.connect(args)
+    try:
+        start = time.perf_counter()
+        matrix = AttendanceMatrix.load(conn, args.target, args.since, args.until)
+    finally:
+        conn.close()
+    loaded = time.perf_counter()
+    report = matrix.report(args.threshold, args.limit)
+    computed = time.perf_counter()
+    if args.csv:
+        with open(args.csv, 'w', newline='') as f:
+            matrix.write_csv(f, args.threshold)
+
+    print(f"{report['records']} records, {report['students']} students x {matrix.status.shape[1]} days x "
+          f"{len(matrix.periods)} periods ({matrix.nbytes / 2 ** 20:.1f} MB); "
+          f"loaded in {loaded - start:.2f}s, computed in {computed - loaded:.2f}s")
+    if matrix.overlaps:
+        print(f'warning: {matrix.overlaps} records fell on a student/day/period already filled (the later record was kept)')
+    print(f"{report['shortage_count']} students below {args.threshold:g}% overall, "
+          f"{report['subject_shortage_count']} student/subject pairs below it")
+    for row in report['shortages']:
+        print(f"  {row['student_id']:<12} {row['name'][:24]:<24} {row['section'] or '':<10} "
+              f"{row['percent']:>6.2f}%  {row['present']}/{row['total']}  needs {row['needed']} more")
+    if report['subject_shortages']:
+        print('by subject:')
+    for row in report['subject_shortages']:
+        print(f"  {row['student_id']:<12} {row['subject']:<10} {row['percent']:>6.2f}%  "
+              f"{row['present']}/{row['total']}  needs {row['needed']} more")
+    if args.csv:
+        print(f'wrote {args.csv}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
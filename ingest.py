@@ -0,0 +1,266 @@
+"""Streaming ingestion of club attendance sheets (Excel/CSV).
+
+Uploads are read straight from the request stream, never saved to disk and
+never materialised as a DataFrame: rows are walked one at a time and student
+IDs come out in fixed-size batches ready for ``executemany``, so memory stays
+flat whatever the sheet size.
+
+.csv and ordinary .xlsx sheets need only the standard library. openpyxl is
+imported for the .xlsx files the fast scanner cannot read, and xlrd for
+legacy .xls; pandas is never used. The apps import this module on their
+first upload, so none of it is paid for at worker startup.
+"""
+import csv
+import io
+from html import unescape
+import re
+import zipfile
+from xml.etree import ElementTree
+
+# Header names accepted for the student ID column (compared lower-cased)
+ID_COLUMN_CANDIDATES = ['student id', 'student_id', 'id', 'roll no', 'roll']
+
+BATCH_SIZE = 5000
+CHUNK_SIZE = 1 << 20  # bytes of sheet XML scanned at a time
+
+
+def find_id_column(header, candidates=ID_COLUMN_CANDIDATES):
+    """Index of the student ID column in a header row."""
+    cols = [str(c).strip().lower() if c is not None else '' for c in header]
+    for candidate in candidates:
+        if candidate in cols:
+            return cols.index(candidate)
+    raise ValueError('No Student ID column found (expected "Student ID").')
+
+
+def normalise_id(value):
+    """Cell value -> student ID string ('' for blank cells).
+
+    Excel stores numeric IDs as floats (2021001.0); those become '2021001'.
+    """
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _csv_rows(stream):
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        yield from csv.reader(text)
+    finally:
+        text.detach()  # leave the caller's stream open
+
+
+def _xlsx_rows(stream):
+    from openpyxl import load_workbook
+    wb = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        yield from wb.active.iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+# ---------- fast .xlsx scanner ----------
+# openpyxl builds a cell object for every cell of every column; for a 100k-row
+# Google Forms export that is seconds of work to pull out one column. The
+# scanner below regex-matches only the ID column's cells in the raw sheet XML,
+# streaming it out of the zip in chunks. Anything it does not understand
+# (no cell references, namespace-prefixed tags) falls back to openpyxl.
+
+_MAIN_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_PKG_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+_CELL_RE = re.compile(rb'<c\b([^>]*?)(?:/>|>(.*?)</c>)', re.S)
+_REF_RE = re.compile(rb'\br="([A-Z]+)\d+"')
+_TYPE_RE = re.compile(rb'\bt="(\w+)"')
+_VALUE_RE = re.compile(rb'<v>(.*?)</v>', re.S)
+_TEXT_RE = re.compile(rb'<t(?:\s[^>]*)?>(.*?)</t>', re.S)
+_SI_RE = re.compile(rb'<si>(.*?)</si>', re.S)
+_PHONETIC_RE = re.compile(rb'<rPh\b.*?</rPh>', re.S)
+
+
+class _UnsupportedSheet(Exception):
+    pass
+
+
+def _first_sheet_path(zf):
+    wb = ElementTree.fromstring(zf.read('xl/workbook.xml'))
+    sheet = wb.find(f'{_MAIN_NS}sheets/{_MAIN_NS}sheet')
+    rid = sheet.get(f'{_REL_NS}id') if sheet is not None else None
+    rels = ElementTree.fromstring(zf.read('xl/_rels/workbook.xml.rels'))
+    for rel in rels.iter(f'{_PKG_REL_NS}Relationship'):
+        if rel.get('Id') == rid:
+            target = rel.get('Target')
+            return target.lstrip('/') if target.startswith('/') else 'xl/' + target
+    raise _UnsupportedSheet('first worksheet not found')
+
+
+def _shared_strings(zf):
+    try:
+        data = zf.read('xl/sharedStrings.xml')
+    except KeyError:
+        return []
+    return [b''.join(_TEXT_RE.findall(_PHONETIC_RE.sub(b'', si))) for si in _SI_RE.findall(data)]
+
+
+def _cell_value(attrs, body, shared):
+    if not body:
+        return None
+    match = _TYPE_RE.search(attrs)
+    kind = match.group(1) if match else b'n'
+    if kind == b'inlineStr':
+        raw = b''.join(_TEXT_RE.findall(body))
+    else:
+        value = _VALUE_RE.search(body)
+        if value is None:
+            return None
+        raw = value.group(1)
+        if kind == b's':
+            raw = shared[int(raw)]
+        elif kind == b'n':
+            number = float(raw)
+            return int(number) if number.is_integer() else number
+    return unescape(raw.decode('utf-8'))
+
+
+def _complete_rows(f):
+    """Yield chunks of sheet XML that end on a row boundary."""
+    tail = b''
+    while True:
+        chunk = f.read(CHUNK_SIZE)
+        if not chunk:
+            if tail:
+                yield tail
+            return
+        buf = tail + chunk
+        end = buf.rfind(b'</row>')
+        if end < 0:
+            tail = buf
+            continue
+        end += len(b'</row>')
+        yield buf[:end]
+        tail = buf[end:]
+
+
+def _xlsx_id_values(stream):
+    try:
+        zf = zipfile.ZipFile(stream)
+    except zipfile.BadZipFile:
+        raise ValueError('Uploaded file is not a valid .xlsx workbook.')
+    try:
+        shared = _shared_strings(zf)
+        sheet_path = _first_sheet_path(zf)
+    except (KeyError, ElementTree.ParseError):
+        raise _UnsupportedSheet('unexpected workbook layout')
+    with zf.open(sheet_path) as f:
+        cell_re = None
+        for chunk in _complete_rows(f):
+            pos = 0
+            if cell_re is None:
+                # header row: every cell, to find the ID column's letter
+                start = chunk.find(b'<row')
+                end = chunk.find(b'</row>')
+                if start < 0 or end < 0:
+                    raise _UnsupportedSheet('no header row')
+                header = {}
+                for m in _CELL_RE.finditer(chunk, start, end):
+                    ref = _REF_RE.search(m.group(1))
+                    if ref is None:
+                        raise _UnsupportedSheet('cells without references')
+                    header[ref.group(1)] = _cell_value(m.group(1), m.group(2), shared)
+                if not header:
+                    raise ValueError('Uploaded file is empty.')
+                letters = sorted(header, key=lambda col: (len(col), col))
+                letter = letters[find_id_column([header[col] for col in letters])]
+                cell_re = re.compile(rb'<c\b(?=[^>]*\br="' + letter + rb'\d+")([^>]*?)(?:/>|>(.*?)</c>)', re.S)
+                pos = end
+            for m in cell_re.finditer(chunk, pos):
+                yield _cell_value(m.group(1), m.group(2), shared)
+        if cell_re is None:
+            raise ValueError('Uploaded file is empty.')
+
+
+def _xls_rows(stream):
+    # legacy .xls is not readable by openpyxl; xlrd directly (what pandas would use underneath)
+    try:
+        import xlrd
+    except ImportError:
+        raise ValueError('Reading .xls files needs the xlrd package; upload .xlsx or .csv instead.') from None
+    book = xlrd.open_workbook(file_contents=stream.read(), on_demand=True)
+    try:
+        sheet = book.sheet_by_index(0)
+        for r in range(sheet.nrows):
+            yield [None if cell.ctype == xlrd.XL_CELL_EMPTY else cell.value for cell in sheet.row(r)]
+    finally:
+        book.release_resources()
+
+
+def iter_rows(stream, filename):
+    """Rows of the first sheet of an uploaded file, chosen by extension."""
+    ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if ext == 'csv':
+        return _csv_rows(stream)
+    if ext in ('xlsx', 'xlsm'):
+        return _xlsx_rows(stream)
+    if ext == 'xls':
+        return _xls_rows(stream)
+    raise ValueError(f'Unsupported file type: .{ext}')
+
+
+def _generic_id_values(rows):
+    header = next(rows, None)
+    if header is None:
+        raise ValueError('Uploaded file is empty.')
+    idx = find_id_column(header)
+    for row in rows:
+        yield row[idx] if idx < len(row) else None
+
+
+def iter_id_values(stream, filename):
+    """Raw values of the student ID column of an uploaded sheet."""
+    ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if ext not in ('xlsx', 'xlsm'):
+        yield from _generic_id_values(iter_rows(stream, filename))
+        return
+    try:
+        yield from _xlsx_id_values(stream)
+    except _UnsupportedSheet:
+        # nothing has been yielded yet: the header is validated first
+        stream.seek(0)
+        yield from _generic_id_values(_xlsx_rows(stream))
+
+
+def iter_student_id_batches(stream, filename, batch_size=BATCH_SIZE):
+    """Yield lists of up to batch_size student IDs from an uploaded sheet."""
+    batch = []
+    for value in iter_id_values(stream, filename):
+        sid = normalise_id(value)
+        if not sid:
+            continue
+        batch.append(sid)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def read_student_ids(stream, filename):
+    """All student IDs in an uploaded sheet, as one list."""
+    return [sid for batch in iter_student_id_batches(stream, filename) for sid in batch]
+
+
+def insert_event_attendance(conn, event_id, stream, filename, batch_size=BATCH_SIZE):
+    """Stream an uploaded sheet into event_attendance for event_id.
+
+    Runs inside the caller's transaction; returns the number of rows inserted.
+    """
+    total = 0
+    for batch in iter_student_id_batches(stream, filename, batch_size):
+        conn.executemany('INSERT INTO event_attendance (event_id, student_id) VALUES (?, ?)',
+                         [(event_id, sid) for sid in batch])
+        total += len(batch)
+    return total
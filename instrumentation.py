@@ -0,0 +1,328 @@
+"""Opt-in request and SQL instrumentation for app.py and TH2/app.py.
+
+Enable with INSTRUMENTATION=1. Every pooled connection then hands out a
+timing cursor (see db_pool.CURSOR_FACTORY), and Flask request hooks record
+per route:
+
+- wall time (cumulative histogram plus rolling p50/p95/p99 of recent requests)
+- SQL statements per request, and time / executions / rows per statement
+- N+1 patterns: one statement run N_PLUS_ONE_THRESHOLD+ times in a request
+
+alongside the connection pool counters, the live-update broker's clients and
+deliveries (see live_updates.py) and, with WRITE_BEHIND=1, the group-commit
+writer's queue depth and commit latency (see write_behind.py).
+
+Everything is served at ``/metrics`` in Prometheus text format, per process.
+With INSTRUMENTATION_PROFILE_MS set, each request runs under cProfile and
+the ones slower than that are dumped to INSTRUMENTATION_PROFILE_DIR
+(open with ``python -m pstats`` or snakeviz).
+"""
+import cProfile
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter, deque
+
+from flask import Response, request
+
+import db_pool
+import live_updates
+import write_behind
+
+ENABLED = os.environ.get('INSTRUMENTATION', '') not in ('', '0', 'false', 'no')
+PROFILE_MS = float(os.environ.get('INSTRUMENTATION_PROFILE_MS', 0))   # 0 = no profiling
+PROFILE_DIR = os.environ.get('INSTRUMENTATION_PROFILE_DIR', 'profiles')
+N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 10))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+WINDOW = 1024            # recent requests per route kept for the rolling quantiles
+MAX_STATEMENTS = 500     # distinct statement labels before the rest go under "other"
+
+_IN_LIST_RE = re.compile(r'\?(?:\s*,\s*\?)+')
+
+
+def normalise_sql(sql):
+    """Statement label: whitespace collapsed, IN (?,?,...) lists folded, long ones
+    truncated with a checksum so statements sharing a prefix stay distinct."""
+    sql = _IN_LIST_RE.sub('?, ...', ' '.join(sql.split()))
+    if len(sql) <= 160:
+        return sql
+    return f'{sql[:140]}... #{zlib.crc32(sql.encode()):08x}'
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """In-memory metric store (guarded by one lock) rendered as Prometheus text."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = Counter()           # (route, method, status) -> count
+        self.latency = {}                   # route -> Histogram (seconds)
+        self.recent = {}                    # route -> deque of recent durations
+        self.statements_per_request = {}    # route -> Histogram
+        self.sql = {}                       # statement -> [executions, seconds, rows]
+        self.n_plus_one = Counter()         # (route, statement) -> requests showing it
+        self.profiles = Counter()           # route -> dumped profiles
+
+    def statement(self, sql, seconds, rows, executions=0):
+        with self.lock:
+            entry = self.sql.get(sql)
+            if entry is None:
+                if len(self.sql) >= MAX_STATEMENTS:
+                    sql = 'other'
+                entry = self.sql.setdefault(sql, [0, 0.0, 0])
+            entry[0] += executions
+            entry[1] += seconds
+            entry[2] += rows
+
+    def request(self, route, method, status, seconds, stats):
+        with self.lock:
+            self.requests[(route, method, status)] += 1
+            self.latency.setdefault(route, Histogram(LATENCY_BUCKETS)).observe(seconds)
+            self.recent.setdefault(route, deque(maxlen=WINDOW)).append(seconds)
+            self.statements_per_request.setdefault(route, Histogram(STATEMENT_BUCKETS)).observe(stats.statements)
+            for sql, n in stats.counts.items():
+                if n >= N_PLUS_ONE_THRESHOLD:
+                    self.n_plus_one[(route, sql)] += 1
+
+    def render(self):
+        out = []
+
+        def header(name, kind, help_text):
+            out.append(f'# HELP {name} {help_text}')
+            out.append(f'# TYPE {name} {kind}')
+
+        def histogram(name, series):
+            for labels, h in series:
+                for bound, n in zip(h.buckets, h.counts):
+                    out.append(f'{name}_bucket{_labels(labels, le=_num(bound))} {n}')
+                out.append(f'{name}_bucket{_labels(labels, le="+Inf")} {h.count}')
+                out.append(f'{name}_sum{_labels(labels)} {_num(h.sum)}')
+                out.append(f'{name}_count{_labels(labels)} {h.count}')
+
+        with self.lock:
+            header('http_requests_total', 'counter', 'Requests handled, by route, method and status.')
+            for (route, method, status), n in sorted(self.requests.items()):
+                out.append(f'http_requests_total{_labels(dict(route=route, method=method, status=status))} {n}')
+
+            header('http_request_duration_seconds', 'histogram', 'Request wall time.')
+            histogram('http_request_duration_seconds',
+                      [({'route': r}, h) for r, h in sorted(self.latency.items())])
+
+            header('http_request_duration_recent_seconds', 'summary',
+                   f'Request wall time over the last {WINDOW} requests per route.')
+            for route, window in sorted(self.recent.items()):
+                values = sorted(window)
+                for q in (0.5, 0.95, 0.99):
+                    value = values[min(len(values) - 1, int(q * len(values)))]
+                    out.append(f'http_request_duration_recent_seconds{_labels(dict(route=route, quantile=q))} '
+                               f'{_num(value)}')
+                out.append(f'http_request_duration_recent_seconds_sum{_labels(dict(route=route))} '
+                           f'{_num(sum(values))}')
+                out.append(f'http_request_duration_recent_seconds_count{_labels(dict(route=route))} {len(values)}')
+
+            header('sql_statements_per_request', 'histogram', 'SQL statements executed per request.')
+            histogram('sql_statements_per_request',
+                      [({'route': r}, h) for r, h in sorted(self.statements_per_request.items())])
+
+            for name, index, help_text in (
+                    ('sql_statement_executions_total', 0, 'Executions of each SQL statement.'),
+                    ('sql_statement_seconds_total', 1, 'Time spent executing and fetching each SQL statement.'),
+                    ('sql_statement_rows_total', 2, 'Rows fetched from each SQL statement.')):
+                header(name, 'counter', help_text)
+                for sql, entry in sorted(self.sql.items()):
+                    out.append(f'{name}{_labels(dict(statement=sql))} {_num(entry[index])}')
+
+            header('sql_n_plus_one_total', 'counter',
+                   f'Requests that ran one statement {N_PLUS_ONE_THRESHOLD}+ times.')
+            for (route, sql), n in sorted(self.n_plus_one.items()):
+                out.append(f'sql_n_plus_one_total{_labels(dict(route=route, statement=sql))} {n}')
+
+            header('slow_request_profiles_total', 'counter', 'cProfile dumps written for slow requests.')
+            for route, n in sorted(self.profiles.items()):
+                out.append(f'slow_request_profiles_total{_labels(dict(route=route))} {n}')
+
+        for stats in db_pool.all_metrics():
+            for key, value in stats.items():
+                if isinstance(value, (int, float)):
+                    if key == 'size':
+                        continue
+                    name = f'db_pool_{key}'
+                    out.append(f'{name}{_labels(dict(path=os.path.basename(stats["path"])))} {_num(value)}')
+
+        for stats in write_behind.all_metrics():
+            for key, value in stats.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    out.append(f'write_behind_{key}{_labels(dict(writer=stats["name"]))} {_num(value)}')
+
+        for stats in live_updates.all_metrics():
+            for key, value in stats.items():
+                if isinstance(value, (int, float)):
+                    out.append(f'live_updates_{key}{_labels(dict(broker=stats["name"]))} {_num(value)}')
+        return '\n'.join(out) + '\n'
+
+
+def _num(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, **extra):
+    labels = dict(labels, **extra)
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + '}'
+
+
+METRICS = Metrics()
+
+
+class RequestStats:
+    __slots__ = ('start', 'statements', 'counts', 'status', 'profiler')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.statements = 0
+        self.counts = Counter()
+        self.status = 500
+        self.profiler = None
+
+
+_local = threading.local()
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor recording execution/fetch time and rows for every statement."""
+
+    _label = None
+
+    def _record(self, start, rows=0, executions=0):
+        METRICS.statement(self._label, time.perf_counter() - start, rows, executions)
+
+    def execute(self, sql, parameters=()):
+        self._label = normalise_sql(sql)
+        stats = getattr(_local, 'stats', None)
+        if stats is not None:
+            stats.statements += 1
+            stats.counts[self._label] += 1
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._record(start, executions=1)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._label = normalise_sql(sql)
+        stats = getattr(_local, 'stats', None)
+        if stats is not None:
+            stats.statements += 1
+            stats.counts[self._label] += 1
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._record(start, executions=1)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._record(start, rows=row is not None)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._record(start, rows=len(rows))
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._record(start, rows=len(rows))
+        return rows
+
+    def __next__(self):
+        start = time.perf_counter()
+        row = super().__next__()   # StopIteration ends the loop before recording
+        self._record(start, rows=1)
+        return row
+
+
+# ---------- Flask hooks ----------
+
+def _route():
+    return request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+
+
+def _before_request():
+    stats = _local.stats = RequestStats()
+    if PROFILE_MS > 0:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            return   # another thread's profile is running; skip this request
+        stats.profiler = profiler
+
+
+def _after_request(response):
+    stats = getattr(_local, 'stats', None)
+    if stats is not None:
+        stats.status = response.status_code
+    return response
+
+
+def _teardown_request(exc):
+    stats = getattr(_local, 'stats', None)
+    _local.stats = None
+    if stats is None:
+        return
+    seconds = time.perf_counter() - stats.start
+    route = _route()
+    if stats.profiler is not None:
+        stats.profiler.disable()
+        if seconds * 1000 >= PROFILE_MS:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            slug = re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'
+            stats.profiler.dump_stats(os.path.join(
+                PROFILE_DIR, f'{time.strftime("%Y%m%d-%H%M%S")}-{slug}-{seconds * 1000:.0f}ms.prof'))
+            with METRICS.lock:
+                METRICS.profiles[route] += 1
+    METRICS.request(route, request.method, stats.status, seconds, stats)
+
+
+def _metrics_view():
+    return Response(METRICS.render(), mimetype='text/plain; version=0.0.4')
+
+
+def init_app(app, enabled=None):
+    """Register the hooks and /metrics on a Flask app (no-op unless enabled)."""
+    if not (ENABLED if enabled is None else enabled):
+        return False
+    db_pool.CURSOR_FACTORY = TimedCursor
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    app.add_url_rule('/metrics', 'metrics', _metrics_view)
+    return True
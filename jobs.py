@@ -0,0 +1,229 @@
+"""Background jobs for slow work (uploads, approvals), stored in SQLite.
+
+Routes enqueue a job and return at once with its ID; dashboards poll
+``/jobs/<id>``. Jobs run on a small in-process worker pool (``JOB_WORKERS``
+threads, started on first enqueue) and/or on separate worker processes:
+
+    python jobs.py app.py                  # worker for attendance.db
+    python jobs.py TH2/app.py --threads 4  # worker for TH2/database.db
+
+Set JOB_WORKERS=0 on the web processes when running dedicated workers.
+A job that hits "database is locked" is re-queued with exponential backoff;
+any other error fails it with the message kept for the status endpoint.
+
+A running job holds a lease of LEASE_SECONDS that its worker renews every
+LEASE_SECONDS / 4 while the handler runs, so a slow upload is never picked
+up a second time; only a job whose worker stopped renewing (the process
+died) goes back to the queue. A worker that hits an error outside a job
+(the database unreachable, the disk full) logs it and backs off instead of
+exiting.
+"""
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+
+import db_pool
+
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+MAX_ATTEMPTS = 5
+RETRY_BACKOFF = 0.5      # seconds, doubled per attempt
+LEASE_SECONDS = 120      # running jobs not renewed for this long are assumed orphaned
+POLL_INTERVAL = 0.5
+ERROR_BACKOFF_MAX = 30   # seconds a worker sleeps after repeated errors outside a job
+
+log = logging.getLogger(__name__)
+
+
+class JobQueue:
+    def __init__(self, db_path, workers=JOB_WORKERS):
+        self.db_path = db_path
+        self.workers = workers
+        self.handlers = {}
+        self._threads = []
+        self._started = threading.Lock()
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+
+    @property
+    def pool(self):
+        return db_pool.get_pool(self.db_path)
+
+    def handler(self, kind):
+        """Decorator registering fn(conn, payload, data) -> result dict for a job kind."""
+        def register(fn):
+            self.handlers[kind] = fn
+            return fn
+        return register
+
+    # ---------- producer side ----------
+    def enqueue(self, kind, payload=None, data=None, owner=None):
+        if kind not in self.handlers:
+            raise ValueError(f'no handler registered for job kind {kind!r}')
+        with self.pool.transaction() as conn:
+            job_id = conn.execute(
+                'INSERT INTO jobs (kind, owner, payload, data, created_at) VALUES (?, ?, ?, ?, ?)',
+                (kind, owner, json.dumps(payload or {}), data, time.time())).lastrowid
+        self.start()
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        """Job status as a dict (None if unknown); never includes the raw upload."""
+        with self.pool.connection() as conn:
+            row = conn.execute('''
+                SELECT job_id, kind, owner, status, attempts, result, error,
+                       created_at, started_at, finished_at
+                FROM jobs WHERE job_id = ?
+            ''', (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    # ---------- worker side ----------
+    def claim(self, worker):
+        """Atomically take the next runnable job, or return None."""
+        now = time.time()
+        with self.pool.transaction() as conn:
+            # hand orphaned jobs (worker died mid-run, lease not renewed) back to the queue
+            conn.execute('''UPDATE jobs SET status = 'queued', worker = NULL
+                            WHERE status = 'running' AND COALESCE(heartbeat_at, started_at) < ?''',
+                         (now - LEASE_SECONDS,))
+            rows = conn.execute('''
+                UPDATE jobs SET status = 'running', worker = ?, started_at = ?, heartbeat_at = ?,
+                                attempts = attempts + 1
+                WHERE job_id = (SELECT job_id FROM jobs
+                                WHERE status = 'queued' AND run_after <= ?
+                                ORDER BY job_id LIMIT 1)
+                RETURNING job_id, kind, payload, data, attempts
+            ''', (worker, now, now, now)).fetchall()
+        return rows[0] if rows else None
+
+    def _renew(self, job_id, worker, done):
+        """Keep renewing the lease of a running job until done is set."""
+        while not done.wait(LEASE_SECONDS / 4):
+            try:
+                with self.pool.transaction() as conn:
+                    conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE job_id = ? AND worker = ? "
+                                 "AND status = 'running'", (time.time(), job_id, worker))
+            except Exception:
+                # a missed renewal only matters if they all fail for LEASE_SECONDS
+                log.warning('could not renew the lease of job %s', job_id, exc_info=True)
+
+    def _finish(self, job_id, status, result=None, error=None, run_after=0):
+        # finished jobs no longer need their upload; a retry keeps it
+        with self.pool.transaction() as conn:
+            conn.execute('''
+                UPDATE jobs SET status = ?, result = ?, error = ?, run_after = ?, worker = NULL,
+                                finished_at = CASE WHEN ? IN ('done', 'failed') THEN ? END,
+                                data = CASE WHEN ? IN ('done', 'failed') THEN NULL ELSE data END
+                WHERE job_id = ?
+            ''', (status, json.dumps(result) if result is not None else None, error, run_after,
+                  status, time.time(), status, job_id))
+
+    def run_one(self, worker='inline'):
+        """Run the next runnable job; returns its ID, or None if the queue is empty."""
+        job = self.claim(worker)
+        if job is None:
+            return None
+        job_id, kind = job['job_id'], job['kind']
+        done = threading.Event()
+        threading.Thread(target=self._renew, args=(job_id, worker, done),
+                         name=f'job-lease-{job_id}', daemon=True).start()
+        try:
+            handler = self.handlers[kind]
+            with self.pool.connection() as conn:
+                result = handler(conn, json.loads(job['payload']), job['data'])
+        except Exception as e:
+            if db_pool.is_locked_error(e) and job['attempts'] < MAX_ATTEMPTS:
+                delay = RETRY_BACKOFF * (2 ** (job['attempts'] - 1))
+                self._finish(job_id, 'queued', error=str(e), run_after=time.time() + delay)
+            else:
+                self._finish(job_id, 'failed', error=str(e) or e.__class__.__name__)
+        else:
+            self._finish(job_id, 'done', result=result or {})
+        finally:
+            done.set()
+        return job_id
+
+    def work(self, worker, stop=None):
+        """Loop running jobs until stop is set."""
+        stop = stop or self._stop
+        errors = 0
+        while not stop.is_set():
+            try:
+                ran = self.run_one(worker)
+            except db_pool.PoolTimeout:
+                ran = None
+            except Exception:
+                # claiming or finishing failed (locked past the retries, I/O error):
+                # keep the thread alive, back off, and try again
+                errors += 1
+                log.exception('job worker %s: error outside a job', worker)
+                stop.wait(min(POLL_INTERVAL * 2 ** errors, ERROR_BACKOFF_MAX))
+                continue
+            errors = 0
+            if ran is None:
+                self._wakeup.wait(POLL_INTERVAL)
+                self._wakeup.clear()
+
+    def start(self):
+        """Start the in-process worker threads (once per process)."""
+        if self.workers <= 0 or self._threads:
+            return
+        with self._started:
+            if self._threads:
+                return
+            base = f'{socket.gethostname()}:{os.getpid()}'
+            for i in range(self.workers):
+                t = threading.Thread(target=self.work, args=(f'{base}:{i}',),
+                                     name=f'job-worker-{i}', daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+
+def _load_app_module(path):
+    path = os.path.abspath(path)
+    sys.path.insert(0, os.path.dirname(path))
+    spec = importlib.util.spec_from_file_location('attendance_app', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run background job workers for an attendance app.')
+    parser.add_argument('app', help='path to the Flask app module (app.py or TH2/app.py)')
+    parser.add_argument('--threads', type=int, default=2, help='worker threads in this process')
+    args = parser.parse_args(argv)
+
+    # the app module registers its handlers on import; keep it from starting its own threads
+    os.environ['JOB_WORKERS'] = '0'
+    queue = _load_app_module(args.app).job_queue
+    base = f'{socket.gethostname()}:{os.getpid()}'
+    threads = [threading.Thread(target=queue.work, args=(f'{base}:cli{i}',), daemon=True)
+               for i in range(args.threads)]
+    for t in threads:
+        t.start()
+    print(f'{len(threads)} job workers on {queue.db_path} (Ctrl+C to stop)')
+    try:
+        while any(t.is_alive() for t in threads):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        queue.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
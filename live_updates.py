@@ -0,0 +1,290 @@
+"""Server-sent events for live dashboards: an in-process change broker.
+
+Students and club leads used to refresh their dashboards to see whether
+anything changed. Instead, after a write commits, the apps publish the
+changes to a ``Broker``:
+
+- ``attendance`` on ``student:<id>``: {student_id, date, period, status, ...}
+- ``event`` (app.py) / ``approval`` (TH2) on ``club:<id>``: {id, status}
+
+and the dashboards keep one EventSource open (``/student/events``,
+``/club/events``; ``/student_events``, ``/club_events`` in TH2) that gets
+only those deltas.
+
+Each client has a buffer of LIVE_BUFFER events. A client that falls that far
+behind loses its backlog and gets a single ``resync`` event (reload the
+page) instead, so a stalled connection never holds more than that or slows
+the writers: ``publish()`` only appends to deques.
+
+The broker is per process. With several worker processes a change published
+in one does not reach clients connected to another, so every heartbeat also
+runs the stream's probe (one indexed query: the student's data version, the
+club's event summary) and sends ``resync`` when it moved without an event.
+Pages are rendered with the same token (``?since=``), so anything written
+between the render and the connection is caught when the stream opens.
+
+Under WSGI (``python app.py``, gunicorn) an open stream holds a worker
+thread for as long as the tab is open, so a process keeps at most
+LIVE_WSGI_STREAMS of them (default 0: streams are served by asgi.py, where
+each is a coroutine). Past that the stream routes answer 204, which stops
+the EventSource, and the page polls the same URL with ``?poll=1`` instead:
+one probe per LIVE_HEARTBEAT, answered with the current token.
+"""
+import json
+import os
+import threading
+from collections import deque
+
+import targets
+
+BUFFER = int(os.environ.get('LIVE_BUFFER', 100))             # events queued per client
+MAX_CLIENTS = int(os.environ.get('LIVE_MAX_CLIENTS', 1000))  # open streams per process
+WSGI_STREAMS = int(os.environ.get('LIVE_WSGI_STREAMS', 0))   # of those, holding a WSGI thread each
+HEARTBEAT = float(os.environ.get('LIVE_HEARTBEAT', 15))      # seconds between keep-alives / probes
+RETRY_MS = 3000  # EventSource reconnect delay
+
+HEADERS = {'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+
+class TooManyClients(Exception):
+    """MAX_CLIENTS streams are already open in this process (answer 503; the page polls)."""
+
+
+class NoStreamThread(Exception):
+    """WSGI_STREAMS threads already hold a stream in this process (answer 204; the page polls)."""
+
+
+def format_event(kind, data):
+    return f'event: {kind}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
+
+
+RESYNC = 'event: resync\ndata: {}\n\n'
+
+
+class Subscription:
+    """One client's bounded queue of pending events."""
+
+    def __init__(self, broker, topics, size, threaded=False):
+        self.broker = broker
+        self.topics = topics
+        self.size = size
+        self.threaded = threaded
+        self.overflowed = False
+        self._events = deque()
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._loop = None        # set by the async stream
+        self._async_ready = None
+
+    def push(self, chunk):
+        """Queue one event; False when the client is (now) marked for a resync."""
+        with self._lock:
+            if self.overflowed:
+                return False
+            queued = len(self._events) < self.size
+            if queued:
+                self._events.append(chunk)
+            else:
+                # the backlog is useless now: the client reloads instead
+                self._events.clear()
+                self.overflowed = True
+        self._ready.set()
+        if self._loop is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._async_ready.set)
+            except RuntimeError:
+                pass  # loop closed: the server is shutting down
+        return queued
+
+    def drain(self):
+        """Text of the pending events (a resync after an overflow)."""
+        with self._lock:
+            self._ready.clear()
+            if self._async_ready is not None:
+                self._async_ready.clear()
+            if self.overflowed:
+                self.overflowed = False
+                return RESYNC
+            chunks, self._events = self._events, deque()
+        return ''.join(chunks)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class Broker:
+    def __init__(self, name, buffer=BUFFER, max_clients=MAX_CLIENTS, wsgi_streams=WSGI_STREAMS):
+        self.name = name
+        self.buffer = buffer
+        self.max_clients = max_clients
+        self.wsgi_streams = wsgi_streams
+        self._topics = {}   # topic -> set of Subscription
+        self._clients = 0
+        self._threaded = 0
+        self._lock = threading.Lock()
+        self._stats = {'published': 0, 'delivered': 0, 'overflows': 0, 'rejected': 0, 'polling': 0}
+        _brokers.add(self)
+
+    def subscribe(self, *topics, threaded=False):
+        """Subscription to topics; threaded when its stream will hold a WSGI worker thread."""
+        sub = Subscription(self, topics, self.buffer, threaded)
+        with self._lock:
+            if threaded and self._threaded >= self.wsgi_streams:
+                self._stats['polling'] += 1
+                raise NoStreamThread(f'{self.name}: {self._threaded} WSGI threads hold live streams')
+            if self._clients >= self.max_clients:
+                self._stats['rejected'] += 1
+                raise TooManyClients(f'{self.name}: {self._clients} live streams open')
+            self._clients += 1
+            self._threaded += threaded
+            for topic in topics:
+                self._topics.setdefault(topic, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            removed = False
+            for topic in sub.topics:
+                subs = self._topics.get(topic)
+                if subs and sub in subs:
+                    subs.discard(sub)
+                    removed = True
+                    if not subs:
+                        del self._topics[topic]
+            if removed:
+                self._clients -= 1
+                self._threaded -= sub.threaded
+
+    def publish(self, topic, kind, data):
+        self.publish_many([(topic, kind, data)])
+
+    def publish_many(self, items):
+        """Queue (topic, kind, data) events for their subscribers; call after the commit."""
+        delivered = overflows = published = 0
+        with self._lock:
+            for topic, kind, data in items:
+                published += 1
+                subs = self._topics.get(topic)
+                if not subs:
+                    continue
+                chunk = format_event(kind, data)
+                for sub in list(subs):
+                    if sub.push(chunk):
+                        delivered += 1
+                    else:
+                        overflows += 1
+            self._stats['published'] += published
+            self._stats['delivered'] += delivered
+            self._stats['overflows'] += overflows
+
+    def metrics(self):
+        with self._lock:
+            return dict(self._stats, name=self.name, clients=self._clients, wsgi_clients=self._threaded,
+                        topics=len(self._topics))
+
+
+def attendance_events(changes):
+    """Broker items for attendance changes ({'student_id', 'date', 'period', 'status', ...} dicts)."""
+    return [(f"student:{c['student_id']}", 'attendance', c) for c in changes]
+
+
+# ---------- streams ----------
+
+class EventStream:
+    """Response body of one SSE connection: deltas as they arrive, a keep-alive
+    (and a probe) every heartbeat.
+
+    probe() returns the change token of the client's data (token() below);
+    since is the token the page was rendered with, so changes between the
+    render and the connection, or during a reconnect, end in a resync too.
+    close() ends the subscription; WSGI servers call it when the client has
+    gone, which they notice at the next write.
+    """
+
+    def __init__(self, sub, probe=None, since=None, heartbeat=HEARTBEAT):
+        self.sub = sub
+        self.probe = probe
+        self.since = since
+        self.heartbeat = heartbeat
+        self._last = None
+        self._sent = False
+
+    def _opening(self, current):
+        self._last = current
+        stale = self.since is not None and current is not None and current != self.since
+        return f'retry: {RETRY_MS}\n\n' + (RESYNC if stale else '')
+
+    def _deltas(self):
+        chunk = self.sub.drain()
+        self._sent = self._sent or bool(chunk)
+        return chunk
+
+    def _check(self, current):
+        # the data moved with no event sent: written by another process
+        moved = current != self._last and not self._sent
+        self._last, self._sent = current, False
+        return RESYNC if moved else ': ping\n\n'
+
+    def __iter__(self):
+        yield self._opening(self.probe() if self.probe else None)
+        while True:
+            if self.sub._ready.wait(self.heartbeat):
+                chunk = self._deltas()
+                if chunk:
+                    yield chunk
+            else:
+                yield self._check(self.probe() if self.probe else None)
+
+    def close(self):
+        self.sub.close()
+
+
+class AsyncEventStream(EventStream):
+    """EventStream for asgi.py: probe is a coroutine function, iterate with ``async for``."""
+
+    async def __aiter__(self):
+        import asyncio
+        sub = self.sub
+        sub._async_ready = asyncio.Event()
+        sub._loop = asyncio.get_running_loop()
+        if sub._ready.is_set():
+            sub._async_ready.set()
+        yield self._opening(await self.probe() if self.probe else None)
+        while True:
+            try:
+                await asyncio.wait_for(sub._async_ready.wait(), self.heartbeat)
+            except asyncio.TimeoutError:
+                yield self._check(await self.probe() if self.probe else None)
+                continue
+            chunk = self._deltas()
+            if chunk:
+                yield chunk
+
+
+# Per database: the query whose result changes with a student's / a club's dashboard data
+TARGETS = {
+    'root': {
+        'student': 'SELECT version FROM student_versions WHERE student_id = ?',
+        'club': """SELECT COUNT(*), MAX(event_id), SUM(status = 'approved'), SUM(status = 'rejected')
+                   FROM club_events WHERE club_id = ?""",
+    },
+    'th2': {
+        'student': 'SELECT version FROM student_versions WHERE student_id = ?',
+        'club': """SELECT COUNT(*), MAX(id), SUM(status = 'approved'), SUM(status = 'revoked')
+                   FROM vc_approvals WHERE club_id = ?""",
+    },
+}
+
+
+def token(conn, target, kind, key):
+    """Change token ('student' or 'club' data of key) for EventStream probes and page renders."""
+    row = conn.execute(TARGETS[target][kind], (key,)).fetchone()
+    return ','.join('' if v is None else str(v) for v in row) if row else ''
+
+
+# ---------- per-process registry (for /metrics) ----------
+_brokers = targets.Registry()
+
+
+def all_metrics():
+    return _brokers.metrics()
@@ -0,0 +1,546 @@
+"""Versioned schema migrations for attendance.db (app.py) and TH2/database.db.
+
+The schema version lives in SQLite's ``PRAGMA user_version``. Each migration
+runs in its own BEGIN IMMEDIATE transaction together with the version bump,
+so an existing database is upgraded in place and a crash mid-way leaves it at
+the last fully applied version.
+
+Usage:
+    python migrations.py                      # upgrade attendance.db
+    python migrations.py th2                  # upgrade TH2/database.db
+    python migrations.py --check-plans        # fail if a route query scans a table
+"""
+import sqlite3
+import sys
+
+import analytics_export
+import attendance_api
+import attendance_stats
+import attendance_summary
+import attendance_writer
+import auth
+import live_updates
+import page_cache
+import portals
+import rosters
+import student_history
+import targets
+import timetable
+
+# ========================
+#  shared
+# ========================
+
+# Background job table (jobs.py), identical in both databases
+JOBS_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS jobs (
+        job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        owner TEXT,
+        payload TEXT NOT NULL DEFAULT '{}',
+        data BLOB,
+        status TEXT NOT NULL DEFAULT 'queued',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        run_after REAL NOT NULL DEFAULT 0,
+        result TEXT,
+        error TEXT,
+        worker TEXT,
+        created_at REAL NOT NULL,
+        started_at REAL,
+        finished_at REAL
+    )""",
+    """CREATE INDEX IF NOT EXISTS ix_jobs_status_run_after ON jobs (status, run_after)""",
+]
+
+# Job leases renewed while a handler runs; failed jobs drop their upload like done ones
+JOBS_LEASE = [
+    'ALTER TABLE jobs ADD COLUMN heartbeat_at REAL',
+    "UPDATE jobs SET data = NULL WHERE status = 'failed'",
+]
+
+# TH2: the club an event-marked record is credited to, rather than the club
+# leader in marked_by (a leader can change; the club cannot)
+TH2_ATTENDANCE_CLUB = [
+    'ALTER TABLE attendance ADD COLUMN club_id INTEGER',
+    '''UPDATE attendance SET club_id = (SELECT id FROM clubs WHERE leader_username = attendance.marked_by)
+       WHERE event_name IS NOT NULL''',
+]
+
+# Columns a write to attendance can change (all but the rowid)
+ATTENDANCE_COLUMNS = {
+    'root': ('student_id', 'teacher_id', 'date', 'period', 'status', 'marked_by_club', 'club_event_id'),
+    'th2': ('student_id', 'subject_code', 'date', 'period', 'status', 'marked_by', 'event_name', 'club_id'),
+}
+
+
+def attendance_trigger_sql(target):
+    """{derived table: {event: statements}} kept current by the attendance triggers."""
+    return {
+        'student_attendance_summary': attendance_summary.trigger_sql(attendance_summary.SUBJECT_COLUMNS[target]),
+        'attendance_stats': attendance_stats.trigger_sql(target),
+        'student_versions': page_cache.trigger_sql(target),
+        'export_partitions': analytics_export.trigger_sql(target),
+    }
+
+
+def attendance_triggers(target, tables=None):
+    """The triggers on attendance updating every derived table (or those in tables) for a written row.
+
+    One trigger program per written row instead of one per derived table.
+    An update keeping the columns the derived rows are keyed on (a status
+    change) adjusts those rows in place; one moving a row to other keys is
+    a delete and an insert. Updates leaving every column as it was (a
+    register submitted again unchanged) fire neither.
+    """
+    parts = [sql for name, sql in attendance_trigger_sql(target).items() if tables is None or name in tables]
+    keys = sorted({column for part in parts for column in part['keys']})
+    moved = ' OR '.join(f'OLD.{c} IS NOT NEW.{c}' for c in keys)
+    changed = ' OR '.join(f'OLD.{c} IS NOT NEW.{c}' for c in ATTENDANCE_COLUMNS[target] if c not in keys)
+
+    def statements(*events):
+        return [sql for event in events for part in parts for sql in part[event]]
+
+    return [
+        targets.trigger('trg_attendance_insert', 'AFTER INSERT', 'attendance', statements('insert')),
+        targets.trigger('trg_attendance_delete', 'AFTER DELETE', 'attendance', statements('delete')),
+        targets.trigger('trg_attendance_update', 'AFTER UPDATE', 'attendance', statements('update'),
+                        when=f'NOT ({moved}) AND ({changed})'),
+        targets.trigger('trg_attendance_move', 'AFTER UPDATE', 'attendance', statements('delete', 'insert'),
+                        when=moved),
+    ]
+
+
+# The per-table attendance triggers attendance_triggers() replaced
+SEPARATE_ATTENDANCE_TRIGGERS = [f'DROP TRIGGER IF EXISTS trg_{name}_{event}'
+                                for name in ('attendance_summary', 'attendance_stats',
+                                             'student_versions_attendance', 'export_attendance')
+                                for event in ('insert', 'update', 'delete')]
+
+
+def attendance_triggers_step(target):
+    """Migration replacing the per-table attendance triggers with attendance_triggers().
+
+    The summary loses its overall rows and the stats their all-days rows
+    (both are summed when read now), so the stats table is rebuilt keyed
+    on (club, day).
+    """
+    return (SEPARATE_ATTENDANCE_TRIGGERS
+            + [f"DELETE FROM student_attendance_summary WHERE subject = '{attendance_summary.OVERALL}'",
+               'DROP TABLE attendance_stats']
+            + attendance_stats.schema(target) + attendance_stats.rebuild_sql(target)
+            + attendance_triggers(target))
+
+# ========================
+#  app.py / database.py
+# ========================
+
+ROOT_MIGRATIONS = [
+    (1, 'baseline schema', [
+        """CREATE TABLE IF NOT EXISTS students (
+            student_id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            section TEXT NOT NULL,
+            year INTEGER NOT NULL,
+            password TEXT NOT NULL
+        )""",
+        """CREATE TABLE IF NOT EXISTS teachers (
+            teacher_id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            subject TEXT NOT NULL,
+            password TEXT NOT NULL
+        )""",
+        """CREATE TABLE IF NOT EXISTS clubs (
+            club_id TEXT PRIMARY KEY,
+            club_name TEXT NOT NULL,
+            password TEXT NOT NULL,
+            is_registered INTEGER DEFAULT 1
+        )""",
+        """CREATE TABLE IF NOT EXISTS vc (
+            vc_id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            password TEXT NOT NULL
+        )""",
+        """CREATE TABLE IF NOT EXISTS attendance (
+            attendance_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id TEXT NOT NULL,
+            teacher_id TEXT NOT NULL,
+            date TEXT NOT NULL,
+            period INTEGER NOT NULL,
+            status TEXT NOT NULL,
+            marked_by_club INTEGER DEFAULT 0,
+            club_event_id INTEGER,
+            FOREIGN KEY (student_id) REFERENCES students(student_id),
+            FOREIGN KEY (teacher_id) REFERENCES teachers(teacher_id)
+        )""",
+        """CREATE TABLE IF NOT EXISTS club_events (
+            event_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            club_id TEXT NOT NULL,
+            event_name TEXT NOT NULL,
+            event_date TEXT NOT NULL,
+            period INTEGER NOT NULL,
+            status TEXT DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (club_id) REFERENCES clubs(club_id)
+        )""",
+        """CREATE TABLE IF NOT EXISTS event_attendance (
+            event_attendance_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            event_id INTEGER NOT NULL,
+            student_id TEXT NOT NULL,
+            FOREIGN KEY (event_id) REFERENCES club_events(event_id),
+            FOREIGN KEY (student_id) REFERENCES students(student_id)
+        )""",
+        """CREATE TABLE IF NOT EXISTS portal_access (
+            portal_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            club_id TEXT NOT NULL,
+            opened_by TEXT NOT NULL,
+            opened_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            duration_hours INTEGER NOT NULL,
+            is_active INTEGER DEFAULT 1,
+            FOREIGN KEY (club_id) REFERENCES clubs(club_id),
+            FOREIGN KEY (opened_by) REFERENCES vc(vc_id)
+        )""",
+    ]),
+    (2, 'attendance indexes and one record per student/date/period', [
+        # keep the most recent record where older databases hold duplicates
+        """DELETE FROM attendance WHERE attendance_id NOT IN (
+            SELECT MAX(attendance_id) FROM attendance GROUP BY student_id, date, period
+        )""",
+        # student_dashboard (student_id = ? ORDER BY date, period) and approve_event probes
+        """CREATE UNIQUE INDEX IF NOT EXISTS ux_attendance_student_date_period
+           ON attendance (student_id, date, period)""",
+        # teacher_dashboard (teacher_id, date) and mark_attendance delete (teacher_id, date, period)
+        """CREATE INDEX IF NOT EXISTS ix_attendance_teacher_date_period
+           ON attendance (teacher_id, date, period)""",
+        # approve_event reads only student_id for an event: covering index
+        """CREATE INDEX IF NOT EXISTS ix_event_attendance_event_student
+           ON event_attendance (event_id, student_id)""",
+        """CREATE INDEX IF NOT EXISTS ix_club_events_club_date
+           ON club_events (club_id, event_date)""",
+        """CREATE INDEX IF NOT EXISTS ix_club_events_status_date
+           ON club_events (status, event_date)""",
+        """CREATE INDEX IF NOT EXISTS ix_portal_access_club_active
+           ON portal_access (club_id, is_active)""",
+    ]),
+    (3, 'section rosters', [
+        # section-scoped rosters for mark_attendance / teacher_dashboard
+        """CREATE INDEX IF NOT EXISTS ix_students_section_name
+           ON students (section, name)""",
+    ]),
+    (4, 'background jobs', JOBS_SCHEMA),
+    (5, 'per-student attendance summary',
+     attendance_summary.schema('teacher_id') + attendance_summary.rebuild_sql('teacher_id')),
+    (6, 'attendance counters for the VC dashboard',
+     attendance_stats.schema('root') + attendance_stats.rebuild_sql('root')),
+    (7, 'principals view for login (auth.py)', [
+        # every arm is a primary-key lookup on its account table
+        """CREATE VIEW IF NOT EXISTS principals AS
+           SELECT 'student' AS role, student_id AS login, password, name FROM students
+           UNION ALL SELECT 'teacher', teacher_id, password, name FROM teachers
+           UNION ALL SELECT 'club', club_id, password, club_name FROM clubs
+           UNION ALL SELECT 'vc', vc_id, password, name FROM vc""",
+        # password rehash on login
+        """CREATE TRIGGER IF NOT EXISTS trg_principals_password
+           INSTEAD OF UPDATE OF password ON principals
+           BEGIN
+               UPDATE students SET password = NEW.password WHERE OLD.role = 'student' AND student_id = OLD.login;
+               UPDATE teachers SET password = NEW.password WHERE OLD.role = 'teacher' AND teacher_id = OLD.login;
+               UPDATE clubs SET password = NEW.password WHERE OLD.role = 'club' AND club_id = OLD.login;
+               UPDATE vc SET password = NEW.password WHERE OLD.role = 'vc' AND vc_id = OLD.login;
+           END""",
+    ]),
+    (8, 'teaching assignments and section roster versions',
+     rosters.schema('root') + rosters.rebuild_sql('root')),
+    (9, 'per-student data versions for dashboard ETags', page_cache.schema('root')),
+    (10, 'portal expiry times and next-expiry index', portals.schema('root')),
+    (11, 'changed-day tracking for analytics exports',
+     analytics_export.schema('root') + analytics_export.rebuild_sql('root')),
+    (12, 'class timetable and its version row', timetable.schema('root')),
+    (13, 'idempotency keys for the batch attendance API', attendance_api.SCHEMA),
+    (14, 'job lease renewal', JOBS_LEASE),
+    (15, 'one set of triggers for the tables derived from attendance',
+     attendance_triggers_step('root')),
+]
+
+# Route queries whose plans must be index lookups, with representative parameters.
+# Statements owned by a module are taken from it, so the check follows the code.
+ROOT_ROUTE_QUERIES = {
+    'login': (auth.LOOKUP_ROLE_SQL, ('2021001', 'student')),
+    'login.password': (auth.PASSWORD_SQL, ('2021001', 'student')),
+    'teacher_dashboard.assigned': (rosters.assigned_sql('root'), ('T001',)),
+    'teacher_dashboard.versions': (rosters.VERSIONS_SQL.format('?,?'), ('A', 'B')),
+    'teacher_dashboard.roster': (rosters.roster_sql('root').format('?,?'), ('A', 'B')),
+    'student_dashboard': (student_history.page_sql(date_from=True), ('2021001', '2024-01-01', 200)),
+    'student_attendance_api': (student_history.page_sql(before=True, date_from=True, date_to=True),
+                               ('2021001', '2024-01-01', 3, '2023-01-01', '2024-12-31', 51)),
+    'student_dashboard.totals': (attendance_summary.TOTALS_SQL, ('2021001', attendance_summary.OVERALL)),
+    'student_dashboard.version': ('SELECT version FROM student_versions WHERE student_id = ?', ('2021001',)),
+    'teacher_dashboard': ("""
+        SELECT a.*, s.name, s.section
+        FROM attendance a
+        JOIN students s ON a.student_id = s.student_id
+        WHERE a.teacher_id = ? AND a.date = ?""", ('T001', '2024-01-01')),
+    'mark_attendance.roster': (attendance_writer.CLASS_ROSTER_SECTIONS.format('?'), ('A',)),
+    # only for submissions without a section filter
+    'mark_attendance.clear': (attendance_writer.CLEAR_CLASS_SLOT, ('T001', '2024-01-01', 1)),
+    'mark_attendance.upsert': (attendance_writer.UPSERT_CLASS, ('2021001', 'T001', '2024-01-01', 1, 'P')),
+    'approve_event.counts': (attendance_writer.EVENT_MERGE_COUNTS, ('2024-01-01', 1, 1)),
+    'approve_event.merge': (attendance_writer.EVENT_MERGE, ('T001', '2024-01-01', 1, 1, 1)),
+    'approve_event.attendees': (attendance_writer.EVENT_ATTENDEES, (1,)),
+    'club_dashboard.events': ("""
+        SELECT * FROM club_events
+        WHERE club_id = ?
+        ORDER BY event_date DESC""", ('CLUB001',)),
+    'club_dashboard.portal': ("""
+        SELECT * FROM portal_access
+        WHERE club_id = ? AND is_active = 1 AND expires_at > ?""", ('CLUB001', 1700000000.0)),
+    'portal_expiry.next': (portals.next_expiry_sql('root'), ()),
+    'timetable.version': ('SELECT version FROM timetable_versions WHERE id = 1', ()),
+    'attendance_batch.replay': (attendance_api.REPLAY_SQL, ('T001', 'batch-1')),
+    'attendance_batch.expire': (attendance_api.EXPIRE_SQL, (1700000000.0,)),
+    'live.student': (live_updates.TARGETS['root']['student'], ('2021001',)),
+    'live.club': (live_updates.TARGETS['root']['club'], ('CLUB001',)),
+    'vc_dashboard.pending': ("""
+        SELECT ce.*, c.club_name
+        FROM club_events ce
+        JOIN clubs c ON ce.club_id = c.club_id
+        WHERE ce.status = 'pending'
+        ORDER BY ce.event_date DESC""", ()),
+    'vc_stats.totals': (attendance_stats.TOTALS_SQL, (attendance_stats.ALL, attendance_stats.ALL)),
+    'vc_stats.days': (attendance_stats.DAYS_SQL, (attendance_stats.ALL, '2024-01-01')),
+    'vc_stats.clubs': (attendance_stats.CLUBS_SQL, (attendance_stats.ALL,)),
+}
+
+# ========================
+#  TH2/app.py
+# ========================
+
+TH2_MIGRATIONS = [
+    (1, 'baseline schema', [
+        '''CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY,
+            username TEXT UNIQUE,
+            password TEXT,
+            role TEXT,
+            name TEXT,
+            student_id TEXT,
+            section TEXT,
+            year INTEGER
+        )''',
+        '''CREATE TABLE IF NOT EXISTS clubs (
+            id INTEGER PRIMARY KEY,
+            club_name TEXT UNIQUE,
+            leader_username TEXT,
+            status TEXT DEFAULT 'pending'
+        )''',
+        '''CREATE TABLE IF NOT EXISTS vc_approvals (
+            id INTEGER PRIMARY KEY,
+            club_id INTEGER,
+            event_name TEXT,
+            start_time TEXT,
+            end_time TEXT,
+            status TEXT DEFAULT 'pending',
+            FOREIGN KEY(club_id) REFERENCES clubs(id)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS subjects (
+            id INTEGER PRIMARY KEY,
+            subject_code TEXT,
+            subject_name TEXT,
+            teacher_username TEXT
+        )''',
+        '''CREATE TABLE IF NOT EXISTS attendance (
+            id INTEGER PRIMARY KEY,
+            student_id TEXT,
+            subject_code TEXT,
+            date TEXT,
+            period TEXT,
+            status TEXT,
+            marked_by TEXT,
+            event_name TEXT
+        )''',
+    ]),
+    (2, 'attendance indexes and one record per student/subject/date/period', [
+        '''DELETE FROM attendance WHERE id NOT IN (
+            SELECT MAX(id) FROM attendance GROUP BY student_id, subject_code, date, period
+        )''',
+        '''CREATE UNIQUE INDEX IF NOT EXISTS ux_attendance_student_subject_date_period
+           ON attendance (student_id, subject_code, date, period)''',
+        # student_dashboard today's rows and club_portal N.M. lookups
+        '''CREATE INDEX IF NOT EXISTS ix_attendance_student_date
+           ON attendance (student_id, date, status)''',
+        # student_dashboard percentage counts: covering
+        '''CREATE INDEX IF NOT EXISTS ix_attendance_student_status
+           ON attendance (student_id, status)''',
+        '''CREATE INDEX IF NOT EXISTS ix_users_student_id ON users (student_id)''',
+        '''CREATE INDEX IF NOT EXISTS ix_users_role_section_name ON users (role, section, name)''',
+        '''CREATE INDEX IF NOT EXISTS ix_subjects_teacher ON subjects (teacher_username)''',
+        '''CREATE INDEX IF NOT EXISTS ix_subjects_code ON subjects (subject_code)''',
+        '''CREATE INDEX IF NOT EXISTS ix_clubs_leader ON clubs (leader_username)''',
+        '''CREATE INDEX IF NOT EXISTS ix_vc_approvals_club_status
+           ON vc_approvals (club_id, status, start_time, end_time)''',
+    ]),
+    (3, 'background jobs', JOBS_SCHEMA),
+    (4, 'per-student attendance summary',
+     attendance_summary.schema('subject_code') + attendance_summary.rebuild_sql('subject_code')),
+    # counted from step 14 on, once attendance has the club_id they are keyed on
+    (5, 'attendance counters for the VC portal', attendance_stats.schema('th2')),
+    (6, 'principals view for login (auth.py)', [
+        '''CREATE VIEW IF NOT EXISTS principals AS
+           SELECT role, username AS login, password, name, student_id FROM users''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_principals_password
+           INSTEAD OF UPDATE OF password ON principals
+           BEGIN
+               UPDATE users SET password = NEW.password WHERE username = OLD.login;
+           END''',
+    ]),
+    (7, 'teaching assignments and section roster versions',
+     rosters.schema('th2') + rosters.rebuild_sql('th2')),
+    (8, 'per-student data versions for dashboard ETags', page_cache.schema('th2')),
+    (9, 'approval window expiry times and next-expiry index', portals.schema('th2')),
+    (10, 'changed-day tracking for analytics exports',
+     analytics_export.schema('th2') + analytics_export.rebuild_sql('th2')),
+    (11, 'class timetable and its version row', timetable.schema('th2')),
+    (12, 'idempotency keys for the batch attendance API', attendance_api.SCHEMA),
+    (13, 'job lease renewal', JOBS_LEASE),
+    (14, 'club of event-marked records; one set of triggers for the tables derived from attendance',
+     TH2_ATTENDANCE_CLUB + attendance_triggers_step('th2')),
+]
+
+TH2_ROUTE_QUERIES = {
+    'login': (auth.LOOKUP_SQL, ('student1',)),
+    'login.password': (auth.PASSWORD_SQL, ('student1', 'student')),
+    'student_dashboard.student': ('SELECT * FROM users WHERE student_id=?', ('25030175',)),
+    'student_dashboard.today': (student_history.TODAY_SQL, ('25030175', '2024-01-01')),
+    'student_dashboard.totals': (attendance_summary.TOTALS_SQL, ('25030175', attendance_summary.OVERALL)),
+    'student_dashboard.version': ('SELECT version FROM student_versions WHERE student_id = ?', ('25030175',)),
+    'teacher_portal.subjects': ('SELECT * FROM subjects WHERE teacher_username=?', ('teacher1',)),
+    'teacher_portal.assigned': (rosters.assigned_sql('th2'), ('teacher1',)),
+    'teacher_portal.versions': (rosters.VERSIONS_SQL.format('?,?'), ('Section-J', 'Section-K')),
+    'teacher_portal.roster': (rosters.roster_sql('th2').format('?,?'), ('Section-J', 'Section-K')),
+    'mark_attendance.students': (attendance_writer.SUBJECT_ROSTER.format(''), ()),
+    'mark_attendance.roster': (attendance_writer.SUBJECT_ROSTER.format(' AND section IN (?)'), ('Section-J',)),
+    'mark_attendance.upsert': (attendance_writer.UPSERT_SUBJECT,
+                               ('25030175', 'SE31164', '2024-01-01', '1', 'P', 'teacher1')),
+    'club_portal.club': ('SELECT * FROM clubs WHERE leader_username=?', ('club1',)),
+    'club_portal.active': ('''SELECT * FROM vc_approvals WHERE club_id=? AND status='approved'
+                 AND starts_at <= ? AND expires_at > ?''', (1, 1700000000.0, 1700000000.0)),
+    'club_portal.upload': ('SELECT * FROM vc_approvals WHERE id=? AND status="approved" AND starts_at<=? AND expires_at>?',
+                           (1, 1700000000.0, 1700000000.0)),
+    'portal_expiry.next': (portals.next_expiry_sql('th2'), ()),
+    'timetable.version': ('SELECT version FROM timetable_versions WHERE id = 1', ()),
+    'attendance_batch.replay': (attendance_api.REPLAY_SQL, ('teacher1', 'batch-1')),
+    'attendance_batch.expire': (attendance_api.EXPIRE_SQL, (1700000000.0,)),
+    'live.student': (live_updates.TARGETS['th2']['student'], ('25030175',)),
+    'live.club': (live_updates.TARGETS['th2']['club'], (1,)),
+    # the uploaded IDs are a temp table: scanning it is the point
+    'club_upload.counts': (attendance_writer.EVENT_PRESENT_COUNTS, ('2024-01-01',)),
+    'club_upload.pending': (attendance_writer.EVENT_PRESENT_PENDING, ('2024-01-01',)),
+    'club_upload.mark': (attendance_writer.EVENT_PRESENT, ('club1', 'Hackathon', 1, '2024-01-01')),
+    'vc_stats.totals': (attendance_stats.TOTALS_SQL, (attendance_stats.ALL, attendance_stats.ALL)),
+    'vc_stats.days': (attendance_stats.DAYS_SQL, (attendance_stats.ALL, '2024-01-01')),
+    'vc_stats.clubs': (attendance_stats.CLUBS_SQL, (attendance_stats.ALL,)),
+}
+
+TARGETS = {
+    'root': (targets.DB_PATHS['root'], ROOT_MIGRATIONS, ROOT_ROUTE_QUERIES),
+    'th2': (targets.DB_PATHS['th2'], TH2_MIGRATIONS, TH2_ROUTE_QUERIES),
+}
+
+
+# ========================
+#  RUNNER
+# ========================
+
+def current_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def latest_version(migrations):
+    return migrations[-1][0] if migrations else 0
+
+
+def migrate(conn, migrations):
+    """Apply every migration newer than the database's user_version.
+
+    Returns the list of versions applied (empty when already up to date).
+    """
+    if conn.in_transaction:
+        conn.commit()
+    if current_version(conn) >= latest_version(migrations):
+        return []
+    applied = []
+    for version, description, statements in migrations:
+        if current_version(conn) >= version:
+            continue
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # another process may have migrated while we waited for the lock
+            if current_version(conn) >= version:
+                conn.rollback()
+                continue
+            for sql in statements:
+                conn.execute(sql)
+            conn.execute(f'PRAGMA user_version = {int(version)}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+    return applied
+
+
+def upgrade(path, migrations):
+    """Open the database at path and bring it to the latest schema version."""
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        return migrate(conn, migrations)
+    finally:
+        conn.close()
+
+
+def full_scans(conn, queries):
+    """Return {query name: [plan lines]} for queries that scan a table without an index.
+
+    The writers' temp tables are created first; scanning one of those (the
+    request's own input) or a subquery's result is not counted.
+    """
+    for sql in attendance_writer.TEMP_TABLES:
+        conn.execute(sql)
+    temp = {r[0] for r in conn.execute("SELECT name FROM temp.sqlite_master WHERE type = 'table'")}
+    bad = {}
+    for name, (sql, params) in queries.items():
+        plan = [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params)]
+        scans = [line for line in plan if line.startswith('SCAN') and 'USING' not in line
+                 and not line.startswith('SCAN (') and line.split()[1].removeprefix('temp.') not in temp]
+        if scans:
+            bad[name] = scans
+    return bad
+
+
+def main(argv=None):
+    parser = targets.argument_parser('Upgrade an attendance database schema in place.')
+    parser.add_argument('--check-plans', action='store_true',
+                        help='exit non-zero if any route query falls back to a full table scan')
+    args = parser.parse_args(argv)
+
+    default_path, migrations, queries = TARGETS[args.target]
+    path = args.db or default_path
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        before = current_version(conn)
+        applied = migrate(conn, migrations)
+        print(f'{path}: schema version {before} -> {current_version(conn)}'
+              + (f' (applied {applied})' if applied else ' (up to date)'))
+        if args.check_plans:
+            bad = full_scans(conn, queries)
+            for name, lines in bad.items():
+                print(f'  FULL SCAN in {name}: {"; ".join(lines)}')
+            if bad:
+                return 1
+            print(f'  {len(queries)} route queries use indexes')
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
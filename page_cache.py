@@ -0,0 +1,153 @@
+"""Conditional GETs and rendered-page caching for the student dashboards.
+
+``student_versions`` holds one number per student that triggers bump
+whenever a row of the student's attendance is inserted, changed or deleted,
+or the student's own record (name, section, year) changes. Every writer --
+teacher marking, event approval, TH2 club uploads -- therefore invalidates
+exactly the students it touched, in every process, without calling anything
+here; password rehashes on login do not count as changes.
+
+A dashboard is identified by a key such as (student, name, day, version).
+Its ETag is a hash of that key and the template source, so a refresh whose
+If-None-Match matches costs one primary-key read and returns
+``304 Not Modified``. Otherwise the HTML comes from a per-process LRU
+(PAGE_CACHE_SIZE pages) or is rendered and stored; pages keyed on an older
+version are never looked up again and age out.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from flask import current_app, request
+
+import targets
+
+PAGE_CACHE_SIZE = int(os.environ.get('PAGE_CACHE_SIZE', 2000))
+
+# Where each database keeps attendance and students; {ref} is NEW/OLD
+TARGETS = {
+    'root': {
+        'students': 'students',
+        'student': '1',
+        'watch': 'student_id, name, section, year',
+    },
+    'th2': {
+        'students': 'users',
+        'student': "{ref}.role = 'student'",
+        'watch': 'role, student_id, name, section, year',
+    },
+}
+
+
+def _bump(student_id, where='1'):
+    return f'''INSERT INTO student_versions (student_id, version)
+               SELECT {student_id}, 1 WHERE {student_id} IS NOT NULL AND {where}
+               ON CONFLICT (student_id) DO UPDATE SET version = version + 1;'''
+
+
+def schema(target):
+    """CREATE statements for student_versions and the student-table triggers that bump it."""
+    spec = TARGETS[target]
+    trigger = targets.trigger
+
+    def student(ref):
+        return spec['student'].format(ref=ref)
+
+    return [
+        '''CREATE TABLE IF NOT EXISTS student_versions (
+            student_id TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID''',
+        # not on password updates (auth.py rehashes on login)
+        trigger('trg_student_versions_student_update', f"AFTER UPDATE OF {spec['watch']}", spec['students'],
+                [_bump('NEW.student_id', student('NEW')),
+                 _bump('OLD.student_id', f"{student('OLD')} AND OLD.student_id IS NOT NEW.student_id")]),
+        trigger('trg_student_versions_student_delete', 'AFTER DELETE', spec['students'],
+                [_bump('OLD.student_id', student('OLD'))]),
+    ]
+
+
+def trigger_sql(target):
+    """Statements the attendance triggers (migrations.attendance_triggers) run for this table, per event."""
+    return {
+        'keys': ('student_id',),
+        'insert': [_bump('NEW.student_id')],
+        'delete': [_bump('OLD.student_id')],
+        'update': [_bump('NEW.student_id')],
+    }
+
+
+def student_version(conn, student_id):
+    """Current data version of a student (0 before anything was recorded)."""
+    row = conn.execute('SELECT version FROM student_versions WHERE student_id = ?', (student_id,)).fetchone()
+    return row[0] if row else 0
+
+
+class PageCache:
+    """Thread-safe LRU of rendered pages of one template, with ETag handling.
+
+    Call inside a request: respond(key, render) returns a 304 when the
+    client already has the page for `key`, else the cached or freshly
+    rendered body (render() must return the HTML).
+    """
+
+    def __init__(self, template, size=PAGE_CACHE_SIZE):
+        self.template = template
+        self.size = size
+        self._salt = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def etag(self, key):
+        if self._salt is None:
+            # a changed template must not match pages clients rendered earlier
+            env = current_app.jinja_env
+            self._salt = env.loader.get_source(env, self.template)[0]
+        return hashlib.blake2b(repr((self._salt, key)).encode(), digest_size=12).hexdigest()
+
+    def cached(self, key):
+        """A 304 or cached response for `key`, or None when the page must be rendered."""
+        etag = self.etag(key)
+        if request.if_none_match.contains_weak(etag):
+            with self._lock:
+                self.not_modified += 1
+            response = current_app.response_class(status=304)
+            return self._headers(response, etag)
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return self._headers(current_app.response_class(body), etag)
+
+    def store(self, key, body):
+        """Cache a freshly rendered page and return its response."""
+        with self._lock:
+            self._entries[key] = body
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return self._headers(current_app.response_class(body), self.etag(key))
+
+    def respond(self, key, render):
+        response = self.cached(key)
+        if response is None:
+            response = self.store(key, render())
+        return response
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+    @staticmethod
+    def _headers(response, etag):
+        response.set_etag(etag)
+        # per-user pages; browsers keep them but must revalidate every time
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
@@ -0,0 +1,205 @@
+"""Upload windows that close themselves: portal_access (app.py) and vc_approvals (TH2).
+
+Each window stores its expiry as epoch seconds in ``expires_at``, filled in
+by triggers from the columns the apps already write (``opened_at`` +
+``duration_hours`` in attendance.db, ``start_time``/``end_time`` ISO strings,
+with or without a UTC offset, in TH2). A partial index over the open windows
+keeps the earliest expiry one index probe away.
+
+``PortalScheduler`` is a thread per process that sleeps until that next
+expiry, closes every window that is due in one UPDATE, and goes back to
+sleep; a wake-up with nothing due (the MAX_SLEEP rechecks) only reads. Opening a window wakes it so an earlier expiry is not missed; windows
+opened by another process are picked up within MAX_SLEEP seconds. The thread
+is started again in a forked child (a preloading prefork server), which
+does not inherit it; the apps call ``start()`` on every request. The upload
+paths still compare ``expires_at`` with the clock in their (indexed) lookup,
+so a window is never usable past its expiry even while the flag is being
+flipped.
+
+Usage:
+    python portals.py                # list open windows and the next expiry (attendance.db)
+    python portals.py th2 --expire   # close the windows that are due now
+"""
+import os
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import db_pool
+import targets
+
+PORTAL_SCHEDULER = os.environ.get('PORTAL_SCHEDULER', '1') != '0'
+MAX_SLEEP = 60.0  # seconds; bounds how late a window opened elsewhere is closed
+
+
+def _epoch(column):
+    return f"CAST(strftime('%s', {column}) AS REAL)"
+
+
+# Window table per database: how "open" and "closed" are written, and the
+# trigger statements that derive expires_at (and starts_at) from app columns
+TARGETS = {
+    'root': {
+        'table': 'portal_access',
+        'key': 'portal_id',
+        'open': 'is_active = 1',
+        'close': 'is_active = 0',
+        'columns': ['expires_at REAL'],
+        'derive': f"expires_at = {_epoch('COALESCE(opened_at, CURRENT_TIMESTAMP)')} + duration_hours * 3600",
+        'inputs': 'opened_at, duration_hours',
+    },
+    'th2': {
+        'table': 'vc_approvals',
+        'key': 'id',
+        'open': "status = 'approved'",
+        'close': "status = 'expired'",
+        'columns': ['starts_at REAL', 'expires_at REAL'],
+        'derive': f"starts_at = {_epoch('start_time')}, expires_at = {_epoch('end_time')}",
+        'inputs': 'start_time, end_time',
+    },
+}
+
+
+def schema(target):
+    """Columns, triggers and the next-expiry index for a database's window table."""
+    spec = TARGETS[target]
+    table, key = spec['table'], spec['key']
+    derive = f"UPDATE {table} SET {spec['derive']} WHERE {key} = NEW.{key};"
+    return [f'ALTER TABLE {table} ADD COLUMN {column}' for column in spec['columns']] + [
+        f"UPDATE {table} SET {spec['derive']}",
+        f'''CREATE TRIGGER IF NOT EXISTS trg_{table}_expiry_insert AFTER INSERT ON {table} BEGIN
+            {derive}
+        END''',
+        f'''CREATE TRIGGER IF NOT EXISTS trg_{table}_expiry_update AFTER UPDATE OF {spec['inputs']} ON {table} BEGIN
+            {derive}
+        END''',
+        f"CREATE INDEX IF NOT EXISTS ix_{table}_expiry ON {table} (expires_at) WHERE {spec['open']}",
+    ]
+
+
+def next_expiry_sql(target):
+    spec = TARGETS[target]
+    return f"SELECT MIN(expires_at) FROM {spec['table']} WHERE {spec['open']}"
+
+
+def next_expiry(conn, target):
+    """Epoch seconds of the earliest expiry among open windows (None when none are open)."""
+    return conn.execute(next_expiry_sql(target)).fetchone()[0]
+
+
+def expire_due(conn, target, now=None):
+    """Close every open window whose expiry has passed; returns how many were closed.
+
+    The next expiry is read first, so the usual pass with nothing due takes
+    no write lock.
+    """
+    spec = TARGETS[target]
+    now = time.time() if now is None else now
+    upcoming = next_expiry(conn, target)
+    if upcoming is None or upcoming > now:
+        return 0
+    with db_pool.transaction(conn):
+        return conn.execute(f"UPDATE {spec['table']} SET {spec['close']} WHERE {spec['open']} AND expires_at <= ?",
+                            (now,)).rowcount
+
+
+class PortalScheduler:
+    """Background thread closing windows when they expire.
+
+    on_expire(count) runs after a pass that closed something (the apps drop
+    their cached VC pages there).
+    """
+
+    def __init__(self, db_path, target, on_expire=None, enabled=PORTAL_SCHEDULER):
+        self.db_path = db_path
+        self.target = target
+        self.on_expire = on_expire
+        self.enabled = enabled
+        self.expired = 0
+        self._pid = None
+        self._thread = None
+        self._started = threading.Lock()
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+
+    def run_once(self, now=None):
+        """One pass: close what is due; returns the next expiry (or None)."""
+        conn = db_pool.get_connection(self.db_path)
+        try:
+            count = expire_due(conn, self.target, now)
+            upcoming = next_expiry(conn, self.target)
+        finally:
+            conn.close()
+        if count:
+            self.expired += count
+            if self.on_expire:
+                self.on_expire(count)
+        return upcoming
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                upcoming = self.run_once()
+            except (sqlite3.Error, db_pool.PoolTimeout):
+                # locked or pool exhausted: the upload checks stay exact, try again later
+                upcoming = None
+            delay = MAX_SLEEP if upcoming is None else min(max(upcoming - time.time(), 0), MAX_SLEEP)
+            self._wakeup.wait(delay)
+            self._wakeup.clear()
+
+    def start(self):
+        """Start the thread (once per process, again after a fork; not when PORTAL_SCHEDULER=0).
+
+        Cheap once started: the apps call it before every request.
+        """
+        if not self.enabled or self._pid == os.getpid():
+            return
+        with self._started:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                # forked child: the parent's thread does not exist here
+                self._stop = threading.Event()
+                self._wakeup = threading.Event()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self.run, name=f'portal-expiry-{self.target}', daemon=True)
+            self._thread.start()
+
+    def wakeup(self):
+        """Re-read the next expiry now (call after opening or changing a window)."""
+        self._wakeup.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+
+def _fmt(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')
+
+
+def main(argv=None):
+    parser = targets.argument_parser('Inspect or expire portal windows.')
+    parser.add_argument('--expire', action='store_true', help='close the windows that are due now')
+    args = parser.parse_args(argv)
+
+    spec = TARGETS[args.target]
+    conn = targets.connect(args, isolation_level=None)
+    try:
+        if args.expire:
+            print(f'{expire_due(conn, args.target)} windows closed')
+        rows = conn.execute(f"SELECT {spec['key']}, expires_at FROM {spec['table']} WHERE {spec['open']} "
+                            f"ORDER BY expires_at").fetchall()
+        for key, expires_at in rows:
+            print(f"{spec['key']} {key}: expires {_fmt(expires_at) if expires_at is not None else 'unknown (unreadable end time, never open)'}")
+        upcoming = next_expiry(conn, args.target)
+        print(f'{len(rows)} open; next expiry ' + (_fmt(upcoming) if upcoming is not None else 'none'))
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,192 @@
+"""Teaching assignments and cached section rosters for the teacher pages.
+
+``teaching_assignments`` records which sections a teacher teaches (and, in
+TH2, for which subject); the teacher pages offer only those sections and
+load only their rosters. Teachers without assignments pick one section at a
+time from every section.
+
+``roster_versions`` holds, per section, the number of students and a version
+number that triggers on the student table bump whenever a student is added,
+removed, renamed or moved. ``RosterCache`` keeps each section's sorted
+roster in-process together with the version it was read at, so a page
+costs one primary-key probe per section instead of sorting the student
+table, and a change made by any process is picked up on the next request.
+
+Usage:
+    python rosters.py --verify            # compare roster_versions counts with the student table
+    python rosters.py th2 --rebuild
+"""
+import sys
+import threading
+
+import targets
+
+# Where each database keeps its students and who teaches what; {ref} is
+# NEW/OLD inside the triggers, the table itself when recounting
+TARGETS = {
+    'root': {
+        'table': 'students',
+        'student': '1',
+        'watch': 'student_id, name, section',
+        'teacher': 'teacher_id',
+        'assignments': '''CREATE TABLE IF NOT EXISTS teaching_assignments (
+            teacher_id TEXT NOT NULL,
+            section TEXT NOT NULL,
+            PRIMARY KEY (teacher_id, section)
+        ) WITHOUT ROWID''',
+    },
+    'th2': {
+        'table': 'users',
+        'student': "{ref}.role = 'student'",
+        'watch': 'role, student_id, name, section',
+        'teacher': 'teacher_username',
+        'assignments': '''CREATE TABLE IF NOT EXISTS teaching_assignments (
+            teacher_username TEXT NOT NULL,
+            subject_code TEXT NOT NULL,
+            section TEXT NOT NULL,
+            PRIMARY KEY (teacher_username, subject_code, section)
+        ) WITHOUT ROWID''',
+    },
+}
+
+
+def _section(ref):
+    return f"COALESCE({ref}.section, '')"
+
+
+def _enter(target, ref):
+    return f'''INSERT INTO roster_versions (section, students, version)
+               SELECT {_section(ref)}, 1, 1 WHERE {TARGETS[target]['student'].format(ref=ref)}
+               ON CONFLICT (section) DO UPDATE SET students = students + 1, version = version + 1;'''
+
+
+def _leave(target, ref):
+    return f'''UPDATE roster_versions SET students = students - 1, version = version + 1
+               WHERE section = {_section(ref)} AND {TARGETS[target]['student'].format(ref=ref)};'''
+
+
+def schema(target):
+    """CREATE statements for the assignment and version tables and the version triggers."""
+    spec = TARGETS[target]
+
+    def trigger(name, event, body):
+        return targets.trigger(name, event, spec['table'], body)
+
+    return [
+        spec['assignments'],
+        "CREATE INDEX IF NOT EXISTS ix_teaching_assignments_section ON teaching_assignments (section)",
+        '''CREATE TABLE IF NOT EXISTS roster_versions (
+            section TEXT PRIMARY KEY,
+            students INTEGER NOT NULL DEFAULT 0,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID''',
+        trigger('trg_roster_versions_insert', 'AFTER INSERT', [_enter(target, 'NEW')]),
+        trigger('trg_roster_versions_delete', 'AFTER DELETE', [_leave(target, 'OLD')]),
+        # not on password updates (auth.py rehashes on login)
+        trigger('trg_roster_versions_update', f"AFTER UPDATE OF {spec['watch']}",
+                [_leave(target, 'OLD'), _enter(target, 'NEW')]),
+    ]
+
+
+def _computed_sql(target):
+    spec = TARGETS[target]
+    return (f"SELECT {_section(spec['table'])} AS section, COUNT(*) AS students FROM {spec['table']} "
+            f"WHERE {spec['student'].format(ref=spec['table'])} GROUP BY 1")
+
+
+def rebuild_sql(target):
+    """Statements recounting roster_versions; versions only ever go up, so cached rosters are dropped."""
+    return [
+        'UPDATE roster_versions SET students = 0, version = version + 1',
+        f'''INSERT INTO roster_versions (section, students, version)
+            SELECT section, students, 1 FROM ({_computed_sql(target)}) WHERE 1
+            ON CONFLICT (section) DO UPDATE SET students = excluded.students''',
+    ]
+
+
+def rebuild(conn, target):
+    targets.rebuild(conn, rebuild_sql(target))
+
+
+def verify(conn, target):
+    """Sections whose stored student count differs from the student table: [(section, stored, actual)]."""
+    actual = dict(conn.execute(_computed_sql(target)).fetchall())
+    stored = dict(conn.execute('SELECT section, students FROM roster_versions WHERE students != 0').fetchall())
+    return sorted((s, stored.get(s, 0), actual.get(s, 0))
+                  for s in set(actual) | set(stored) if stored.get(s, 0) != actual.get(s, 0))
+
+
+def sections(conn):
+    """Every section that has students, in order."""
+    return [r[0] for r in conn.execute('SELECT section FROM roster_versions WHERE students > 0 ORDER BY section')]
+
+
+def assigned_sql(target):
+    return f"SELECT DISTINCT section FROM teaching_assignments WHERE {TARGETS[target]['teacher']} = ? ORDER BY section"
+
+
+def assigned_sections(conn, target, teacher):
+    """Sections a teacher is assigned to (empty when unassigned)."""
+    return [r[0] for r in conn.execute(assigned_sql(target), (teacher,))]
+
+
+# {} is the IN list of the sections being read
+VERSIONS_SQL = 'SELECT section, version FROM roster_versions WHERE section IN ({})'
+
+
+def roster_sql(target):
+    spec = TARGETS[target]
+    return (f"SELECT student_id, name, section FROM {spec['table']} "
+            f"WHERE {spec['student'].format(ref=spec['table'])} AND section IN ({{}}) "
+            f"ORDER BY section, name")
+
+
+def _in_clause(values):
+    return ','.join('?' * len(values))
+
+
+class RosterCache:
+    """Per-process cache of sorted section rosters, checked against roster_versions on every read."""
+
+    def __init__(self, target):
+        self._sql = roster_sql(target)
+        self._entries = {}   # section -> (version, rows)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, conn, sections):
+        """(student_id, name, section) rows for the given sections, ordered by section then name."""
+        sections = sorted(set(sections))
+        if not sections:
+            return []
+        versions = dict(conn.execute(VERSIONS_SQL.format(_in_clause(sections)), sections))
+        with self._lock:
+            stale = [s for s in sections
+                     if s not in self._entries or self._entries[s][0] != versions.get(s, 0)]
+            self.hits += len(sections) - len(stale)
+            self.misses += len(stale)
+        if stale:
+            # versions were read first: a change landing in between is stored
+            # under the older version and reloaded on the next read
+            loaded = {s: [] for s in stale}
+            for row in conn.execute(self._sql.format(_in_clause(stale)), stale):
+                loaded[row['section']].append(row)
+            with self._lock:
+                for s in stale:
+                    self._entries[s] = (versions.get(s, 0), loaded[s])
+        with self._lock:
+            return [row for s in sections for row in self._entries[s][1]]
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def main(argv=None):
+    return targets.maintenance_main(argv, 'roster_versions', rebuild, verify,
+                                    describe=lambda row: f'section {row[0]!r}: stored {row[1]}, actual {row[2]}')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
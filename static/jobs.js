@@ -0,0 +1,37 @@
+// Polls /jobs/<id> for the status box rendered when a dashboard is opened with ?job=<id>
+(function () {
+    var box = document.getElementById('job-status');
+    if (!box) {
+        return;
+    }
+    var url = box.getAttribute('data-url');
+
+    function show(kind, text) {
+        box.className = 'alert alert-' + kind;
+        box.textContent = text;
+    }
+
+    function poll() {
+        fetch(url, {credentials: 'same-origin'})
+            .then(function (response) { return response.json(); })
+            .then(function (job) {
+                if (job.status === 'done') {
+                    show('success', (job.result && job.result.message) || 'Done.');
+                    var link = document.createElement('a');
+                    link.href = window.location.pathname;
+                    link.textContent = ' Refresh';
+                    box.appendChild(link);
+                } else if (job.status === 'failed') {
+                    show('error', 'Error processing job #' + job.job_id + ': ' + job.error);
+                } else if (job.error && !job.status) {
+                    show('error', job.error);
+                } else {
+                    show('warning', 'Job #' + job.job_id + ' is ' + job.status + '...');
+                    setTimeout(poll, 1000);
+                }
+            })
+            .catch(function () { setTimeout(poll, 2000); });
+    }
+
+    poll();
+})();
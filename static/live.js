@@ -0,0 +1,88 @@
+// Applies server-sent changes to the dashboard (see live_updates.py). Elements
+// showing a status carry data-live="<key>": attendance:<date>:<period>[:<subject code>],
+// event:<id> or approval:<id>. The #live-updates notice is shown whenever the
+// page (totals, new rows) is out of date and needs a reload.
+// When the server has no stream for this page (204, 503) the page polls the
+// same URL with ?poll=1 and shows the notice once the data's token moves.
+(function () {
+    var notice = document.getElementById('live-updates');
+    if (!notice) {
+        return;
+    }
+    var url = new URL(notice.getAttribute('data-url'), window.location.href);
+    var since = url.searchParams.get('since');
+    var POLL_MS = 15000;
+
+    function show() {
+        notice.hidden = false;
+    }
+
+    function poll() {
+        var pollUrl = new URL(url.href);
+        pollUrl.searchParams.set('poll', '1');
+        fetch(pollUrl.href, {credentials: 'same-origin'})
+            .then(function (r) { return r.ok ? r.json() : null; })
+            .then(function (data) {
+                if (data && since !== null && data.since !== since) {
+                    show();
+                    return;
+                }
+                if (data && since === null) {
+                    since = data.since;
+                }
+                setTimeout(poll, POLL_MS);
+            })
+            .catch(function () { setTimeout(poll, POLL_MS); });
+    }
+
+    if (!window.EventSource) {
+        setTimeout(poll, POLL_MS);
+        return;
+    }
+    var source = new EventSource(url.href);
+    source.addEventListener('error', function () {
+        // CLOSED: refused (204/503), not a dropped connection the browser retries
+        if (source.readyState === EventSource.CLOSED) {
+            poll();
+        }
+    });
+
+    function apply(key, status, badge) {
+        var targets = document.querySelectorAll('[data-live="' + key + '"]');
+        for (var i = 0; i < targets.length; i++) {
+            var el = targets[i];
+            if (el.classList.contains('status-badge')) {
+                el.className = 'status-badge status-' + status.toLowerCase().replace('.', '-');
+            }
+            el.textContent = el.hasAttribute('data-live-upper') ? status.toUpperCase() : status;
+            if (badge) {
+                el.appendChild(document.createTextNode(' '));
+                el.appendChild(badge);
+            }
+        }
+    }
+
+    source.addEventListener('attendance', function (e) {
+        var change = JSON.parse(e.data);
+        var key = 'attendance:' + change.date + ':' + change.period;
+        if (change.subject_code) {
+            key += ':' + change.subject_code;
+        }
+        var badge = null;
+        if (change.marked_by_club) {
+            badge = document.createElement('span');
+            badge.className = 'club-badge';
+            badge.textContent = 'Club Event';
+        }
+        apply(key, change.status, badge);
+        show();
+    });
+    ['event', 'approval'].forEach(function (kind) {
+        source.addEventListener(kind, function (e) {
+            var change = JSON.parse(e.data);
+            apply(kind + ':' + change.id, change.status, null);
+            show();
+        });
+    });
+    source.addEventListener('resync', show);
+})();
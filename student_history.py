@@ -0,0 +1,46 @@
+"""A student's attendance records, as the dashboards and the history API read them.
+
+The statements live here rather than in the apps so that migrations.py
+plan-checks exactly the SQL the routes run.
+"""
+
+# attendance.db: one page of records, newest first, keyset-paginated on
+# (date, period); {filters} are the optional conditions from page_sql
+PAGE_SQL = '''
+    SELECT a.date, a.period, a.status, a.marked_by_club, t.name as teacher_name, t.subject
+    FROM attendance a
+    JOIN teachers t ON a.teacher_id = t.teacher_id
+    WHERE a.student_id = ?{filters}
+    ORDER BY a.date DESC, a.period DESC
+    LIMIT ?
+'''
+
+# TH2/database.db: one day's records with their subject names
+TODAY_SQL = '''
+    SELECT s.subject_name, a.subject_code, a.period, a.status, a.marked_by, a.event_name
+    FROM attendance a LEFT JOIN subjects s ON a.subject_code = s.subject_code
+    WHERE a.student_id = ? AND a.date = ? ORDER BY a.period
+'''
+
+
+def page_sql(before=False, date_from=False, date_to=False):
+    """PAGE_SQL with the conditions for the filters in use; parameters go in this order, then the limit."""
+    conditions = ((before, ' AND (a.date, a.period) < (?, ?)'),
+                  (date_from, ' AND a.date >= ?'),
+                  (date_to, ' AND a.date <= ?'))
+    return PAGE_SQL.format(filters=''.join(sql for used, sql in conditions if used))
+
+
+def fetch_page(conn, student_id, limit, before=None, date_from=None, date_to=None):
+    """One page of a student's records (attendance.db), newest first.
+
+    before is the (date, period) of the last record already shown; only
+    older records are returned. Uses the (student_id, date, period) index
+    for both the seek and the ordering, so deep pages cost the same as the first.
+    """
+    params = [student_id]
+    if before:
+        params.extend(before)
+    params += [value for value in (date_from, date_to) if value]
+    sql = page_sql(before=bool(before), date_from=bool(date_from), date_to=bool(date_to))
+    return conn.execute(sql, params + [limit]).fetchall()
@@ -0,0 +1,273 @@
+"""Synthetic large-college data for load testing both apps.
+
+Everything is generated inside SQLite with INSERT ... SELECT over small
+driver tables (no per-row Python), and the attendance triggers are dropped
+for the bulk load and re-created afterwards with one rebuild of the
+summary/counter tables. Values are deterministic for a given --seed.
+
+Usage:
+    python synthetic_data.py root --db big.db                       # 50k students, 500 teachers, 1 year
+    python synthetic_data.py th2 --db big_th2.db --students 5000 --days 60
+
+Logins follow the demo data: root students use their ID / pass123,
+teachers T0001 / teach123, clubs CLUB001 / club123, VC001 / vc123;
+TH2 users are student1.., teacher1.., club1.. and vc, all with pass123.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+
+import analytics_export
+import attendance_stats
+import attendance_summary
+import auth
+import migrations
+
+SECTION_SIZE = 60
+PERIODS = 5
+WEEKDAYS = 5              # timetable Monday..Friday (school_days() skips weekends)
+CHUNK_STUDENTS = 2000     # students per attendance INSERT ... SELECT (one commit each)
+STATUS_WEIGHTS = (70, 20, 10)  # P / A / N.M. percent
+
+# deterministic per-(student, day, period) value in [0, 100)
+_HASH = '((({i}) * 2654435761 + ({d}) * 40503 + ({p}) * 9973 + {seed}) % 1000003) % 100'
+
+
+def _status_sql(i, d, p, seed):
+    h = _HASH.format(i=i, d=d, p=p, seed=int(seed))
+    present, absent = STATUS_WEIGHTS[0], STATUS_WEIGHTS[0] + STATUS_WEIGHTS[1]
+    return f"CASE WHEN {h} < {present} THEN 'P' WHEN {h} < {absent} THEN 'A' ELSE 'N.M.' END"
+
+
+def _id_format(prefix, count):
+    return f'{prefix}%0{max(3, len(str(count)))}d'
+
+
+def school_days(days, end=None):
+    """Weekdays in the `days` calendar days up to and including end (default today)."""
+    end = end or date.today()
+    out = []
+    for offset in range(days - 1, -1, -1):
+        d = end - timedelta(days=offset)
+        if d.weekday() < 5:
+            out.append(d.isoformat())
+    return out
+
+
+def _prepare(conn, days):
+    conn.execute('CREATE TEMP TABLE IF NOT EXISTS gen_days (d INTEGER PRIMARY KEY, date TEXT NOT NULL)')
+    conn.execute('CREATE TEMP TABLE IF NOT EXISTS gen_periods (period INTEGER PRIMARY KEY)')
+    conn.execute('DELETE FROM gen_days')
+    conn.execute('DELETE FROM gen_periods')
+    conn.executemany('INSERT INTO gen_days (d, date) VALUES (?, ?)', enumerate(school_days(days)))
+    conn.executemany('INSERT INTO gen_periods (period) VALUES (?)', [(p,) for p in range(1, PERIODS + 1)])
+
+
+def _weekdays():
+    return ' UNION ALL '.join(f'SELECT {d} AS weekday' for d in range(1, WEEKDAYS + 1))
+
+
+def _numbers(count):
+    return f'WITH RECURSIVE n(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM n WHERE i + 1 < {int(count)})'
+
+
+def _without_attendance_triggers(conn, load):
+    """Run load() with the attendance triggers dropped, then restore and rebuild."""
+    triggers = conn.execute('''SELECT name, sql FROM sqlite_master
+                               WHERE type = 'trigger' AND tbl_name = 'attendance' ''').fetchall()
+    for name, _ in triggers:
+        conn.execute(f'DROP TRIGGER {name}')
+    conn.commit()
+    try:
+        load()
+    finally:
+        conn.execute('BEGIN IMMEDIATE')
+        for _, sql in triggers:
+            conn.execute(sql)
+        conn.commit()
+
+
+def _rebuild(conn, target, subject_column):
+    attendance_summary.rebuild(conn, subject_column)
+    attendance_stats.rebuild(conn, target)
+    analytics_export.rebuild(conn, target)
+
+
+def _bulk_attendance(conn, students, insert_sql, report):
+    """Run insert_sql once per block of CHUNK_STUDENTS students (params: first, last index)."""
+    total = 0
+    for first in range(0, students, CHUNK_STUDENTS):
+        last = min(first + CHUNK_STUDENTS, students)
+        conn.execute('BEGIN IMMEDIATE')
+        total += conn.execute(insert_sql, (first, last)).rowcount
+        conn.commit()
+        report(f'attendance: {total} rows ({last}/{students} students)')
+    return total
+
+
+# ---------- attendance.db (app.py) ----------
+
+ROOT_STUDENT_BASE = 2021001
+
+
+def generate_root(conn, students, teachers, days, clubs, seed=0, report=print):
+    migrations.migrate(conn, migrations.ROOT_MIGRATIONS)
+    _prepare(conn, days)
+    policy = auth.HashPolicy()   # one hash per role, shared by every synthetic account
+    teacher_fmt = _id_format('T', teachers)
+    sections = -(-students // SECTION_SIZE)
+
+    conn.execute('BEGIN IMMEDIATE')
+    conn.execute(f'''{_numbers(students)}
+        INSERT OR IGNORE INTO students (student_id, name, section, year, password)
+        SELECT CAST({ROOT_STUDENT_BASE} + i AS TEXT), 'Student ' || ({ROOT_STUDENT_BASE} + i),
+               printf('S%04d', i / {SECTION_SIZE}), 1 + i % 4, ?
+        FROM n''', (policy.hash('pass123'),))
+    conn.execute(f'''{_numbers(teachers)}
+        INSERT OR IGNORE INTO teachers (teacher_id, name, subject, password)
+        SELECT printf('{teacher_fmt}', i + 1), 'Teacher ' || (i + 1), 'Subject ' || (i + 1), ?
+        FROM n''', (policy.hash('teach123'),))
+    conn.execute(f'''{_numbers(clubs)}
+        INSERT OR IGNORE INTO clubs (club_id, club_name, password)
+        SELECT printf('CLUB%03d', i + 1), 'Club ' || (i + 1), ? FROM n''', (policy.hash('club123'),))
+    conn.execute('''INSERT OR IGNORE INTO vc (vc_id, name, password)
+                    VALUES ('VC001', 'Dr. Vice Chancellor', ?)''', (policy.hash('vc123'),))
+    # the (section, period) -> teacher mapping the attendance below follows, and its timetable
+    conn.execute(f'''{_numbers(sections)}
+        INSERT OR IGNORE INTO teaching_assignments (teacher_id, section)
+        SELECT printf('{teacher_fmt}', 1 + ((n.i * {PERIODS} + p.period) % {teachers})), printf('S%04d', n.i)
+        FROM n, gen_periods p''')
+    conn.execute(f'''{_numbers(sections)}
+        INSERT OR IGNORE INTO timetable (section, weekday, period, teacher_id, subject)
+        SELECT printf('S%04d', n.i), w.weekday, p.period,
+               printf('{teacher_fmt}', 1 + ((n.i * {PERIODS} + p.period) % {teachers})),
+               'Subject ' || (1 + ((n.i * {PERIODS} + p.period) % {teachers}))
+        FROM n, gen_periods p, ({_weekdays()}) w''')
+    conn.commit()
+    report(f'{students} students in {sections} sections, {teachers} teachers, {clubs} clubs')
+
+    # each (section, period) is taught by one teacher all year
+    i = f'(CAST(s.student_id AS INTEGER) - {ROOT_STUDENT_BASE})'
+    insert_sql = f'''
+        INSERT OR IGNORE INTO attendance (student_id, teacher_id, date, period, status)
+        SELECT s.student_id,
+               printf('{teacher_fmt}', 1 + ((({i} / {SECTION_SIZE}) * {PERIODS} + p.period) % {teachers})),
+               d.date, p.period, {_status_sql(i, 'd.d', 'p.period', seed)}
+        FROM students s, gen_days d, gen_periods p
+        WHERE s.student_id >= CAST({ROOT_STUDENT_BASE} + ? AS TEXT)
+          AND s.student_id < CAST({ROOT_STUDENT_BASE} + ? AS TEXT)
+        ORDER BY s.student_id, d.date, p.period'''
+    rows = []
+    _without_attendance_triggers(conn, lambda: rows.append(_bulk_attendance(conn, students, insert_sql, report)))
+    _rebuild(conn, 'root', 'teacher_id')
+    return rows[0]
+
+
+# ---------- TH2/database.db (TH2/app.py) ----------
+
+TH2_STUDENT_BASE = 25030175
+
+
+def generate_th2(conn, students, teachers, days, clubs, seed=0, report=print):
+    migrations.migrate(conn, migrations.TH2_MIGRATIONS)
+    _prepare(conn, days)
+    subject_fmt = _id_format('SUB', teachers)
+    # one salted hash shared by every synthetic account: hashing per row would dominate the run
+    password = auth.HashPolicy().hash('pass123')
+
+    conn.execute('BEGIN IMMEDIATE')
+    conn.execute(f'''{_numbers(students)}
+        INSERT OR IGNORE INTO users (username, password, role, name, student_id, section, year)
+        SELECT 'student' || (i + 1), ?, 'student', 'Student ' || (i + 1),
+               CAST({TH2_STUDENT_BASE} + i AS TEXT), printf('Section-%04d', i / {SECTION_SIZE}), 1 + i % 4
+        FROM n''', (password,))
+    conn.execute(f'''{_numbers(teachers)}
+        INSERT OR IGNORE INTO users (username, password, role, name)
+        SELECT 'teacher' || (i + 1), ?, 'teacher', 'Teacher ' || (i + 1) FROM n''', (password,))
+    conn.execute(f'''{_numbers(teachers)}
+        INSERT INTO subjects (subject_code, subject_name, teacher_username)
+        SELECT printf('{subject_fmt}', i + 1), 'Subject ' || (i + 1), 'teacher' || (i + 1) FROM n
+        WHERE NOT EXISTS (SELECT 1 FROM subjects WHERE subject_code = printf('{subject_fmt}', i + 1))''')
+    conn.execute(f'''{_numbers(clubs)}
+        INSERT OR IGNORE INTO users (username, password, role, name)
+        SELECT 'club' || (i + 1), ?, 'club', 'Club Leader ' || (i + 1) FROM n''', (password,))
+    conn.execute(f'''{_numbers(clubs)}
+        INSERT OR IGNORE INTO clubs (club_name, leader_username, status)
+        SELECT 'Club ' || (i + 1), 'club' || (i + 1), 'approved' FROM n''')
+    conn.execute('''INSERT OR IGNORE INTO users (username, password, role, name)
+                    VALUES ('vc', ?, 'vc', 'Vice Chancellor')''', (password,))
+    # the (section, period) -> teacher/subject mapping the attendance below follows, and its timetable
+    conn.execute(f'''{_numbers(-(-students // SECTION_SIZE))}
+        INSERT OR IGNORE INTO teaching_assignments (teacher_username, subject_code, section)
+        SELECT 'teacher' || (1 + t), printf('{subject_fmt}', 1 + t), printf('Section-%04d', i)
+        FROM (SELECT n.i, (n.i * {PERIODS} + p.period) % {teachers} AS t FROM n, gen_periods p)''')
+    conn.execute(f'''{_numbers(-(-students // SECTION_SIZE))}
+        INSERT OR IGNORE INTO timetable (section, weekday, period, teacher_username, subject)
+        SELECT printf('Section-%04d', i), weekday, CAST(period AS TEXT), 'teacher' || (1 + t),
+               printf('{subject_fmt}', 1 + t)
+        FROM (SELECT n.i, w.weekday, p.period, (n.i * {PERIODS} + p.period) % {teachers} AS t
+              FROM n, gen_periods p, ({_weekdays()}) w)''')
+    conn.commit()
+    report(f'{students} students, {teachers} teachers/subjects, {clubs} clubs')
+
+    i = f'(CAST(u.student_id AS INTEGER) - {TH2_STUDENT_BASE})'
+    teacher = f"(({i} / {SECTION_SIZE}) * {PERIODS} + p.period) % {teachers}"
+    insert_sql = f'''
+        INSERT OR IGNORE INTO attendance (student_id, subject_code, date, period, status, marked_by)
+        SELECT u.student_id, printf('{subject_fmt}', 1 + {teacher}), d.date, CAST(p.period AS TEXT),
+               {_status_sql(i, 'd.d', 'p.period', seed)}, 'teacher' || (1 + {teacher})
+        FROM users u, gen_days d, gen_periods p
+        WHERE u.role = 'student'
+          AND u.student_id >= CAST({TH2_STUDENT_BASE} + ? AS TEXT)
+          AND u.student_id < CAST({TH2_STUDENT_BASE} + ? AS TEXT)
+        ORDER BY u.student_id, d.date, p.period'''
+    rows = []
+    _without_attendance_triggers(conn, lambda: rows.append(_bulk_attendance(conn, students, insert_sql, report)))
+    _rebuild(conn, 'th2', 'subject_code')
+    return rows[0]
+
+
+GENERATORS = {
+    'root': generate_root,
+    'th2': generate_th2,
+}
+
+
+def generate(target, path, students=50000, teachers=500, days=365, clubs=20, seed=0, report=print):
+    """Create or extend the database at path; returns the number of attendance rows added."""
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    try:
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = OFF')   # bulk load: durability comes from the final checkpoint
+        conn.execute('PRAGMA cache_size = -200000')
+        return GENERATORS[target](conn, students, teachers, days, clubs, seed, report)
+    finally:
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a synthetic college database for load testing.')
+    parser.add_argument('target', choices=sorted(GENERATORS))
+    parser.add_argument('--db', required=True, help='database file to create (or extend)')
+    parser.add_argument('--students', type=int, default=50000)
+    parser.add_argument('--teachers', type=int, default=500)
+    parser.add_argument('--days', type=int, default=365, help='calendar days of history (weekdays only)')
+    parser.add_argument('--clubs', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    rows = generate(args.target, args.db, args.students, args.teachers, args.days, args.clubs, args.seed,
+                    report=lambda msg: print(f'  {msg}', end='\r' if msg.startswith('attendance') else '\n'))
+    elapsed = time.perf_counter() - start
+    size = os.path.getsize(args.db) / 1e6
+    print(f'\n{args.db}: {rows} attendance rows in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s), {size:.0f} MB')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
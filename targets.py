@@ -0,0 +1,119 @@
+"""The two databases and the plumbing shared by the modules working on both.
+
+A target is 'root' (attendance.db, app.py) or 'th2' (TH2/database.db). The
+modules that keep derived tables or caches in them keep only their
+per-target specifics in their own ``TARGETS`` dicts; the database paths, the
+trigger DDL, the command-line skeleton and the ``--verify``/``--rebuild``
+maintenance command (with the rebuild transaction and recount diff behind
+it) live here, as does the per-process registry that
+``/metrics`` reads live objects from.
+"""
+import argparse
+import os
+import sqlite3
+import threading
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+
+DB_PATHS = {
+    'root': os.path.join(BASE_DIR, 'attendance.db'),
+    'th2': os.path.join(BASE_DIR, 'TH2', 'database.db'),
+}
+NAMES = sorted(DB_PATHS)
+
+
+def trigger(name, event, table, body, when=None):
+    """CREATE TRIGGER statement running the statements in body (each ending in ';'), for rows matching when."""
+    when = f' WHEN {when}' if when else ''
+    return f'CREATE TRIGGER IF NOT EXISTS {name} {event} ON {table}{when} BEGIN\n' + '\n'.join(body) + '\nEND'
+
+
+def argument_parser(description):
+    """Parser with the optional target and --db arguments every module CLI takes."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('target', nargs='?', choices=NAMES, default='root')
+    parser.add_argument('--db', help="database path (defaults to the target app's database)")
+    return parser
+
+
+def connect(args, **kwargs):
+    """Connection to args.db, or to the database of args.target."""
+    return sqlite3.connect(args.db or DB_PATHS[args.target], timeout=30, **kwargs)
+
+
+def rebuild(conn, statements, table=None):
+    """Run the statements recomputing a derived table in one write transaction.
+
+    Returns the table's row count afterwards when table is given.
+    """
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        for sql in statements:
+            conn.execute(sql)
+        count = conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0] if table else None
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return count
+
+
+def recount_diff(conn, stored, computed):
+    """Rows of the stored query missing from the computed recount and the reverse, tagged 'stored'/'computed'."""
+    return conn.execute(f'''
+        SELECT 'stored', * FROM ({stored} EXCEPT {computed})
+        UNION ALL
+        SELECT 'computed', * FROM ({computed} EXCEPT {stored})
+    ''').fetchall()
+
+
+def maintenance_main(argv, table, rebuild, verify, describe=None):
+    """``python <module>.py [target] [--db PATH] [--rebuild] [--verify]`` for a derived table.
+
+    rebuild(conn, target) recomputes the table (returning its row count or
+    None); verify(conn, target) returns the rows that differ from a recount,
+    printed with describe(row). Without flags the table is verified; the
+    exit status is 1 when it is out of date.
+    """
+    parser = argument_parser(f'Rebuild or verify {table}.')
+    parser.add_argument('--rebuild', action='store_true', help='recompute the table from its source')
+    parser.add_argument('--verify', action='store_true', help='exit non-zero if the table is out of date')
+    args = parser.parse_args(argv)
+    describe = describe or (lambda row: f'mismatch {tuple(row)}')
+
+    conn = connect(args)
+    try:
+        if args.rebuild:
+            count = rebuild(conn, args.target)
+            print(f'rebuilt {table}' + (f': {count} rows' if count is not None else ''))
+        if args.verify or not args.rebuild:
+            diff = verify(conn, args.target)
+            for row in diff[:20]:
+                print('  ' + describe(row))
+            if diff:
+                print(f'{len(diff)} rows of {table} are out of date (run with --rebuild)')
+                return 1
+            print(f'{table} is up to date')
+    finally:
+        conn.close()
+    return 0
+
+
+class Registry:
+    """Objects of one kind created in this process, whose metrics() /metrics reports."""
+
+    def __init__(self):
+        self._items = []
+        self._lock = threading.Lock()
+
+    def add(self, item):
+        with self._lock:
+            self._items.append(item)
+        return item
+
+    def metrics(self):
+        with self._lock:
+            items = list(self._items)
+        return [item.metrics() for item in items]
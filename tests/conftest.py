@@ -0,0 +1,79 @@
+import importlib.util
+import os
+import sqlite3
+import sys
+
+import pytest
+
+# the app modules live at the top of the repository
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# no background job workers or portal thread: set before any app module is imported
+os.environ.update({'JOB_WORKERS': '0', 'PORTAL_SCHEDULER': '0'})
+
+APPS = {
+    # app module, env var it reads its database path from
+    'root': (os.path.join(ROOT, 'app.py'), 'ATTENDANCE_DB'),
+    'th2': (os.path.join(ROOT, 'TH2', 'app.py'), 'TH2_DB'),
+}
+
+
+def _load(name, path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def _seed_root(path):
+    import database
+    database.DB_NAME = path
+    database.init_database()
+
+
+def _seed_th2(path):
+    seed = _load('th2_seed', os.path.join(ROOT, 'TH2', 'seed.py'))
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        seed.seed(conn)
+    finally:
+        conn.close()
+
+
+def _app(name, tmp_path_factory, seed):
+    """One app module per test session, against a freshly seeded database."""
+    path = str(tmp_path_factory.mktemp(name) / f'{name}.db')
+    seed(path)
+    app_path, env = APPS[name]
+    os.environ[env] = path
+    module = _load(f'{name}_app_under_test', app_path)
+    module.app.config['TESTING'] = True
+    return module
+
+
+@pytest.fixture(scope='session')
+def root_app(tmp_path_factory):
+    return _app('root', tmp_path_factory, _seed_root)
+
+
+@pytest.fixture(scope='session')
+def th2_app(tmp_path_factory):
+    return _app('th2', tmp_path_factory, _seed_th2)
+
+
+def migrated(path, target):
+    """Autocommit connection (sqlite3.Row rows) to a database at path brought to target's latest schema."""
+    import migrations
+    conn = sqlite3.connect(str(path), isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    migrations.migrate(conn, migrations.TARGETS[target][1])
+    return conn
+
+
+def client_as(module, **session_values):
+    """Test client of an app module already logged in with the given session values."""
+    client = module.app.test_client()
+    with client.session_transaction() as session:
+        session.update(session_values)
+    return client
@@ -0,0 +1,77 @@
+"""The attendance triggers against recounts, for random inserts, rewrites, moves and deletes."""
+import random
+import sqlite3
+
+import pytest
+
+import attendance_stats
+import attendance_summary
+import migrations
+
+SUBJECTS = {'root': ['T001', 'T002', ''], 'th2': ['SE31164', 'VC31103', None]}
+STATUSES = ['P', 'A', 'N.M.']
+
+
+def _db(tmp_path, target):
+    conn = sqlite3.connect(str(tmp_path / f'{target}.db'), isolation_level=None)
+    migrations.migrate(conn, migrations.TARGETS[target][1])
+    if target == 'root':
+        conn.executemany("INSERT INTO club_events (club_id, event_name, event_date, period) VALUES (?, 'e', '2030-01-07', 1)",
+                         [('CLUB001',), ('CLUB002',)])
+    else:
+        conn.executemany("INSERT INTO clubs (club_name, leader_username) VALUES (?, ?)",
+                         [('Tech', 'club1'), ('Coding', 'club2')])
+    return conn
+
+
+def _row(target, rng):
+    student, subject = rng.choice(['s1', 's2', 's3']), rng.choice(SUBJECTS[target])
+    date, period, status = rng.choice(['2030-01-07', '2030-01-08']), rng.choice([1, 2]), rng.choice(STATUSES)
+    if target == 'root':
+        club = rng.choice([None, None, 1, 2])
+        return dict(student_id=student, teacher_id=subject, date=date, period=period, status=status,
+                    marked_by_club=int(club is not None), club_event_id=club)
+    club = rng.choice([None, None, 1, 2])
+    return dict(student_id=student, subject_code=subject, date=date, period=str(period), status=status,
+                marked_by=f'club{club}' if club else 'teacher1', event_name='Hackathon' if club else None,
+                club_id=club)
+
+
+def _versions(conn):
+    return dict(conn.execute('SELECT student_id, version FROM student_versions'))
+
+
+@pytest.mark.parametrize('target', sorted(migrations.TARGETS))
+def test_counters_match_recount(tmp_path, target):
+    conn = _db(tmp_path, target)
+    rng = random.Random(target)
+    key = 'attendance_id' if target == 'root' else 'id'
+    for _ in range(400):
+        ids = [r[0] for r in conn.execute(f'SELECT {key} FROM attendance')]
+        op = rng.random()
+        if op < 0.4 or not ids:
+            row = _row(target, rng)
+            conn.execute(f"INSERT OR IGNORE INTO attendance ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})",
+                         list(row.values()))
+        elif op < 0.6:
+            conn.execute(f'UPDATE attendance SET status = ? WHERE {key} = ?', (rng.choice(STATUSES), rng.choice(ids)))
+        elif op < 0.9:
+            row = _row(target, rng)
+            column = rng.choice(list(row))
+            conn.execute(f'UPDATE OR IGNORE attendance SET {column} = ? WHERE {key} = ?', (row[column], rng.choice(ids)))
+        else:
+            conn.execute(f'DELETE FROM attendance WHERE {key} = ?', (rng.choice(ids),))
+    assert attendance_summary.verify(conn, attendance_summary.SUBJECT_COLUMNS[target]) == []
+    assert attendance_stats.verify(conn, target) == []
+
+
+@pytest.mark.parametrize('target', sorted(migrations.TARGETS))
+def test_unchanged_rewrite_skips_the_triggers(tmp_path, target):
+    conn = _db(tmp_path, target)
+    row = _row(target, random.Random(0))
+    conn.execute(f"INSERT INTO attendance ({', '.join(row)}) VALUES ({', '.join('?' * len(row))})", list(row.values()))
+    before = _versions(conn)
+    conn.execute('UPDATE attendance SET status = status')
+    assert _versions(conn) == before
+    conn.execute("UPDATE attendance SET status = CASE status WHEN 'P' THEN 'A' ELSE 'P' END")
+    assert _versions(conn)[row['student_id']] == before[row['student_id']] + 1
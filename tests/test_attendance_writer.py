@@ -0,0 +1,97 @@
+"""Set-based attendance writes (attendance_writer.py) against a migrated database."""
+import pytest
+
+import attendance_writer
+from conftest import migrated
+
+DAY = '2030-01-07'
+
+
+@pytest.fixture
+def root_db(tmp_path):
+    conn = migrated(tmp_path / 'root.db', 'root')
+    conn.executemany("INSERT INTO students (student_id, name, section, year, password) VALUES (?, ?, ?, 1, 'x')",
+                     [('A1', 'Asha', 'A'), ('A2', 'Arun', 'A'), ('B1', 'Bela', 'B')])
+    conn.executemany("INSERT INTO teachers (teacher_id, name, subject, password) VALUES (?, ?, ?, 'x')",
+                     [('T001', 'One', 'Maths'), ('T002', 'Two', 'Physics')])
+    yield conn
+    conn.close()
+
+
+def _slot(conn, period=1):
+    return {r['student_id']: (r['teacher_id'], r['status'], r['marked_by_club'], r['club_event_id'])
+            for r in conn.execute('SELECT * FROM attendance WHERE date = ? AND period = ?', (DAY, period))}
+
+
+def test_section_submission_writes_only_that_roster(root_db):
+    attendance_writer.write_class_attendance(root_db, 'T001', DAY, 1, ['B1'], sections=['B'])
+    changes = []
+    written = attendance_writer.write_class_attendance(root_db, 'T001', DAY, 1, ['A1'], sections=['A'],
+                                                       changes=changes)
+    assert written == 2
+    assert _slot(root_db) == {'A1': ('T001', 'P', 0, None), 'A2': ('T001', 'A', 0, None),
+                              'B1': ('T001', 'P', 0, None)}
+    assert sorted((c['student_id'], c['status']) for c in changes) == [('A1', 'P'), ('A2', 'A')]
+
+
+def test_unfiltered_submission_replaces_the_teachers_slot(root_db):
+    root_db.execute("DELETE FROM students WHERE student_id = 'B1'")
+    root_db.execute("INSERT INTO attendance (student_id, teacher_id, date, period, status) VALUES ('B1', 'T001', ?, 1, 'P')",
+                    (DAY,))
+    attendance_writer.write_class_attendance(root_db, 'T001', DAY, 1, ['A2'])
+    assert _slot(root_db) == {'A1': ('T001', 'A', 0, None), 'A2': ('T001', 'P', 0, None)}
+
+
+def test_upsert_takes_over_a_slot_marked_elsewhere(root_db):
+    root_db.execute('''INSERT INTO attendance (student_id, teacher_id, date, period, status, marked_by_club, club_event_id)
+                       VALUES ('A1', 'T002', ?, 1, 'P', 1, 7)''', (DAY,))
+    attendance_writer.write_class_attendance(root_db, 'T001', DAY, 1, [], sections='A')
+    assert _slot(root_db)['A1'] == ('T001', 'A', 0, None)
+    assert root_db.execute('SELECT COUNT(*) FROM attendance').fetchone()[0] == 2
+
+
+def test_event_merge_credits_attendees_once(root_db):
+    event_id = root_db.execute(f"""INSERT INTO club_events (club_id, event_name, event_date, period, status)
+                                   VALUES ('CLUB001', 'Hackathon', '{DAY}', 1, 'approved')""").lastrowid
+    root_db.executemany('INSERT INTO event_attendance (event_id, student_id) VALUES (?, ?)',
+                        [(event_id, sid) for sid in ('A1', 'A1', 'A2', 'B1', 'X9')])
+    attendance_writer.write_class_attendance(root_db, 'T001', DAY, 1, [], sections='A')
+    root_db.execute("DELETE FROM attendance WHERE student_id = 'A2'")
+    event = {'event_id': event_id, 'event_date': DAY, 'period': 1}
+
+    changes = []
+    counts = attendance_writer.merge_event_attendance(root_db, event, 'T009', {'B': 'T002'}, changes=changes)
+    assert counts == {'inserted': 2, 'updated': 1, 'unknown': 1, 'unscheduled': 1}
+    merged = {'A1': ('T001', 'P', 1, event_id),   # existing record keeps its class
+              'A2': ('T009', 'P', 1, event_id),   # no timetabled class: the fallback teacher
+              'B1': ('T002', 'P', 1, event_id)}
+    assert _slot(root_db) == merged
+    assert sorted(c['student_id'] for c in changes) == ['A1', 'A2', 'B1']
+
+    again = attendance_writer.merge_event_attendance(root_db, event, 'T009', {'B': 'T002'})
+    assert again == {'inserted': 0, 'updated': 3, 'unknown': 1, 'unscheduled': 0}
+    assert _slot(root_db) == merged
+
+
+def test_club_upload_converts_pending_records(tmp_path):
+    conn = migrated(tmp_path / 'th2.db', 'th2')
+    conn.executemany('''INSERT INTO attendance (student_id, subject_code, date, period, status, marked_by)
+                        VALUES (?, 'SE31164', ?, ?, ?, 'teacher1')''',
+                     [('S1', DAY, '1', 'N.M.'), ('S1', DAY, '2', 'pending'), ('S1', '2030-01-08', '1', 'N.M.'),
+                      ('S2', DAY, '1', 'P'), ('S3', DAY, '1', 'A')])
+    changes = []
+    counts = attendance_writer.mark_event_present(conn, ['S1', 'S2', 'S1', 'S4'], DAY, 'club1', 'Hackathon', 1,
+                                                  changes=changes)
+    assert counts == {'marked': 2, 'matched': 1, 'already_present': 1, 'unmatched': 1}
+    rows = conn.execute('''SELECT student_id, date, period, status, marked_by, event_name, club_id FROM attendance
+                           ORDER BY student_id, date, period''').fetchall()
+    assert [tuple(r) for r in rows] == [
+        ('S1', DAY, '1', 'P', 'club1', 'Hackathon', 1),
+        ('S1', DAY, '2', 'P', 'club1', 'Hackathon', 1),
+        ('S1', '2030-01-08', '1', 'N.M.', 'teacher1', None, None),   # another day
+        ('S2', DAY, '1', 'P', 'teacher1', None, None),
+        ('S3', DAY, '1', 'A', 'teacher1', None, None),               # not uploaded
+    ]
+    assert sorted(c['period'] for c in changes) == ['1', '2']
+    assert conn.execute('SELECT COUNT(*) FROM temp.upload_ids').fetchone()[0] == 0
+    conn.close()
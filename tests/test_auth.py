@@ -0,0 +1,53 @@
+"""Login (auth.py): plaintext and outdated hashes are replaced through the principals view."""
+import pytest
+
+import auth
+from conftest import migrated
+
+# cheap enough for tests; the point is the method change, not the cost
+METHOD = 'pbkdf2:sha256:1000'
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'root.db')
+    conn = migrated(path, 'root')
+    # same login for two roles: only the student's password may change
+    conn.execute("INSERT INTO students (student_id, name, section, year, password) VALUES ('U1', 'S', 'A', 1, 'pw')")
+    conn.execute("INSERT INTO teachers (teacher_id, name, subject, password) VALUES ('U1', 'T', 'Maths', 'pw')")
+    conn.close()
+    return path
+
+
+def _passwords(path):
+    conn = migrated(path, 'root')
+    try:
+        return {r['role']: r['password'] for r in conn.execute("SELECT role, password FROM principals WHERE login = 'U1'")}
+    finally:
+        conn.close()
+
+
+def test_plaintext_password_is_rehashed_on_login(db_path):
+    authenticator = auth.Authenticator(db_path, auth.HashPolicy(METHOD))
+    assert authenticator.authenticate('U1', 'wrong', role='student') is None
+    assert authenticator.rehashed == 0
+
+    user = authenticator.authenticate('U1', 'pw', role='student')
+    assert (user['role'], user['login'], user['name']) == ('student', 'U1', 'S')
+    assert 'password' not in user
+    stored = _passwords(db_path)
+    assert stored['student'].startswith('pbkdf2:sha256:1000$') and stored['teacher'] == 'pw'
+    assert authenticator.rehashed == 1
+
+    # the cached principal still logs in against the new hash, without another rehash
+    assert authenticator.authenticate('U1', 'pw', role='student') == user
+    assert authenticator.authenticate('U1', 'wrong', role='student') is None
+    assert authenticator.rehashed == 1
+
+
+def test_hash_with_another_method_is_replaced(db_path):
+    auth.Authenticator(db_path, auth.HashPolicy('pbkdf2:sha256:2000')).authenticate('U1', 'pw', role='teacher')
+    authenticator = auth.Authenticator(db_path, auth.HashPolicy(METHOD))
+    assert authenticator.authenticate('U1', 'pw', role='teacher') is not None
+    assert _passwords(db_path)['teacher'].startswith('pbkdf2:sha256:1000$')
+    assert authenticator.rehashed == 1
@@ -0,0 +1,50 @@
+"""Batch attendance API (TH2): a retried request replays its stored response instead of writing again."""
+import sqlite3
+
+from conftest import client_as
+
+TUESDAY = '2030-01-08'
+
+PAYLOAD = {'blocks': [
+    {'date': TUESDAY, 'period': 'P7', 'subject_code': 'SE31164', 'section': 'Section-J', 'present': ['25030175']},
+    {'date': TUESDAY, 'period': 'P7', 'subject_code': 'VC31103', 'section': 'Section-J'},   # not teacher1's
+]}
+
+
+def _marked(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return dict(conn.execute("SELECT student_id, status FROM attendance WHERE date = ? AND period = 'P7'",
+                                 (TUESDAY,)).fetchall())
+    finally:
+        conn.close()
+
+
+def test_th2_batch_is_applied_once_per_key(th2_app):
+    client = client_as(th2_app, username='teacher1', role='teacher', name='teacher1')
+
+    def post(payload, key):
+        return client.post('/api/attendance/batch', json=payload, headers={'Idempotency-Key': key})
+
+    first = post(PAYLOAD, 'phone-1')
+    assert first.status_code == 200 and 'Idempotent-Replayed' not in first.headers
+    body = first.get_json()
+    assert (body['applied'], body['failed']) == (1, 1)
+    assert body['results'][1]['error'] == "not your subject: 'VC31103'"
+    marked = _marked(th2_app.DB_PATH)
+    assert marked['25030175'] == 'P' and set(marked.values()) == {'P', 'N.M.'}
+
+    # a correction made since must survive the phone's retry
+    conn = sqlite3.connect(th2_app.DB_PATH)
+    with conn:
+        conn.execute("UPDATE attendance SET status = 'A' WHERE student_id = '25030175' AND date = ? AND period = 'P7'",
+                     (TUESDAY,))
+    conn.close()
+    replay = post(PAYLOAD, 'phone-1')
+    assert (replay.status_code, replay.headers['Idempotent-Replayed'], replay.get_json()) == (200, 'true', body)
+    assert _marked(th2_app.DB_PATH)['25030175'] == 'A'
+
+    changed = {'blocks': PAYLOAD['blocks'][:1]}
+    assert post(changed, 'phone-1').status_code == 422
+    assert post(changed, '').status_code == 400
+    assert _marked(th2_app.DB_PATH)['25030175'] == 'A'
@@ -0,0 +1,116 @@
+"""Upload ingestion (ingest.py): the fast .xlsx scanner reads what openpyxl reads."""
+import io
+import re
+import subprocess
+import sys
+import zipfile
+
+import pytest
+from openpyxl import Workbook
+
+import ingest
+from conftest import ROOT
+
+
+def _xlsx(rows):
+    wb = Workbook()
+    for row in rows:
+        wb.active.append(row)
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def _rewrite(data, parts, added=None):
+    """The workbook with parts {name: fn(xml) -> xml} rewritten and added {name: xml} stored."""
+    src, out = zipfile.ZipFile(io.BytesIO(data)), io.BytesIO()
+    with zipfile.ZipFile(out, 'w') as dst:
+        for item in src.infolist():
+            body = src.read(item)
+            dst.writestr(item, parts[item.filename](body) if item.filename in parts else body)
+        for name, body in (added or {}).items():
+            dst.writestr(name, body)
+    return out.getvalue()
+
+
+def _shared_strings(data):
+    """The workbook with its inline strings moved to a shared-string table, as Excel saves them."""
+    strings = []
+
+    def share(match):
+        strings.append(match.group(2))
+        return match.group(1) + b' t="s"><v>' + str(len(strings) - 1).encode() + b'</v></c>'
+
+    sheet = zipfile.ZipFile(io.BytesIO(data)).read('xl/worksheets/sheet1.xml')
+    sheet = re.sub(rb'(<c r="[A-Z]+\d+")[^>]*t="inlineStr"><is><t>(.*?)</t></is></c>', share, sheet)
+    table = (b'<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+             + b''.join(b'<si><t>' + text + b'</t></si>' for text in strings) + b'</sst>')
+    return _rewrite(data, {
+        'xl/worksheets/sheet1.xml': lambda xml: sheet,
+        '[Content_Types].xml': lambda xml: xml.replace(b'</Types>', b'<Override PartName="/xl/sharedStrings.xml" '
+                                                                     b'ContentType="application/vnd.openxmlformats-'
+                                                                     b'officedocument.spreadsheetml.sharedStrings+xml"/>'
+                                                                     b'</Types>'),
+        'xl/_rels/workbook.xml.rels': lambda xml: xml.replace(b'</Relationships>', b'<Relationship Id="rIdSST" '
+                                                              b'Type="http://schemas.openxmlformats.org/officeDocument/'
+                                                              b'2006/relationships/sharedStrings" '
+                                                              b'Target="sharedStrings.xml"/></Relationships>'),
+    }, {'xl/sharedStrings.xml': table})
+
+
+def _ids(values):
+    # blank cells are dropped on ingestion (the scanner does not see absent ones at all)
+    return [sid for sid in map(ingest.normalise_id, values) if sid]
+
+
+def _by_openpyxl(data):
+    return _ids(ingest._generic_id_values(ingest._xlsx_rows(io.BytesIO(data))))
+
+
+def _by_scanner(data):
+    return _ids(ingest._xlsx_id_values(io.BytesIO(data)))
+
+
+SHEETS = {
+    'numbers and text': [['Name', 'Student ID']] + [[f'S{i}', 2021000 + i] for i in range(50)]
+                        + [['Text', '2021999'], ['Float', 2022001.0], ['Spaces', ' 2022002 ']],
+    'blank and missing cells': [['Student ID', 'Name'], [2021001, 'a'], [None, 'b'], ['', 'c'], [2021002]],
+    'escaped strings': [['Roll No', 'Note'], ['A&B<1>', 'x'], ['"Q" \'s\'', 'y'], ['ünï', 'z']],
+    'column past Z': [[f'C{i}' for i in range(27)] + ['student_id']] + [[None] * 27 + [f'ID{i}'] for i in range(20)],
+}
+
+
+@pytest.mark.parametrize('strings', ['inline', 'shared'])
+@pytest.mark.parametrize('name', sorted(SHEETS))
+def test_scanner_matches_openpyxl(name, strings, monkeypatch):
+    monkeypatch.setattr(ingest, 'CHUNK_SIZE', 97)   # rows split across chunks
+    data = _xlsx(SHEETS[name])
+    if strings == 'shared':
+        data = _shared_strings(data)
+    assert _by_scanner(data) == _by_openpyxl(data)
+
+
+def test_sheet_without_cell_references_falls_back_to_openpyxl():
+    data = _rewrite(_xlsx(SHEETS['numbers and text']),
+                    {'xl/worksheets/sheet1.xml': lambda xml: re.sub(rb' r="[A-Z]+\d+"', b'', xml)})
+    with pytest.raises(ingest._UnsupportedSheet):
+        _by_scanner(data)
+    ids = ingest.read_student_ids(io.BytesIO(data), 'upload.xlsx')
+    assert ids == _by_openpyxl(_xlsx(SHEETS['numbers and text']))
+
+
+def test_sheet_without_an_id_column_is_rejected():
+    with pytest.raises(ValueError, match='No Student ID column'):
+        ingest.read_student_ids(io.BytesIO(_xlsx([['Name'], ['a']])), 'upload.xlsx')
+
+
+def test_csv_and_plain_xlsx_do_not_import_openpyxl(tmp_path):
+    # the fast paths must stay cheap to load: openpyxl only for sheets the scanner cannot read
+    path = tmp_path / 'upload.xlsx'
+    path.write_bytes(_xlsx(SHEETS['numbers and text']))
+    script = ('import io, sys, ingest\n'
+              "ingest.read_student_ids(io.BytesIO(b'Student ID\\n2021001\\n'), 'upload.csv')\n"
+              f"ingest.read_student_ids(open({str(path)!r}, 'rb'), 'upload.xlsx')\n"
+              "print('openpyxl' in sys.modules)\n")
+    out = subprocess.run([sys.executable, '-c', script], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == 'False'
@@ -0,0 +1,77 @@
+"""Job queue: claims, lease renewal and retries against a migrated database."""
+import sqlite3
+import time
+
+import pytest
+
+import jobs
+from conftest import migrated
+
+
+@pytest.fixture
+def queue(tmp_path):
+    path = str(tmp_path / 'root.db')
+    migrated(path, 'root').close()
+    return jobs.JobQueue(path, workers=0)
+
+
+def _row(queue, job_id):
+    with queue.pool.connection() as conn:
+        return dict(conn.execute('SELECT * FROM jobs WHERE job_id = ?', (job_id,)).fetchone())
+
+
+def test_each_job_is_claimed_once_in_order(queue):
+    queue.handler('noop')(lambda conn, payload, data: {})
+    first, second = queue.enqueue('noop'), queue.enqueue('noop')
+    assert queue.claim('w1')['job_id'] == first
+    assert queue.claim('w2')['job_id'] == second
+    assert queue.claim('w3') is None
+    assert (_row(queue, first)['worker'], _row(queue, first)['attempts']) == ('w1', 1)
+
+
+def test_running_job_keeps_its_lease(queue, monkeypatch):
+    monkeypatch.setattr(jobs, 'LEASE_SECONDS', 0.2)
+    stolen = []
+
+    @queue.handler('slow')
+    def slow(conn, payload, data):
+        time.sleep(0.5)   # outlives the lease: only the renewals keep it
+        stolen.append(queue.claim('other'))
+        return {'size': len(data)}
+
+    job_id = queue.enqueue('slow', data=b'upload')
+    assert queue.run_one('w1') == job_id
+    assert stolen == [None]
+    job = _row(queue, job_id)
+    assert (job['status'], job['attempts'], job['data']) == ('done', 1, None)
+    assert queue.get(job_id)['result'] == {'size': 6}
+
+
+def test_orphaned_job_goes_back_to_the_queue(queue):
+    queue.handler('noop')(lambda conn, payload, data: {})
+    job_id = queue.enqueue('noop')
+    queue.claim('dead-worker')
+    expired = time.time() - jobs.LEASE_SECONDS - 1
+    with queue.pool.transaction() as conn:
+        conn.execute('UPDATE jobs SET heartbeat_at = ? WHERE job_id = ?', (expired, job_id))
+    job = queue.claim('w2')
+    assert (job['job_id'], job['attempts']) == (job_id, 2)
+
+
+def test_locked_job_is_retried_and_others_fail(queue):
+    @queue.handler('locked')
+    def locked(conn, payload, data):
+        raise sqlite3.OperationalError('database is locked')
+
+    @queue.handler('broken')
+    def broken(conn, payload, data):
+        raise ValueError('bad upload')
+
+    retried, failed = queue.enqueue('locked', data=b'x'), queue.enqueue('broken', data=b'x')
+    queue.run_one()
+    queue.run_one()
+    job = _row(queue, retried)
+    assert (job['status'], job['data']) == ('queued', b'x')
+    assert job['run_after'] > time.time()
+    job = _row(queue, failed)
+    assert (job['status'], job['error'], job['data']) == ('failed', 'bad upload', None)
@@ -0,0 +1,23 @@
+"""Portal expiry: passes with nothing due stay out of the writers' way."""
+import sqlite3
+
+import migrations
+import portals
+
+
+def test_expire_due_takes_the_write_lock_only_when_something_expired(tmp_path):
+    path = str(tmp_path / 'root.db')
+    setup = sqlite3.connect(path, isolation_level=None)
+    migrations.migrate(setup, migrations.ROOT_MIGRATIONS)
+    setup.execute("INSERT INTO portal_access (club_id, opened_by, duration_hours) VALUES ('CLUB001', 'VC001', 1)")
+    expires_at = portals.next_expiry(setup, 'root')
+
+    # another writer holds the lock: a pass with nothing due must not wait for it
+    setup.execute('BEGIN IMMEDIATE')
+    conn = sqlite3.connect(path, timeout=0, isolation_level=None)
+    assert portals.expire_due(conn, 'root', now=expires_at - 1) == 0
+    setup.execute('COMMIT')
+
+    assert portals.expire_due(conn, 'root', now=expires_at) == 1
+    assert portals.next_expiry(conn, 'root') is None
+    assert portals.expire_due(conn, 'root', now=expires_at) == 0
@@ -0,0 +1,24 @@
+"""migrations.py --check-plans against freshly migrated databases."""
+import sqlite3
+
+import pytest
+
+import migrations
+
+
+@pytest.mark.parametrize('target', sorted(migrations.TARGETS))
+def test_route_queries_use_indexes(tmp_path, target, capsys):
+    path = str(tmp_path / f'{target}.db')
+    assert migrations.main([target, '--db', path, '--check-plans']) == 0, capsys.readouterr().out
+
+
+@pytest.mark.parametrize('target', sorted(migrations.TARGETS))
+def test_check_reports_full_scans(tmp_path, target):
+    _, steps, _ = migrations.TARGETS[target]
+    conn = sqlite3.connect(str(tmp_path / f'{target}.db'))
+    try:
+        migrations.migrate(conn, steps)
+        bad = migrations.full_scans(conn, {'unindexed': ('SELECT * FROM attendance WHERE status = ?', ('P',))})
+    finally:
+        conn.close()
+    assert list(bad) == ['unindexed']
@@ -0,0 +1,75 @@
+"""Teacher submissions for "all my sections" against a timetable that disagrees with the assignments."""
+import sqlite3
+
+from conftest import client_as
+
+MONDAY = '2030-01-07'
+
+
+def _statuses(db_path, sql, params):
+    conn = sqlite3.connect(db_path)
+    try:
+        return dict(conn.execute(sql, params).fetchall())
+    finally:
+        conn.close()
+
+
+def test_root_timetable_outside_posted_sections(root_app):
+    # T001 teaches A and B, but the timetable puts it in C for Monday period 6
+    conn = sqlite3.connect(root_app.DB_NAME)
+    with conn:
+        conn.execute("INSERT INTO timetable (section, weekday, period, teacher_id, subject) "
+                     "VALUES ('C', 1, 6, 'T001', 'Data Structures')")
+        sections = dict(conn.execute('SELECT student_id, section FROM students').fetchall())
+    conn.close()
+    present = ['2021001', '2021002']
+
+    client = client_as(root_app, user_id='T001', role='teacher', name='T001')
+    response = client.post('/teacher/mark_attendance', data={
+        'date': MONDAY, 'period': '6', 'section': ['A', 'B'], 'attendance[]': present})
+    assert response.status_code == 302
+
+    marked = _statuses(root_app.DB_NAME, 'SELECT student_id, status FROM attendance WHERE date = ? AND period = 6',
+                       (MONDAY,))
+    assert marked == {sid: 'P' if sid in present else 'A'
+                      for sid, section in sections.items() if section in ('A', 'B')}
+
+
+def test_root_timetable_narrows_posted_sections(root_app):
+    conn = sqlite3.connect(root_app.DB_NAME)
+    with conn:
+        conn.execute("INSERT INTO timetable (section, weekday, period, teacher_id, subject) "
+                     "VALUES ('A', 1, 7, 'T001', 'Data Structures')")
+        section_a = [r[0] for r in conn.execute("SELECT student_id FROM students WHERE section = 'A'")]
+    conn.close()
+
+    client = client_as(root_app, user_id='T001', role='teacher', name='T001')
+    client.post('/teacher/mark_attendance', data={
+        'date': MONDAY, 'period': '7', 'section': ['A', 'B'], 'attendance[]': section_a[:1]})
+
+    marked = _statuses(root_app.DB_NAME, 'SELECT student_id, status FROM attendance WHERE date = ? AND period = 7',
+                       (MONDAY,))
+    assert sorted(marked) == sorted(section_a)
+
+
+def test_th2_timetable_outside_posted_sections(th2_app):
+    # teacher1 teaches SE31164 to Section-J and Section-K; the timetable also has it in Section-L
+    conn = sqlite3.connect(th2_app.DB_PATH)
+    with conn:
+        conn.execute("INSERT INTO users (username, password, role, name, student_id, section, year) "
+                     "VALUES ('student_l', 'x', 'student', 'Section L Student', '25039999', 'Section-L', 1)")
+        conn.execute("INSERT INTO timetable (section, weekday, period, teacher_username, subject) "
+                     "VALUES ('Section-L', 1, 'P6', 'teacher1', 'SE31164')")
+        sections = dict(conn.execute("SELECT student_id, section FROM users WHERE role = 'student'").fetchall())
+    conn.close()
+
+    client = client_as(th2_app, username='teacher1', role='teacher', name='teacher1')
+    response = client.post('/teacher_portal', data={
+        'subject_code': 'SE31164', 'period': 'P6', 'date': MONDAY, 'section': ['Section-J', 'Section-K'],
+        'attendance_25030175': 'P'})
+    assert response.status_code == 200
+
+    marked = _statuses(th2_app.DB_PATH, "SELECT student_id, status FROM attendance WHERE date = ? AND period = 'P6'",
+                       (MONDAY,))
+    assert set(marked) == {sid for sid, section in sections.items() if section in ('Section-J', 'Section-K')}
+    assert marked['25030175'] == 'P'
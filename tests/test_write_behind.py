@@ -0,0 +1,83 @@
+"""Group commit (write_behind.py): per-submission failures, commit failures, a writer that cannot start."""
+import sqlite3
+import threading
+
+import pytest
+
+import db_pool
+import write_behind
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'writes.db')
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE marks (value TEXT PRIMARY KEY)')
+    conn.close()
+    return path
+
+
+def _mark(conn, value):
+    conn.execute('INSERT INTO marks (value) VALUES (?)', (value,))
+    if value == 'bad':
+        raise ValueError('rejected')
+    return value
+
+
+def _marks(path):
+    conn = sqlite3.connect(path)
+    try:
+        return sorted(r[0] for r in conn.execute('SELECT value FROM marks'))
+    finally:
+        conn.close()
+
+
+def _submit_together(writer, values):
+    """Submit values from one thread each; {value: result or exception}."""
+    outcomes = {}
+
+    def run(value):
+        try:
+            outcomes[value] = writer.submit(_mark, value)
+        except Exception as e:
+            outcomes[value] = e
+
+    threads = [threading.Thread(target=run, args=(v,)) for v in values]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+    return outcomes
+
+
+def test_failing_submission_rolls_back_alone(db_path):
+    writer = write_behind.GroupCommitWriter(db_path, 'test-group', enabled=True, max_wait_ms=300)
+    outcomes = _submit_together(writer, ['a', 'bad', 'b'])
+    assert (outcomes['a'], outcomes['b']) == ('a', 'b')
+    assert isinstance(outcomes['bad'], ValueError)
+    assert _marks(db_path) == ['a', 'b']
+    metrics = writer.metrics()
+    assert (metrics['groups'], metrics['committed'], metrics['failed']) == (1, 2, 1)
+
+
+def test_commit_failure_fails_the_whole_group(db_path, monkeypatch):
+    def commit(conn):
+        raise sqlite3.OperationalError('disk I/O error')
+
+    monkeypatch.setattr(db_pool.PooledConnection, 'commit', commit)
+    writer = write_behind.GroupCommitWriter(db_path, 'test-commit', enabled=True, max_wait_ms=300)
+    outcomes = _submit_together(writer, ['a', 'b'])
+    assert all(isinstance(e, sqlite3.OperationalError) for e in outcomes.values())
+    assert _marks(db_path) == []
+    assert (writer.metrics()['commit_errors'], writer.metrics()['failed']) == (1, 2)
+
+
+def test_writer_that_cannot_start_fails_its_callers_and_restarts(tmp_path, db_path):
+    writer = write_behind.GroupCommitWriter(str(tmp_path / 'missing' / 'writes.db'), 'test-abandon', enabled=True)
+    with pytest.raises(sqlite3.OperationalError):
+        writer.submit(_mark, 'a')
+    assert writer.metrics()['thread_errors'] == 1
+
+    writer.db_path = db_path
+    assert writer.submit(_mark, 'a') == 'a'
+    assert _marks(db_path) == ['a']
@@ -0,0 +1,286 @@
+"""Class timetable: which teacher (and subject) a section has in each weekday/period.
+
+``timetable`` holds one row per (section, weekday, period), weekday being
+ISO (1 = Monday ... 7 = Sunday). It is loaded in bulk from CSV:
+
+    section,weekday,period,teacher,subject
+    A,Mon,1,T001,Data Structures
+    A,2,1,T003,
+
+(weekday as a number or a day name; in attendance.db a blank subject means
+the teacher's own subject, in TH2 the subject code is required unless the
+teacher has exactly one subject).
+
+``TimetableIndex`` keeps the whole timetable in-process as dictionaries,
+keyed by slot and by teacher. Triggers bump ``timetable_versions`` on every
+change, and each use costs one primary-key probe of that version, so an
+import in any process is picked up on the next request. Event approval
+resolves the class of every section at the event's slot with one lookup,
+and teacher marking narrows "all my sections" to the sections actually
+scheduled for the slot.
+
+Usage:
+    python timetable.py --import timetable.csv            # attendance.db, upsert
+    python timetable.py th2 --import tt.csv --replace     # TH2, replace the whole timetable
+    python timetable.py --show A                          # one section's week
+"""
+import csv
+import sys
+import threading
+from datetime import date as _date
+
+import targets
+from db_pool import transaction
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+MAX_ERRORS = 20  # reported per rejected import
+
+# Column names accepted in the CSV header (compared lower-cased)
+COLUMNS = {
+    'section': ['section'],
+    'weekday': ['weekday', 'day'],
+    'period': ['period'],
+    'teacher': ['teacher', 'teacher_id', 'teacher_username', 'teacher id'],
+    'subject': ['subject', 'subject_code', 'subject code'],
+}
+
+# Per database: the teacher column, the period type, and where teachers and
+# their subjects are looked up when validating an import
+TARGETS = {
+    'root': {
+        'teacher': 'teacher_id',
+        'period_type': 'INTEGER',
+        'teachers': 'SELECT teacher_id, subject FROM teachers',
+        'subjects': None,
+    },
+    'th2': {
+        'teacher': 'teacher_username',
+        'period_type': 'TEXT',
+        'teachers': '''SELECT u.username, s.subject_code FROM users u
+                       LEFT JOIN subjects s ON s.teacher_username = u.username WHERE u.role = 'teacher' ''',
+        'subjects': 'SELECT subject_code FROM subjects',
+    },
+}
+
+
+def schema(target):
+    """CREATE statements for timetable, its version row and the triggers bumping it."""
+    spec = TARGETS[target]
+    bump = 'UPDATE timetable_versions SET version = version + 1 WHERE id = 1;'
+    return [
+        f'''CREATE TABLE IF NOT EXISTS timetable (
+            section TEXT NOT NULL,
+            weekday INTEGER NOT NULL CHECK (weekday BETWEEN 1 AND 7),
+            period {spec['period_type']} NOT NULL,
+            {spec['teacher']} TEXT NOT NULL,
+            subject TEXT,
+            PRIMARY KEY (section, weekday, period)
+        ) WITHOUT ROWID''',
+        '''CREATE TABLE IF NOT EXISTS timetable_versions (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL DEFAULT 0
+        )''',
+        'INSERT OR IGNORE INTO timetable_versions (id, version) VALUES (1, 0)',
+    ] + [f'''CREATE TRIGGER IF NOT EXISTS trg_timetable_{event.lower()} AFTER {event} ON timetable BEGIN
+            {bump}
+        END''' for event in ('INSERT', 'UPDATE', 'DELETE')]
+
+
+def weekday(value):
+    """ISO weekday (1-7) of a 'YYYY-MM-DD' date, a day name ('Mon', 'monday') or a number."""
+    text = str(value).strip().lower()
+    if text.isdigit() and 1 <= int(text) <= 7:
+        return int(text)
+    for number, name in enumerate(WEEKDAYS, start=1):
+        if len(text) >= 3 and name.startswith(text):
+            return number
+    try:
+        return _date.fromisoformat(text).isoweekday()
+    except ValueError:
+        raise ValueError(f'not a weekday: {value!r}') from None
+
+
+def _day(date):
+    try:
+        return _date.fromisoformat(str(date)).isoweekday()
+    except ValueError:
+        return None
+
+
+def _header_map(header):
+    cols = [str(c).strip().lower() if c is not None else '' for c in header]
+    found = {}
+    for name, candidates in COLUMNS.items():
+        for candidate in candidates:
+            if candidate in cols:
+                found[name] = cols.index(candidate)
+                break
+    missing = [name for name in ('section', 'weekday', 'period', 'teacher') if name not in found]
+    if missing:
+        raise ValueError(f"timetable header is missing: {', '.join(missing)}")
+    return found
+
+
+def import_rows(conn, target, rows, replace=False):
+    """Validate and load timetable rows (header first); all or nothing.
+
+    With replace the existing timetable is dropped first, otherwise rows
+    upsert their slots. Returns {'imported': n, 'errors': [(line, message)]};
+    nothing is written when there are errors.
+    """
+    spec = TARGETS[target]
+    rows = iter(rows)
+    try:
+        columns = _header_map(next(rows))
+    except StopIteration:
+        raise ValueError('timetable file is empty') from None
+    teachers = {}
+    for teacher, subject in conn.execute(spec['teachers']):
+        teachers.setdefault(teacher, []).append(subject)
+    subjects = {r[0] for r in conn.execute(spec['subjects'])} if spec['subjects'] else None
+
+    def cell(row, name):
+        index = columns.get(name)
+        value = row[index] if index is not None and index < len(row) else None
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        return '' if value is None else str(value).strip()
+
+    records, errors = [], []
+    for line, row in enumerate(rows, start=2):
+        if not any(cell(row, name) for name in columns):
+            continue
+        section, teacher, subject = cell(row, 'section'), cell(row, 'teacher'), cell(row, 'subject')
+        period = cell(row, 'period')
+        try:
+            day = weekday(cell(row, 'weekday'))
+        except ValueError as e:
+            errors.append((line, str(e)))
+            continue
+        if not section or not period:
+            errors.append((line, 'section and period are required'))
+        elif spec['period_type'] == 'INTEGER' and not period.isdigit():
+            errors.append((line, f'period must be a number: {period!r}'))
+        elif teacher not in teachers:
+            errors.append((line, f'unknown teacher {teacher!r}'))
+        else:
+            if not subject:
+                own = [s for s in teachers[teacher] if s]
+                subject = own[0] if len(own) == 1 else ''
+            if subjects is not None and subject not in subjects:
+                errors.append((line, f'unknown subject {subject!r}' if subject
+                               else f'subject required for {teacher!r}'))
+            else:
+                records.append((section, day, int(period) if spec['period_type'] == 'INTEGER' else period,
+                                teacher, subject or None))
+    if errors:
+        return {'imported': 0, 'errors': errors[:MAX_ERRORS], 'error_count': len(errors)}
+    with transaction(conn):
+        if replace:
+            conn.execute('DELETE FROM timetable')
+        conn.executemany(f'''
+            INSERT INTO timetable (section, weekday, period, {spec['teacher']}, subject) VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (section, weekday, period) DO UPDATE SET
+                {spec['teacher']} = excluded.{spec['teacher']},
+                subject = excluded.subject
+        ''', records)
+    return {'imported': len(records), 'errors': [], 'error_count': 0}
+
+
+def import_csv(conn, target, path, replace=False):
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        return import_rows(conn, target, csv.reader(f), replace)
+
+
+def timetable_version(conn):
+    row = conn.execute('SELECT version FROM timetable_versions WHERE id = 1').fetchone()
+    return row[0] if row else 0
+
+
+class TimetableIndex:
+    """Per-process copy of the timetable, reloaded when timetable_versions moves.
+
+    Periods are compared as text, so the form's '1' finds period 1.
+    """
+
+    def __init__(self, target):
+        self._sql = f"SELECT section, weekday, period, {TARGETS[target]['teacher']}, subject FROM timetable"
+        self._version = None
+        self._slots = {}       # (weekday, period) -> {section: (teacher, subject)}
+        self._teachers = {}    # (teacher, weekday) -> [(period, section, subject)]
+        self._lock = threading.Lock()
+        self.reloads = 0
+
+    def _current(self, conn):
+        version = timetable_version(conn)
+        with self._lock:
+            if version == self._version:
+                return self._slots, self._teachers
+        slots, teachers = {}, {}
+        for section, day, period, teacher, subject in conn.execute(self._sql):
+            slots.setdefault((day, str(period)), {})[section] = (teacher, subject)
+            teachers.setdefault((teacher, day), []).append((str(period), section, subject))
+        for entries in teachers.values():
+            entries.sort(key=lambda e: (len(e[0]), e[0], e[1]))
+        with self._lock:
+            # read after the version: a change landing in between reloads next time
+            self._version, self._slots, self._teachers = version, slots, teachers
+            self.reloads += 1
+        return slots, teachers
+
+    # dates are 'YYYY-MM-DD'; an unreadable one has no classes rather than
+    # failing the write it came with
+
+    def classes_at(self, conn, date, period):
+        """{section: (teacher, subject)} for every section with a class at date's weekday/period."""
+        slots, _ = self._current(conn)
+        return dict(slots.get((_day(date), str(period)), {}))
+
+    def teacher_sections(self, conn, teacher, date, period, subject=None):
+        """Sections the teacher is scheduled to teach (that subject) at date's weekday/period."""
+        _, teachers = self._current(conn)
+        return sorted(section for p, section, s in teachers.get((teacher, _day(date)), ())
+                      if p == str(period) and (subject is None or s == subject))
+
+    def teacher_day(self, conn, teacher, date):
+        """[(period, section, subject)] for the teacher on date's weekday, by period."""
+        _, teachers = self._current(conn)
+        return list(teachers.get((teacher, _day(date)), ()))
+
+    def invalidate(self):
+        with self._lock:
+            self._version = None
+
+
+def main(argv=None):
+    parser = targets.argument_parser('Import or show the class timetable.')
+    parser.add_argument('--import', dest='path', help='CSV file: section,weekday,period,teacher[,subject]')
+    parser.add_argument('--replace', action='store_true', help='drop the current timetable before importing')
+    parser.add_argument('--show', metavar='SECTION', help="print a section's week")
+    args = parser.parse_args(argv)
+
+    conn = targets.connect(args, isolation_level=None)
+    try:
+        if args.path:
+            result = import_csv(conn, args.target, args.path, args.replace)
+            for line, message in result['errors']:
+                print(f'line {line}: {message}')
+            if result['error_count']:
+                print(f"{result['error_count']} invalid rows; nothing imported")
+                return 1
+            print(f"{result['imported']} slots imported")
+        if args.show:
+            teacher = TARGETS[args.target]['teacher']
+            for day, period, who, subject in conn.execute(
+                    f'SELECT weekday, period, {teacher}, subject FROM timetable WHERE section = ? '
+                    f'ORDER BY weekday, period', (args.show,)):
+                print(f'{WEEKDAYS[day - 1][:3].title()} {period!s:>6}  {who:<12} {subject or ""}')
+        count = conn.execute('SELECT COUNT(*) FROM timetable').fetchone()[0]
+        print(f'{count} slots in the timetable (version {timetable_version(conn)})')
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,222 @@
+"""Optional write-behind queue with group commit for attendance submissions.
+
+At period boundaries many teachers submit within seconds of each other and
+every submission is its own transaction, so the writers queue up on the
+database lock and on one commit each. With WRITE_BEHIND=1 the apps hand
+submissions to a ``GroupCommitWriter`` instead: a single thread per process
+drains the queue and runs up to WRITE_BEHIND_GROUP submissions (or whatever
+arrived within WRITE_BEHIND_WAIT_MS of the first) in one BEGIN IMMEDIATE
+transaction, each inside its own savepoint. One failing submission is rolled
+back to its savepoint and reported to its caller alone; the rest commit.
+
+The writer's connection uses synchronous=FULL, so the group's commit is
+fsynced before any caller is released: ``submit()`` returns only once the
+submission is durable (or raises its error). The cost of that fsync is paid
+once per group rather than once per teacher.
+
+Without WRITE_BEHIND, ``submit()`` simply runs the write on the caller's
+pooled connection, as before.
+
+If the writer thread cannot open its connection or hits an error outside
+a submission, everything it holds or has queued fails with that error and
+the thread exits; the next ``submit()`` starts a new one.
+"""
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+
+import db_pool
+import targets
+
+WRITE_BEHIND = os.environ.get('WRITE_BEHIND', '') not in ('', '0', 'false', 'no')
+GROUP_MAX = int(os.environ.get('WRITE_BEHIND_GROUP', 64))           # submissions per commit
+GROUP_WAIT_MS = float(os.environ.get('WRITE_BEHIND_WAIT_MS', 5))     # wait for more after the first
+ACK_TIMEOUT = float(os.environ.get('WRITE_BEHIND_ACK_TIMEOUT', 30))  # seconds a caller waits
+WINDOW = 1024  # recent commits / acknowledgements kept for the latency quantiles
+
+log = logging.getLogger(__name__)
+
+
+class WriteTimeout(Exception):
+    """The submission was not committed within ACK_TIMEOUT; it may still commit later."""
+
+
+class _Submission:
+    __slots__ = ('fn', 'args', 'kwargs', 'queued_at', 'done', 'result', 'error')
+
+    def __init__(self, fn, args, kwargs):
+        self.fn, self.args, self.kwargs = fn, args, kwargs
+        self.queued_at = time.perf_counter()
+        self.done = threading.Event()
+        self.result = self.error = None
+
+
+def _quantile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct))], 3)
+
+
+class GroupCommitWriter:
+    """One writer thread per process, committing queued writes in groups.
+
+    submit(fn, *args) runs fn(conn, *args) and returns its result; fn may use
+    db_pool.transaction(conn), which joins the group's transaction.
+    """
+
+    def __init__(self, db_path, name, enabled=WRITE_BEHIND, max_group=GROUP_MAX, max_wait_ms=GROUP_WAIT_MS):
+        self.db_path = db_path
+        self.name = name
+        self.enabled = enabled
+        self.max_group = max_group
+        self.max_wait = max_wait_ms / 1000.0
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+        self._stats = {'submitted': 0, 'committed': 0, 'failed': 0, 'groups': 0,
+                       'largest_group': 0, 'max_queue_depth': 0, 'commit_errors': 0, 'thread_errors': 0}
+        self._commit_ms = deque(maxlen=WINDOW)
+        self._ack_ms = deque(maxlen=WINDOW)
+        _writers.add(self)
+
+    # ---------- callers ----------
+    def submit(self, fn, *args, **kwargs):
+        if not self.enabled:
+            conn = db_pool.get_connection(self.db_path)
+            try:
+                return fn(conn, *args, **kwargs)
+            finally:
+                conn.close()
+        item = _Submission(fn, args, kwargs)
+        self._enqueue(item)
+        if not item.done.wait(ACK_TIMEOUT):
+            raise WriteTimeout(f'{self.name}: write not committed after {ACK_TIMEOUT}s')
+        if item.error is not None:
+            raise item.error
+        return item.result
+
+    def _enqueue(self, item):
+        """Queue item for this process's writer thread, starting the thread on first
+        use, after a fork, or after it stopped on an error."""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._queue = queue.Queue()
+                self._thread = None
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, args=(self._queue,),
+                                                name=f'write-behind-{self.name}', daemon=True)
+                self._thread.start()
+            self._queue.put(item)
+            self._stats['submitted'] += 1
+            self._stats['max_queue_depth'] = max(self._stats['max_queue_depth'], self._queue.qsize())
+
+    # ---------- writer thread ----------
+    def _run(self, q):
+        group = []
+        conn = None
+        try:
+            # a private one-connection pool: durable commits without changing the shared pool's pragmas
+            pool = db_pool.ConnectionPool(self.db_path, size=1)
+            conn = pool.acquire()
+            conn.execute('PRAGMA synchronous = FULL')
+            while True:
+                group = [q.get()]
+                deadline = time.perf_counter() + self.max_wait
+                while len(group) < self.max_group:
+                    remaining = deadline - time.perf_counter()
+                    try:
+                        group.append(q.get(timeout=remaining) if remaining > 0 else q.get_nowait())
+                    except queue.Empty:
+                        break
+                self._commit(conn, group)
+                group = []
+        except Exception as e:
+            log.exception('write-behind %s: writer thread stopped', self.name)
+            self._abandon(q, group, e)
+            if conn is not None:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+
+    def _abandon(self, q, group, error):
+        """Fail every submission this thread holds or has queued; the next submit() starts a new thread."""
+        with self._lock:
+            # under the lock: nothing can be queued for this thread after the drain
+            self._thread = None
+            while True:
+                try:
+                    group.append(q.get_nowait())
+                except queue.Empty:
+                    break
+            pending = [item for item in group if not item.done.is_set()]
+            self._stats['thread_errors'] += 1
+            self._stats['failed'] += len(pending)
+        for item in pending:
+            item.error, item.result = error, None
+            item.done.set()
+
+    def _commit(self, conn, group):
+        start = time.perf_counter()
+        ok = []
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for item in group:
+                conn.execute('SAVEPOINT submission')
+                try:
+                    item.result = item.fn(conn, *item.args, **item.kwargs)
+                except Exception as e:
+                    conn.execute('ROLLBACK TO submission')
+                    item.error = e
+                else:
+                    ok.append(item)
+                conn.execute('RELEASE submission')
+            conn.commit()
+        except (sqlite3.Error, db_pool.PoolTimeout) as e:
+            # lock timeout or I/O error: nothing in the group was committed
+            if conn.in_transaction:
+                conn.rollback()
+            for item in ok:
+                item.error, item.result = e, None
+            ok = []
+            with self._lock:
+                self._stats['commit_errors'] += 1
+        finished = time.perf_counter()
+        with self._lock:
+            self._stats['groups'] += 1
+            self._stats['largest_group'] = max(self._stats['largest_group'], len(group))
+            self._stats['committed'] += len(ok)
+            self._stats['failed'] += len(group) - len(ok)
+            self._commit_ms.append((finished - start) * 1000)
+            self._ack_ms.extend((finished - item.queued_at) * 1000 for item in group)
+        for item in group:
+            item.done.set()
+
+    # ---------- metrics ----------
+    def metrics(self):
+        with self._lock:
+            stats = dict(self._stats)
+            commit_ms, ack_ms = list(self._commit_ms), list(self._ack_ms)
+            depth = self._queue.qsize() if self._queue is not None and self._pid == os.getpid() else 0
+        stats.update(name=self.name, enabled=self.enabled, queue_depth=depth,
+                     avg_group=round((stats['committed'] + stats['failed']) / stats['groups'], 2)
+                     if stats['groups'] else 0.0,
+                     commit_ms_p50=_quantile(commit_ms, 0.50), commit_ms_p95=_quantile(commit_ms, 0.95),
+                     commit_ms_max=round(max(commit_ms), 3) if commit_ms else 0.0,
+                     ack_ms_p50=_quantile(ack_ms, 0.50), ack_ms_p95=_quantile(ack_ms, 0.95))
+        return stats
+
+
+# ---------- per-process registry (for /metrics) ----------
+_writers = targets.Registry()
+
+
+def all_metrics():
+    return [m for m in _writers.metrics() if m['enabled']]